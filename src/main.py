@@ -12,8 +12,10 @@ st.set_page_config(
 # TERCEIRO: Restante dos imports
 import pandas as pd
 from processamento.carregar_dados import carregar_dados
+from processamento.validacao import aplicar_validacao
 from visualizacao.filtros import criar_filtros
 from visualizacao.gerar_dashboard import criar_dashboard
+from visualizacao.diagnostico import mostrar_diagnostico
 
 # Inicialização do estado da sessão
 if 'debug' not in st.session_state:
@@ -75,6 +77,16 @@ def main():
     # Criar filtros
     filtros = criar_filtros()
     
+    # Regras de validação escolhidas na sidebar, aplicadas sobre a base bruta indexada
+    if dados and filtros:
+        # A janela só importa com a base no armazém em disco: limita as linhas lidas aos períodos
+        janela = (
+            min(filtros['periodo1']['inicio'], filtros['periodo2']['inicio']),
+            max(filtros['periodo1']['fim'], filtros['periodo2']['fim'])
+        )
+        dados = aplicar_validacao(dados, filtros['validacao'], janela)
+    mostrar_diagnostico(dados)
+    
     # Seleção do tipo de dashboard
     tipo_dashboard = st.sidebar.radio(
         "Selecione o Dashboard:",
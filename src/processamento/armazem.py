@@ -0,0 +1,94 @@
+import os
+import hashlib
+import pandas as pd
+
+# Pasta das partições em disco; sem ela a base inteira fica em memória
+PASTA_ARMAZEM = os.getenv('DASHBOARD_ARMAZEM')
+ARQUIVO_CATALOGO = 'catalogo.pkl'
+
+def _caminho(pasta, nome):
+    return os.path.join(pasta, nome)
+
+def _gravar_atomico(objeto, caminho):
+    """Grava num temporário e troca de nome, para nunca deixar uma partição pela metade"""
+    temporario = f"{caminho}.tmp"
+    pd.to_pickle(objeto, temporario)
+    os.replace(temporario, caminho)
+
+def _assinar(df):
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()[:16]
+
+def abrir_armazem(pasta):
+    """Catálogo das partições mensais gravadas na pasta (vazio se ainda não houver nenhuma)"""
+    caminho = _caminho(pasta, ARQUIVO_CATALOGO)
+    if os.path.exists(caminho):
+        return pd.read_pickle(caminho)
+    return {'pasta': pasta, 'particoes': {}, 'cargas': [], 'modelo': None}
+
+def versao_armazem(armazem):
+    """Identificador do conteúdo do armazém, usado como chave dos caches derivados"""
+    assinaturas = sorted((mes, particao['assinatura']) for mes, particao in armazem['particoes'].items())
+    return hashlib.sha1(repr(assinaturas).encode()).hexdigest()[:16]
+
+def gravar_base(df, pasta, versao):
+    """Grava a base em partições mensais, substituindo no disco só os dias presentes em `df`
+
+    Cada carga traz apenas o período exportado; o histórico dos outros dias continua nas
+    partições já gravadas. Cargas com a mesma versão não são regravadas.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    armazem = abrir_armazem(pasta)
+    if versao in armazem['cargas']:
+        return armazem
+
+    dias = df['retirada'].dt.normalize()
+    # Linhas sem retirada ficam numa partição própria
+    meses = dias.dt.strftime('%Y-%m').fillna('sem_data')
+    for mes, novas in df.groupby(meses, sort=True):
+        particao = armazem['particoes'].get(mes)
+        # Sem data não há dia para casar: a partição reflete a última carga
+        if particao is not None and mes != 'sem_data':
+            existentes = pd.read_pickle(_caminho(pasta, particao['arquivo']))
+            mantidas = existentes[~existentes['retirada'].dt.normalize().isin(dias[novas.index])]
+            novas = pd.concat([mantidas, novas], ignore_index=True)
+
+        novas = novas.sort_values('retirada', kind='stable').reset_index(drop=True)
+        arquivo = f"base_{mes}.pkl"
+        _gravar_atomico(novas, _caminho(pasta, arquivo))
+        armazem['particoes'][mes] = {
+            'arquivo': arquivo,
+            'linhas': len(novas),
+            'status': sorted(novas['status'].dropna().astype(str).unique().tolist()),
+            'assinatura': _assinar(novas)
+        }
+
+    # Recorte sem linhas com as colunas e tipos da base, para montar tabelas vazias
+    armazem['modelo'] = df.iloc[:0]
+    armazem['cargas'] = (armazem['cargas'] + [versao])[-20:]
+    _gravar_atomico(armazem, _caminho(pasta, ARQUIVO_CATALOGO))
+    return armazem
+
+def _meses_no_intervalo(armazem, inicio=None, fim=None):
+    """Partições que podem ter linhas entre `inicio` e `fim` (datas), em ordem cronológica"""
+    meses = sorted(mes for mes in armazem['particoes'] if mes != 'sem_data')
+    if inicio is not None:
+        meses = [mes for mes in meses if mes >= inicio.strftime('%Y-%m')]
+    if fim is not None:
+        meses = [mes for mes in meses if mes <= fim.strftime('%Y-%m')]
+    if inicio is None and fim is None and 'sem_data' in armazem['particoes']:
+        meses.append('sem_data')
+    return meses
+
+def ler_lotes(armazem, inicio=None, fim=None):
+    """Percorre a base partição por partição (um mês por vez), sem carregá-la inteira"""
+    for mes in _meses_no_intervalo(armazem, inicio, fim):
+        lote = pd.read_pickle(_caminho(armazem['pasta'], armazem['particoes'][mes]['arquivo']))
+        if inicio is not None:
+            lote = lote[lote['retirada'].dt.date >= inicio]
+        if fim is not None:
+            lote = lote[lote['retirada'].dt.date <= fim]
+        yield lote
+
+def status_armazem(armazem):
+    """Status presentes em todas as partições, para as opções da sidebar"""
+    return sorted({status for particao in armazem['particoes'].values() for status in particao['status']})
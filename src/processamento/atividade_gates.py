@@ -0,0 +1,45 @@
+import pandas as pd
+
+COLUNAS_ATIVIDADE = [
+    'hora', 'gate', 'atendimentos', 'inicio', 'fim', 'media_intervalo', 'usuario', 'media_tempo_atend',
+    'senhas_transferidas', 'tempo_operacao', 'atend_por_hora', 'percentual_contribuicao'
+]
+
+def calcular_atividade_gates(df):
+    """Atividade de cada gate em cada hora de início numa única agregação da base
+
+    Retorna uma linha por (hora, gate) com atendimentos, primeiro e último início (`inicio`/`fim`),
+    intervalo médio entre inícios e tempo médio de atendimento (min), tempo de operação (min),
+    atendimentos por hora de operação e participação (%) nas senhas da hora. Linhas sem gate
+    contam no total da hora, mas não geram linha própria.
+    """
+    df = df[df['inicio'].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_ATIVIDADE)
+
+    horas = df['inicio'].dt.hour.rename('hora')
+    duracao = ((df['fim'] - df['inicio']).dt.total_seconds() / 60).rename('tempo_atendimento')
+    total_hora = horas.value_counts()
+
+    agrupado = pd.concat([df[['id', 'inicio', 'usuário', 'guichê']], duracao], axis=1).groupby(
+        [horas, 'guichê'], sort=True
+    )
+    atividade = agrupado.agg(
+        atendimentos=('id', 'count'),
+        inicio=('inicio', 'min'),
+        fim=('inicio', 'max'),
+        linhas=('inicio', 'size'),
+        usuario=('usuário', 'first'),
+        media_tempo_atend=('tempo_atendimento', 'mean')
+    ).reset_index().rename(columns={'guichê': 'gate'})
+
+    # Média das diferenças entre inícios consecutivos: (último - primeiro) / (linhas - 1)
+    operacao = (atividade['fim'] - atividade['inicio']).dt.total_seconds() / 60
+    atividade['media_intervalo'] = operacao / (atividade['linhas'] - 1).where(atividade['linhas'] > 1)
+    atividade['senhas_transferidas'] = 0
+    atividade['tempo_operacao'] = operacao.round(0)
+    atividade['atend_por_hora'] = (atividade['atendimentos'] / (atividade['tempo_operacao'] / 60)).round(1)
+    atividade['percentual_contribuicao'] = (
+        atividade['atendimentos'] / atividade['hora'].map(total_hora) * 100
+    ).round(1)
+    return atividade[COLUNAS_ATIVIDADE]
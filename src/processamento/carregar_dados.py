@@ -4,7 +4,10 @@ import requests
 from io import BytesIO
 from datetime import datetime
 import base64
+import hashlib
 import os
+from processamento.validacao import LIMITES_PADRAO, indexar_validacao, aplicar_validacao
+from processamento.armazem import PASTA_ARMAZEM, gravar_base, versao_armazem
 
 @st.cache_data(ttl=3600)  # Cache por 1 hora
 def carregar_dados_github():
@@ -90,22 +93,27 @@ def carregar_dados_drive():
 
 @st.cache_data(ttl=3600, persist="disk", show_spinner=False)
 def validar_dados(df):
-    """Valida os dados com cache otimizado"""
+    """Converte as datas com cache otimizado e devolve também o relatório da carga"""
     try:
-        # Conversão de datas em uma única operação
+        # Conversão de datas em uma única operação (valores ilegíveis viram NaT e são reportados)
         date_columns = ['retirada', 'inicio', 'fim']
-        df[date_columns] = df[date_columns].apply(pd.to_datetime, format='mixed', dayfirst=True)
+        datas = df[date_columns].apply(pd.to_datetime, format='mixed', dayfirst=True, errors='coerce')
+        datas_invalidas = datas.isna() & df[date_columns].notna()
+        df[date_columns] = datas
         
-        # Filtro otimizado
-        mask = (
-            df['tpatend'].between(60, 1800) & 
-            (df['tpesper'] <= 14400) &
-            df['status'].isin(['ATENDIDO', 'TRANSFERIDA'])
-        )
-        return df[mask]
+        # As regras de tempo e status são aplicadas em tempo de consulta (processamento.validacao);
+        # aqui só saem as linhas com data ilegível
+        mask = ~datas_invalidas.any(axis=1)
+        
+        relatorio = {
+            'total_linhas': len(df),
+            'datas_invalidas': datas_invalidas.sum().astype(int).to_dict(),
+            'linhas_data_ilegivel': int((~mask).sum())
+        }
+        return df[mask], relatorio
     except Exception as e:
         st.error(f"Erro na validação: {str(e)}")
-        return None
+        return None, None
 
 def validar_colunas(df):
     """Valida e padroniza os nomes das colunas"""
@@ -166,11 +174,59 @@ def validar_colunas(df):
     
     return df
 
+def calcular_versao(df):
+    """Gera um identificador do conteúdo da base, usado como chave dos caches derivados"""
+    hash_linhas = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(hash_linhas.tobytes()).hexdigest()[:16]
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _preparar_dados(df_base, df_codigo, df_medias, relatorio):
+    """Junção com códigos, versão e índices de validação (ou gravação no armazém) uma vez por carga"""
+    df_final = pd.merge(
+        df_base,
+        df_codigo[['prefixo', 'CLIENTE', 'OPERAÇÃO']],
+        on='prefixo',
+        how='left'
+    )
+    df_final['tempo_permanencia'] = df_final['tpatend'] + df_final['tpesper']
+    
+    # Prefixos da base que não constam na planilha de códigos
+    linhas_por_prefixo = df_final['prefixo'].value_counts(dropna=False)
+    sem_codigo = linhas_por_prefixo[~linhas_por_prefixo.index.isin(df_codigo['prefixo'])]
+    
+    dados = {
+        'medias': df_medias,
+        'codigo': df_codigo,
+        'carga': {
+            **(relatorio or {'total_linhas': len(df_final), 'datas_invalidas': {}, 'linhas_data_ilegivel': 0}),
+            'prefixos_sem_codigo': sem_codigo.rename_axis('prefixo').reset_index(name='linhas')
+        }
+    }
+    if PASTA_ARMAZEM:
+        # Fora da memória: a carga vai para as partições em disco, que guardam o histórico inteiro
+        armazem = gravar_base(df_final, PASTA_ARMAZEM, calcular_versao(df_final))
+        dados.update({'armazem': armazem, 'versao_bruto': versao_armazem(armazem)})
+    else:
+        dados.update({
+            'bruto': df_final,
+            'indices_validacao': indexar_validacao(df_final),
+            'versao_bruto': calcular_versao(df_final)
+        })
+    return dados
+
+def montar_dados(df_base, df_codigo, df_medias, relatorio=None):
+    """Junta a base bruta com códigos, indexa para validação e devolve o dicionário do dashboard
+
+    A preparação fica em cache pelo conteúdo da carga: as reexecuções a cada interação só
+    aplicam a validação sobre a base já indexada.
+    """
+    return aplicar_validacao(_preparar_dados(df_base, df_codigo, df_medias, relatorio), LIMITES_PADRAO)
+
 def processar_dados(dados):
     """Processa os dados carregados"""
     try:
         df_base = validar_colunas(dados['base'])
-        df_base = validar_dados(df_base)
+        df_base, relatorio = validar_dados(df_base)
         
         if df_base is None:
             st.error("Falha ao validar dados da base")
@@ -181,19 +237,7 @@ def processar_dados(dados):
             st.error("Base de dados vazia após validação")
             return None
             
-        df_final = pd.merge(
-            df_base,
-            dados['codigo'][['prefixo', 'CLIENTE', 'OPERAÇÃO']],
-            on='prefixo',
-            how='left'
-        )
-        df_final['tempo_permanencia'] = df_final['tpatend'] + df_final['tpesper']
-        
-        return {
-            'base': df_final,
-            'medias': dados['medias'],
-            'codigo': dados['codigo']
-        }
+        return montar_dados(df_base, dados['codigo'], dados['medias'], relatorio)
     except Exception as e:
         st.error(f"❌ Erro no processamento: {str(e)}")
         return None
@@ -239,22 +283,10 @@ def carregar_dados():
                     
                     # Validações e processamento
                     df_base = validar_colunas(df_base)
-                    df_base = validar_dados(df_base)
+                    df_base, relatorio = validar_dados(df_base)
                     
                     if df_base is not None:
-                        df_final = pd.merge(
-                            df_base,
-                            df_codigo[['prefixo', 'CLIENTE', 'OPERAÇÃO']],
-                            on='prefixo',
-                            how='left'
-                        )
-                        df_final['tempo_permanencia'] = df_final['tpatend'] + df_final['tpesper']
-                        
-                        return {
-                            'base': df_final,
-                            'medias': df_medias,
-                            'codigo': df_codigo
-                        }
+                        return montar_dados(df_base, df_codigo, df_medias, relatorio)
                 except Exception as e:
                     st.error(f"❌ Erro ao processar arquivos enviados: {str(e)}")
                     return None
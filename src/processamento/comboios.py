@@ -0,0 +1,50 @@
+# Referências do limite de comboio: média e desvio de cada dia ou do período inteiro
+ESCOPOS = {'dia': 'Por dia', 'periodo': 'Período'}
+
+def contar_chegadas(df, minutos=15, por=None):
+    """Senhas retiradas por dia, grupo de `por` e faixa de `minutos`, em uma única agregação
+
+    Retorna [data, *por, faixa, retiradas] só com as faixas que tiveram retirada; `faixa` é o
+    horário de início da faixa.
+    """
+    por = [por] if isinstance(por, str) else list(por or [])
+    faixa = df['retirada'].dt.floor(f'{minutos}min')
+    return (
+        df['id']
+        .groupby([faixa.dt.normalize().rename('data'), *[df[coluna] for coluna in por], faixa.rename('faixa')])
+        .count()
+        .rename('retiradas')
+        .reset_index()
+    )
+
+def detectar_comboios(chegadas, por=None, escopo='dia', fator=1.0):
+    """Faixas acima de média + `fator` × desvio padrão das faixas da referência, do maior para o menor
+
+    Com escopo 'dia' a referência são as faixas do mesmo dia (e grupo); com 'periodo', todas as
+    faixas do grupo. Referências com uma só faixa não têm desvio e não geram comboio.
+    Retorna as faixas de `chegadas` com [limite, excesso].
+    """
+    if escopo not in ESCOPOS:
+        raise ValueError(f"Escopo não suportado: {escopo}")
+    por = [por] if isinstance(por, str) else list(por or [])
+    referencia = ['data', *por] if escopo == 'dia' else por
+
+    retiradas = chegadas['retiradas']
+    if referencia:
+        agrupado = chegadas.groupby(referencia)['retiradas']
+        media, desvio = agrupado.transform('mean'), agrupado.transform('std')
+    else:
+        media, desvio = retiradas.mean(), retiradas.std()
+    limite = media + fator * desvio
+
+    eventos = chegadas.assign(limite=limite, excesso=retiradas - limite)[retiradas > limite]
+    return eventos.sort_values(['retiradas', 'excesso'], ascending=False, kind='stable').reset_index(drop=True)
+
+def tabela_mapa_calor(chegadas):
+    """Retiradas por dia (mais recente primeiro) × hora do dia, com todas as 24 horas"""
+    return (
+        chegadas.groupby(['data', chegadas['faixa'].dt.hour.rename('hora')])['retiradas'].sum()
+        .unstack(fill_value=0)
+        .reindex(columns=range(24), fill_value=0)
+        .sort_index(ascending=False)
+    )
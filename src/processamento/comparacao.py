@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+def periodos_filtros(filtros):
+    """Períodos da sidebar no formato {sufixo: (inicio, fim)} usado na comparação"""
+    return {
+        'p1': (filtros['periodo1']['inicio'], filtros['periodo1']['fim']),
+        'p2': (filtros['periodo2']['inicio'], filtros['periodo2']['fim'])
+    }
+
+def rotular_periodos(df, periodos, coluna_data='data'):
+    """Marca cada linha com o período a que pertence; linhas em períodos sobrepostos aparecem uma vez por período"""
+    datas = pd.to_datetime(df[coluna_data]).values
+    posicoes, rotulos = [], []
+    for rotulo, (inicio, fim) in periodos.items():
+        limite_fim = pd.Timestamp(fim) + pd.Timedelta(days=1)
+        dentro = np.flatnonzero((datas >= pd.Timestamp(inicio)) & (datas < limite_fim))
+        posicoes.append(dentro)
+        rotulos.append(np.full(len(dentro), rotulo, dtype=object))
+
+    return df.take(np.concatenate(posicoes)).assign(periodo=np.concatenate(rotulos))
+
+def comparar_periodos(df, por, periodos, agregacao, coluna_data='data', como='outer', medida=None):
+    """Tabela lado a lado dos períodos numa única agregação, com diferença e variação percentual da medida
+
+    `agregacao` é um dicionário para `groupby.agg` ou uma função (df, chaves) -> DataFrame.
+    As colunas saem como `<coluna>_<período>`, mais `linhas_<período>` com as linhas de origem de cada grupo.
+    Com como='inner' ficam só os grupos presentes em todos os períodos; com 'outer' as ausências viram 0.
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    chaves = por + ['periodo']
+    rotulado = rotular_periodos(df, periodos, coluna_data)
+
+    if callable(agregacao):
+        agregado = agregacao(rotulado, chaves).set_index(chaves)
+    else:
+        agregado = rotulado.groupby(chaves).agg(agregacao)
+    agregado['linhas'] = rotulado.groupby(chaves).size()
+
+    # Uma coluna por (métrica, período), mesmo que algum período não tenha linhas
+    largo = agregado.unstack('periodo')
+    largo = largo.reindex(columns=pd.MultiIndex.from_product([agregado.columns, list(periodos)]))
+    largo.columns = [f'{coluna}_{rotulo}' for coluna, rotulo in largo.columns]
+
+    presentes = largo[[f'linhas_{rotulo}' for rotulo in periodos]].notna()
+    if como == 'inner':
+        largo = largo[presentes.all(axis=1)]
+    else:
+        largo = largo.fillna(0)
+
+    # O unstack converte contagens em float ao abrir buracos; depois do filtro/preenchimento elas voltam a inteiro
+    inteiras = [coluna for coluna in agregado.columns if pd.api.types.is_integer_dtype(agregado[coluna])]
+    largo = largo.astype({f'{coluna}_{rotulo}': 'int64' for coluna in inteiras for rotulo in periodos})
+
+    if medida is not None:
+        rotulos = list(periodos)
+        primeiro, ultimo = f'{medida}_{rotulos[0]}', f'{medida}_{rotulos[-1]}'
+        largo['diferenca'] = largo[ultimo] - largo[primeiro]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            largo['variacao'] = largo['diferenca'] / largo[primeiro] * 100
+
+    return largo.reset_index()
@@ -0,0 +1,161 @@
+import threading
+import numpy as np
+import pandas as pd
+from processamento.cubo import MEDIDAS_CUBO, montar_celulas, posicoes_no_cubo, construir_cubo
+from processamento.quantis import construir_esbocos
+from processamento.paralelo import obter_processos, fatiar_por_dias, executar_particionado
+
+# Consolidações diárias mais enxutas que o cubo, para consultas que não descem a colaborador/guichê
+CONSOLIDADOS = {
+    'cliente_operacao_hora': ['data', 'hora', 'CLIENTE', 'OPERAÇÃO', 'turno'],
+    'usuario': ['data', 'usuário', 'turno_atendimento'],
+    'guiche_hora': ['data', 'guichê', 'hora']
+}
+# Bases (versões) cujas partições são mantidas no repositório; as mais antigas são descartadas
+MAX_BASES_PARTICOES = 4
+COLUNAS_ADITIVAS = ['qtd'] + [f'{prefixo}_{medida}' for medida in MEDIDAS_CUBO for prefixo in ['n', 'soma', 'soma2']]
+
+def derivar_consolidados(cubo):
+    """Soma as células do cubo no grão de cada consolidação diária"""
+    return {
+        nome: cubo.groupby(dimensoes, dropna=False, sort=False)[COLUNAS_ADITIVAS].sum().reset_index()
+        for nome, dimensoes in CONSOLIDADOS.items()
+    }
+
+def assinar_dias(df, dias):
+    """Assinatura do conteúdo de cada dia: muda se qualquer linha do dia entrar, sair ou mudar"""
+    hashes = pd.Series(pd.util.hash_pandas_object(df, index=False).values, index=df.index)
+    resumo = hashes.groupby(dias).agg(['size', 'sum'])
+    return {dia: f"{linhas}:{soma}" for dia, (linhas, soma) in zip(resumo.index, resumo.values)}
+
+def _limites_por_dia(datas):
+    """Dias (como inteiros, NaT incluído) e faixas [inicio, fim) de cada um numa coluna já ordenada"""
+    dias = datas.values.view('int64')
+    chaves, inicios = np.unique(dias, return_index=True)
+    return chaves, inicios, np.append(inicios[1:], len(dias))
+
+def _ordenar_por_data(tabela):
+    return tabela.take(np.argsort(tabela['data'].values.view('int64'), kind='stable')).reset_index(drop=True)
+
+def _particionar_por_dia(df):
+    """Cubo, esboços e consolidados das linhas informadas, separados em uma partição por dia
+
+    As tabelas são ordenadas por dia e cada partição guarda fatias contíguas delas (sem cópia);
+    os ids de célula dos esboços continuam relativos ao cubo da fatia e são ajustados na montagem.
+    """
+    celulas = montar_celulas(df)
+    cubo = construir_cubo(df, celulas)
+    ordem = np.argsort(cubo['data'].values.view('int64'), kind='stable')
+    cubo = cubo.take(ordem).reset_index(drop=True)
+
+    # Esboços renumerados para a nova ordem do cubo e ordenados por célula (logo, por dia)
+    nova_posicao = np.empty(len(ordem), dtype='int64')
+    nova_posicao[ordem] = np.arange(len(ordem))
+    esbocos = {
+        medida: esboco.assign(celula=nova_posicao[esboco['celula'].values]).sort_values('celula', kind='stable')
+        for medida, esboco in construir_esbocos(df, posicoes_no_cubo(celulas)).items()
+    }
+    consolidados = {nome: _ordenar_por_data(tabela) for nome, tabela in derivar_consolidados(cubo).items()}
+
+    dias, inicios, fins = _limites_por_dia(cubo['data'])
+    faixas_esbocos = {
+        medida: (np.searchsorted(esboco['celula'].values, inicios), np.searchsorted(esboco['celula'].values, fins))
+        for medida, esboco in esbocos.items()
+    }
+    faixas_consolidados = {}
+    for nome, tabela in consolidados.items():
+        chaves, ini, fim = _limites_por_dia(tabela['data'])
+        faixas_consolidados[nome] = dict(zip(chaves, zip(ini, fim)))
+
+    particoes = {}
+    for i, dia in enumerate(dias):
+        particoes[dia] = {
+            'inicio_celula': inicios[i],
+            'cubo': cubo.iloc[inicios[i]:fins[i]],
+            'esbocos': {
+                medida: esboco.iloc[faixas_esbocos[medida][0][i]:faixas_esbocos[medida][1][i]]
+                for medida, esboco in esbocos.items()
+            },
+            'consolidados': {
+                nome: tabela.iloc[slice(*faixas_consolidados[nome][dia])]
+                for nome, tabela in consolidados.items()
+            }
+        }
+    return particoes
+
+def criar_repositorio_particoes():
+    """Repositório compartilhado de partições diárias: {assinatura: partição}, bases que as usam e trava"""
+    return {'particoes': {}, 'bases': {}, 'trava': threading.Lock()}
+
+def atualizar_particoes(df, repositorio, base):
+    """Partições dos dias de `df`, calculando só as que ainda não estão no repositório
+
+    `base` identifica a versão da base que usa as partições: o repositório guarda as partições
+    das últimas MAX_BASES_PARTICOES bases e descarta as demais. Devolve {dia: partição} com
+    referências próprias, que continuam válidas mesmo se outra sessão podar o repositório.
+    """
+    # Dias como inteiros (NaT vira um dia próprio, como no cubo)
+    dias = df['retirada'].dt.normalize().values.view('int64')
+    assinaturas = assinar_dias(df, dias)
+
+    with repositorio['trava']:
+        bases = repositorio['bases']
+        bases[base] = bases.pop(base, set()) | set(assinaturas.values())
+        while len(bases) > MAX_BASES_PARTICOES:
+            del bases[next(iter(bases))]
+        existentes = {
+            dia: repositorio['particoes'][assinatura]
+            for dia, assinatura in assinaturas.items() if assinatura in repositorio['particoes']
+        }
+
+    novas = {}
+    pendentes = [dia for dia in assinaturas if dia not in existentes]
+    if pendentes:
+        # Dias pendentes divididos em fatias processadas em paralelo; cada dia cai inteiro numa fatia
+        mascara = np.isin(dias, pendentes)
+        fatias = fatiar_por_dias(dias[mascara], obter_processos() * 2)
+        for parcial in executar_particionado(df[mascara], fatias, _particionar_por_dia):
+            novas.update(parcial)
+
+    with repositorio['trava']:
+        particoes = repositorio['particoes']
+        particoes.update({assinaturas[dia]: particao for dia, particao in novas.items()})
+        # Poda só o que nenhuma base registrada usa mais
+        em_uso = set().union(*repositorio['bases'].values())
+        for assinatura in set(particoes) - em_uso:
+            del particoes[assinatura]
+    return {**existentes, **novas}
+
+def montar_agregados(particoes, vazio):
+    """Cubo, esboços e consolidados a partir das partições {dia: partição}, em ordem de dia
+
+    `vazio` é um recorte sem linhas da base, usado para montar tabelas vazias com as colunas certas.
+    """
+    ordem = [particoes[dia] for dia in sorted(particoes)]
+    if not ordem:
+        cubo = construir_cubo(vazio)
+        return cubo, construir_esbocos(vazio, np.empty(0, dtype='int64')), derivar_consolidados(cubo)
+
+    # Concatena as partições levando os ids de célula dos esboços para a posição final no cubo
+    tamanhos = np.array([len(particao['cubo']) for particao in ordem])
+    deslocamentos = np.cumsum(np.r_[0, tamanhos[:-1]]) - np.array([particao['inicio_celula'] for particao in ordem])
+    cubo = pd.concat([particao['cubo'] for particao in ordem], ignore_index=True)
+    esbocos = {}
+    for medida in MEDIDAS_CUBO:
+        partes = [particao['esbocos'][medida] for particao in ordem]
+        esboco = pd.concat(partes, ignore_index=True)
+        esboco['celula'] += np.repeat(deslocamentos, [len(parte) for parte in partes])
+        esbocos[medida] = esboco
+    consolidados = {
+        nome: pd.concat([particao['consolidados'][nome] for particao in ordem], ignore_index=True)
+        for nome in CONSOLIDADOS
+    }
+    return cubo, esbocos, consolidados
+
+def construir_agregados(df, repositorio, base):
+    """Cubo, esboços e consolidados diários, recalculando só os dias novos ou alterados
+
+    `repositorio` (criar_repositorio_particoes) guarda as partições entre cargas e sessões;
+    `base` é a versão da base, usada para podar as partições que nenhuma base recente usa.
+    """
+    return montar_agregados(atualizar_particoes(df, repositorio, base), df.iloc[:0])
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Grão do cubo: dia e hora de retirada, cliente, operação, colaborador, guichê e os dois critérios de turno
+DIMENSOES_CUBO = ['data', 'hora', 'CLIENTE', 'OPERAÇÃO', 'usuário', 'guichê', 'turno', 'turno_atendimento']
+MEDIDAS_CUBO = ['tpatend', 'tpesper', 'tempo_permanencia']
+
+def rotular_turno(horas, inicio_turno_a):
+    """Rótulo de turno (janelas de 8h a partir do início do turno A) para um vetor de horas"""
+    horas = np.asarray(horas, dtype=float)
+    return np.select(
+        [
+            (horas >= inicio_turno_a) & (horas < inicio_turno_a + 8),
+            (horas >= inicio_turno_a + 8) & (horas < inicio_turno_a + 16)
+        ],
+        ['TURNO A', 'TURNO B'],
+        'TURNO C'
+    )
+
+def montar_celulas(df):
+    """Linhas da base projetadas nas dimensões do cubo, com contagem, soma e soma dos quadrados de cada medida"""
+    horas_retirada = df['retirada'].dt.hour
+    celulas = pd.DataFrame({
+        'data': df['retirada'].dt.normalize(),
+        'hora': horas_retirada,
+        'CLIENTE': df['CLIENTE'],
+        'OPERAÇÃO': df['OPERAÇÃO'],
+        'usuário': df['usuário'],
+        'guichê': df['guichê'],
+        # Abas de operação usam o horário de retirada (7h/15h/23h); as de pessoas, o de início (6h/14h/22h)
+        'turno': rotular_turno(horas_retirada, 7),
+        'turno_atendimento': rotular_turno(df['inicio'].dt.hour, 6),
+        'qtd': df['id'].notna().astype('int64')
+    })
+    for medida in MEDIDAS_CUBO:
+        valores = df[medida].astype('float64')
+        celulas[f'n_{medida}'] = valores.notna().astype('int64')
+        celulas[f'soma_{medida}'] = valores
+        celulas[f'soma2_{medida}'] = valores ** 2
+    return celulas
+
+def posicoes_no_cubo(celulas):
+    """Linha do cubo em que cada linha da base cai (mesma ordem de grupos de construir_cubo)"""
+    return celulas.groupby(DIMENSOES_CUBO, dropna=False, sort=False).ngroup().values
+
+def construir_cubo(df, celulas=None):
+    """Agrega a base no grão do cubo guardando contagem, soma e soma dos quadrados de cada medida"""
+    if celulas is None:
+        celulas = montar_celulas(df)
+    return celulas.groupby(DIMENSOES_CUBO, dropna=False, sort=False).sum().reset_index()
+
+def filtrar_cubo(cubo, inicio=None, fim=None, filtros=None):
+    """Restringe as células ao período [inicio, fim] e aos valores de cada dimensão informada"""
+    mask = np.ones(len(cubo), dtype=bool)
+    if inicio is not None:
+        mask &= (cubo['data'] >= pd.Timestamp(inicio)).values
+    if fim is not None:
+        mask &= (cubo['data'] <= pd.Timestamp(fim)).values
+
+    for coluna, valores in (filtros or {}).items():
+        if isinstance(valores, (list, tuple, set)):
+            mask &= cubo[coluna].isin(list(valores)).values
+        else:
+            mask &= (cubo[coluna] == valores).values
+    return cubo[mask]
+
+def agregar_cubo(cubo, por):
+    """Consolida as células pelas dimensões em `por`, derivando média e desvio padrão das medidas"""
+    colunas = ['qtd'] + [f'{prefixo}_{medida}' for medida in MEDIDAS_CUBO for prefixo in ['n', 'soma', 'soma2']]
+    agregado = cubo.groupby(por)[colunas].sum()
+
+    for medida in MEDIDAS_CUBO:
+        n = agregado[f'n_{medida}'].astype('float64')
+        soma = agregado[f'soma_{medida}']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            agregado[f'media_{medida}'] = soma / n.where(n > 0)
+            variancia = (agregado[f'soma2_{medida}'] - soma ** 2 / n.where(n > 0)) / (n - 1).where(n > 1)
+        agregado[f'desvio_{medida}'] = np.sqrt(variancia.clip(lower=0))
+
+    return agregado.reset_index()
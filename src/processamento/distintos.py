@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+from processamento.cubo import filtrar_cubo
+
+# Grão dos conjuntos: dia de retirada, hora de início do atendimento, cliente e operação
+GRAO_DISTINTOS = ['data', 'hora', 'CLIENTE', 'OPERAÇÃO']
+DIMENSOES_DISTINTAS = ['guichê', 'usuário', 'CLIENTE', 'OPERAÇÃO']
+
+def construir_distintos(df):
+    """Conjuntos exatos (bitsets) dos valores de cada dimensão em cada célula do grão
+
+    Gates, colaboradores, clientes e operações têm poucas centenas de valores no máximo, então
+    um bit por valor é exato e barato; a união de qualquer recorte é um OR das células.
+    """
+    chaves = pd.DataFrame({
+        'data': df['retirada'].dt.normalize(),
+        'hora': df['inicio'].dt.hour,
+        'CLIENTE': df['CLIENTE'],
+        'OPERAÇÃO': df['OPERAÇÃO'],
+        'qtd': df['id'].notna().astype('int64')
+    })
+    agrupado = chaves.groupby(GRAO_DISTINTOS, dropna=False, sort=False)
+    celulas = agrupado.ngroup().values
+    grao = agrupado['qtd'].sum().reset_index()
+
+    valores, bits = {}, {}
+    for dimensao in DIMENSOES_DISTINTAS:
+        codigos, valores[dimensao] = pd.factorize(df[dimensao])
+        validos = codigos >= 0
+        palavras = max(1, -(-len(valores[dimensao]) // 64))
+
+        conjunto = np.zeros((len(grao), palavras), dtype=np.uint64)
+        codigos = codigos[validos].astype(np.uint64)
+        np.bitwise_or.at(
+            conjunto,
+            (celulas[validos], (codigos // 64).astype(np.intp)),
+            np.left_shift(np.uint64(1), codigos % np.uint64(64))
+        )
+        bits[dimensao] = conjunto
+
+    return {'grao': grao, 'valores': valores, 'bits': bits}
+
+def combinar_distintos(partes):
+    """Junta conjuntos construídos em lotes com dias disjuntos, renumerando os bits para valores comuns"""
+    if len(partes) == 1:
+        return partes[0]
+
+    grao = pd.concat([parte['grao'] for parte in partes], ignore_index=True)
+    valores, bits = {}, {}
+    for dimensao in DIMENSOES_DISTINTAS:
+        valores[dimensao] = pd.Index(pd.unique(np.concatenate([
+            np.asarray(parte['valores'][dimensao], dtype=object) for parte in partes
+        ])))
+        palavras = max(1, -(-len(valores[dimensao]) // 64))
+
+        blocos = []
+        for parte in partes:
+            # Bits do lote abertos em colunas (um por valor do lote) e remapeados para o índice comum
+            locais = np.unpackbits(
+                np.ascontiguousarray(parte['bits'][dimensao]).view(np.uint8), axis=1, bitorder='little'
+            )[:, :len(parte['valores'][dimensao])].astype(bool)
+            abertos = np.zeros((len(locais), palavras * 64), dtype=bool)
+            abertos[:, valores[dimensao].get_indexer(parte['valores'][dimensao])] = locais
+            blocos.append(np.packbits(abertos, axis=1, bitorder='little').view(np.uint64))
+        bits[dimensao] = np.concatenate(blocos)
+
+    return {'grao': grao, 'valores': valores, 'bits': bits}
+
+def contar_bits(conjuntos):
+    """Quantidade de bits ligados em cada linha de uma matriz de bitsets"""
+    return np.unpackbits(np.ascontiguousarray(conjuntos).view(np.uint8), axis=1).sum(axis=1)
+
+def contar_distintos(distintos, dimensao, por=None, inicio=None, fim=None, filtros=None):
+    """Valores distintos da dimensão no recorte, no total (int) ou por uma coluna do grão (Series)
+
+    Valores nulos não contam, como em `nunique`.
+    """
+    grao = filtrar_cubo(distintos['grao'], inicio, fim, filtros)
+    conjuntos = distintos['bits'][dimensao][grao.index.values]
+
+    if por is None:
+        if len(conjuntos) == 0:
+            return 0
+        return int(contar_bits(np.bitwise_or.reduce(conjuntos, axis=0)[np.newaxis])[0])
+
+    codigos, grupos = pd.factorize(grao[por], sort=True)
+    validos = codigos >= 0
+    ordem = np.argsort(codigos[validos], kind='stable')
+    if len(ordem) == 0:
+        return pd.Series(dtype='int64', name=dimensao).rename_axis(por)
+
+    # União das células de cada grupo com um único reduceat sobre as linhas ordenadas
+    codigos_ordenados = codigos[validos][ordem]
+    inicios = np.flatnonzero(np.r_[True, codigos_ordenados[1:] != codigos_ordenados[:-1]])
+    unioes = np.bitwise_or.reduceat(conjuntos[validos][ordem], inicios, axis=0)
+    return pd.Series(
+        contar_bits(unioes),
+        index=pd.Index(grupos[codigos_ordenados[inicios]], name=por),
+        name=dimensao
+    )
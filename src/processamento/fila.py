@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from processamento.ocupacao import varrer_intervalos
+
+COLUNAS_FILA = ['minuto', 'horario', 'fila_maxima', 'fila_media']
+
+def calcular_fila(df, por=None):
+    """Pessoas esperando em cada minuto, com cada senha na fila da retirada ao início do atendimento
+
+    Senhas sem início (não atendidas) ou com início antes da retirada ficam de fora. Por minuto de
+    cada dia (e grupo de `por`) com espera, retorna [data, *por, minuto, horario, fila_maxima,
+    fila_media]: o maior tamanho da fila no minuto e o tamanho médio ponderado pelo tempo.
+    """
+    por = [por] if isinstance(por, str) else list(por or [])
+    colunas = ['data', *por, *COLUNAS_FILA]
+    validos = df[df['retirada'].notna() & df['inicio'].notna() & (df['inicio'] > df['retirada'])]
+    if por:
+        validos = validos.dropna(subset=por)
+    if validos.empty:
+        return pd.DataFrame(columns=colunas)
+
+    if por:
+        grupos, valores = pd.MultiIndex.from_frame(validos[por]).factorize(sort=True)
+    else:
+        grupos, valores = np.zeros(len(validos), dtype='int64'), None
+    origem = validos['retirada'].min().normalize()
+    inicios = (validos['retirada'] - origem).dt.total_seconds().values.astype('int64')
+    fins = (validos['inicio'] - origem).dt.total_seconds().values.astype('int64')
+    return varrer_intervalos(grupos, inicios, fins, origem, valores, por).rename(
+        columns={'pico': 'fila_maxima', 'media': 'fila_media'}
+    )[colunas]
+
+def resumir_fila_hora(fila):
+    """Maior fila e fila média em cada hora do dia, sobre todos os dias da tabela"""
+    horas = fila['minuto'] // 60
+    return (
+        fila.groupby(horas.rename('hora'))
+        .agg(fila_maxima=('fila_maxima', 'max'), fila_media=('fila_media', 'mean'))
+        .reindex(range(24), fill_value=0)
+        .reset_index()
+    )
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+def indexar_dia_hora(df, coluna='retirada'):
+    """Ordena as linhas por (dia, hora) da coluna e guarda a faixa de posições de cada par"""
+    horas = df[coluna].dt.floor('h').values
+    ordem = np.argsort(horas, kind='stable')
+    chaves, inicios = np.unique(horas[ordem], return_index=True)
+    fins = np.append(inicios[1:], len(ordem))
+
+    faixas = {}
+    for chave, ini, fim in zip(pd.DatetimeIndex(chaves), inicios, fins):
+        if pd.notna(chave):
+            faixas[(chave.date(), chave.hour)] = (ini, fim)
+    return {'ordem': ordem, 'faixas': faixas}
+
+def posicoes_dia_hora(indice, data=None, hora=None):
+    """Posições das linhas de um (dia, hora); sem dia, junta a hora de todos os dias"""
+    faixas = [
+        (ini, fim) for (dia, h), (ini, fim) in indice['faixas'].items()
+        if (data is None or dia == data) and (hora is None or h == hora)
+    ]
+    if not faixas:
+        return np.empty(0, dtype=np.intp)
+    return np.concatenate([indice['ordem'][ini:fim] for ini, fim in faixas])
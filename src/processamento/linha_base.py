@@ -0,0 +1,94 @@
+import warnings
+import numpy as np
+import pandas as pd
+from processamento.cubo import agregar_cubo
+from processamento.metricas import MEDIDAS
+
+# Fator que torna o desvio absoluto mediano comparável ao desvio padrão numa distribuição normal
+FATOR_MAD = 1.4826
+
+def _serie(agregado, medida, por):
+    """Valor da medida por [data(, hora)] somando as células do agregado"""
+    config = MEDIDAS[medida]
+    return agregar_cubo(agregado, por).set_index(por)[config['valor']] * config['escala']
+
+def _grade(inicio, fim, por):
+    """Todas as datas (e horas) entre inicio e fim, inclusive"""
+    datas = pd.date_range(pd.Timestamp(inicio), pd.Timestamp(fim), freq='D', name='data')
+    if por == ['data']:
+        return datas
+    return pd.MultiIndex.from_product([datas, range(24)], names=por)
+
+def _deslocar(indice, deslocamento):
+    """Mesmo índice com as datas deslocadas (horas mantidas)"""
+    if isinstance(indice, pd.MultiIndex):
+        return pd.MultiIndex.from_arrays(
+            [indice.get_level_values(0) + deslocamento, indice.get_level_values(1)], names=indice.names
+        )
+    return indice + deslocamento
+
+def calcular_linha_base(agregado, medida, inicio, fim, semanas=4, por_hora=False, historico=None):
+    """Valor de cada dia (ou dia/hora) do período contra a mediana do mesmo dia da semana e o ano anterior
+
+    `agregado` são células diárias (cubo ou consolidado) já filtradas; `historico` é o intervalo
+    (primeira, última data) coberto pela base, fora do qual não há referência. Dentro dele, dias
+    sem atendimento valem zero na quantidade e ficam sem valor nas médias.
+    Retorna [data(, hora), dia_semana, valor, mediana_semanas, semanas_validas, desvio_pct,
+    z_robusto, valor_ano_anterior, variacao_ano].
+    """
+    if medida not in MEDIDAS:
+        raise ValueError(f"Medida não suportada: {medida}")
+
+    por = ['data', 'hora'] if por_hora else ['data']
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    if historico is None:
+        historico = (agregado['data'].min(), agregado['data'].max())
+    primeira, ultima = pd.Timestamp(historico[0]), pd.Timestamp(historico[1])
+
+    # Só as células das semanas anteriores, do período e do mesmo período no ano anterior
+    datas = agregado['data']
+    necessarias = (
+        ((datas >= inicio - pd.Timedelta(days=7 * semanas)) & (datas <= fim)) |
+        ((datas >= inicio - pd.DateOffset(years=1)) & (datas <= fim - pd.DateOffset(years=1)))
+    )
+    serie = _serie(agregado[necessarias.values], medida, por)
+
+    def consultar(indice):
+        """Valores da série num índice qualquer, respeitando o intervalo coberto pela base"""
+        valores = serie.reindex(indice).values.astype('float64')
+        dias = indice.get_level_values('data') if isinstance(indice, pd.MultiIndex) else indice
+        coberto = np.asarray((dias >= primeira) & (dias <= ultima))
+        if medida == 'quantidade':
+            valores = np.where(np.isnan(valores) & coberto, 0.0, valores)
+        return np.where(coberto, valores, np.nan)
+
+    alvo = _grade(inicio, fim, por)
+    valor = consultar(alvo)
+
+    # Uma coluna por semana anterior: mesmo dia da semana (e hora) 7, 14, ... dias antes
+    anteriores = np.column_stack([
+        consultar(_deslocar(alvo, -pd.Timedelta(days=7 * semana))) for semana in range(1, semanas + 1)
+    ])
+    validas = (~np.isnan(anteriores)).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        # Linhas sem nenhuma semana válida ficam sem mediana
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mediana = np.nanmedian(anteriores, axis=1)
+        mad = np.nanmedian(np.abs(anteriores - mediana[:, np.newaxis]), axis=1) * FATOR_MAD
+        desvio_pct = (valor - mediana) / np.where(mediana != 0, mediana, np.nan) * 100
+        z_robusto = (valor - mediana) / np.where(mad > 0, mad, np.nan)
+
+    ano_anterior = consultar(_deslocar(alvo, pd.DateOffset(years=-1)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variacao_ano = (valor - ano_anterior) / np.where(ano_anterior != 0, ano_anterior, np.nan) * 100
+
+    resultado = alvo.to_frame(index=False)
+    resultado['dia_semana'] = resultado['data'].dt.dayofweek
+    resultado['valor'] = valor
+    resultado['mediana_semanas'] = mediana
+    resultado['semanas_validas'] = validas
+    resultado['desvio_pct'] = desvio_pct
+    resultado['z_robusto'] = z_robusto
+    resultado['valor_ano_anterior'] = ano_anterior
+    resultado['variacao_ano'] = variacao_ano
+    return resultado
@@ -0,0 +1,102 @@
+import pandas as pd
+from processamento.cubo import agregar_cubo
+from processamento.comparacao import comparar_periodos
+from processamento.quantis import calcular_quantis, rotulo_quantil
+
+# Dimensões do cubo pelas quais as abas comparam os períodos
+DIMENSOES = ['CLIENTE', 'OPERAÇÃO', 'usuário', 'guichê', 'turno', 'hora']
+
+# Medidas: coluna de valor e de contagem do cubo agregado e fator para a unidade exibida
+MEDIDAS = {
+    'quantidade': {'valor': 'qtd', 'contagem': 'qtd', 'escala': 1},
+    'tpatend': {'valor': 'media_tpatend', 'contagem': 'n_tpatend', 'escala': 1 / 60},
+    'tpesper': {'valor': 'media_tpesper', 'contagem': 'n_tpesper', 'escala': 1 / 60},
+    'tempo_permanencia': {'valor': 'media_tempo_permanencia', 'contagem': 'n_tempo_permanencia', 'escala': 1 / 60}
+}
+
+# Layout da planilha de médias usado pelas abas de tempo
+COLUNAS_MEDIAS = ['CLIENTE', 'OPERAÇÃO', 'TEMPO DE ATENDIMENTO (MEDIA)', 'TURNO A', 'TURNO B']
+COLUNA_META = 'TEMPO DE ATENDIMENTO (MEDIA)'
+
+def calcular_tabela_metrica(celulas, dimensao, medida, periodos, como='inner', quantil=None, esbocos=None):
+    """Compara a medida por dimensão entre os períodos a partir de células do cubo
+
+    Com `quantil` (ex.: 0.9) o valor é o percentil da medida, combinado dos esboços das células.
+    Retorna [dimensao, valor_p*, contagem_p*, linhas_p*, variacao], com tempos em minutos.
+    """
+    if dimensao not in DIMENSOES:
+        raise ValueError(f"Dimensão não suportada: {dimensao}")
+    if medida not in MEDIDAS:
+        raise ValueError(f"Medida não suportada: {medida}")
+
+    config = MEDIDAS[medida]
+    if quantil is None:
+        agregacao, valor, contagem = agregar_cubo, config['valor'], config['contagem']
+    else:
+        if esbocos is None or medida not in esbocos:
+            raise ValueError(f"Sem esboço de quantis para a medida: {medida}")
+        valor, contagem = rotulo_quantil(quantil), 'n'
+        agregacao = lambda df, chaves: calcular_quantis(df, esbocos[medida], chaves, [quantil])
+
+    comparacao = comparar_periodos(
+        celulas, dimensao, periodos, agregacao,
+        como=como, medida=valor
+    )
+
+    tabela = pd.DataFrame({dimensao: comparacao[dimensao]})
+    for rotulo in periodos:
+        tabela[f'valor_{rotulo}'] = comparacao[f"{valor}_{rotulo}"] * config['escala']
+        tabela[f'contagem_{rotulo}'] = comparacao[f"{contagem}_{rotulo}"]
+        tabela[f'linhas_{rotulo}'] = comparacao[f'linhas_{rotulo}']
+    # A variação percentual não depende da escala
+    tabela['variacao'] = comparacao['variacao']
+    return tabela
+
+def converter_para_minutos(valor):
+    """Converte diferentes formatos de tempo para minutos"""
+    if pd.isna(valor):
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        try:
+            # Tenta converter string HH:MM ou HH:MM:SS para minutos
+            partes = valor.split(':')
+            if len(partes) == 2:
+                horas, minutos = map(int, partes)
+                return horas * 60 + minutos
+            elif len(partes) == 3:
+                horas, minutos, segundos = map(int, partes)
+                return horas * 60 + minutos + segundos / 60
+        except:
+            return None
+    if hasattr(valor, 'hour') and hasattr(valor, 'minute'):  # datetime.time object
+        return valor.hour * 60 + valor.minute
+    return None
+
+def extrair_metas(df_medias, dimensao):
+    """Metas em minutos por valor da dimensão, lidas da planilha de médias (None sem planilha)"""
+    if df_medias is None:
+        return None
+    if len(df_medias.columns) != len(COLUNAS_MEDIAS):
+        return pd.DataFrame(columns=[dimensao, 'meta'])
+
+    # Primeira linha é cabeçalho
+    medias = df_medias.iloc[1:].copy()
+    medias.columns = COLUNAS_MEDIAS
+    if dimensao not in medias.columns:
+        return pd.DataFrame(columns=[dimensao, 'meta'])
+
+    metas = pd.DataFrame({
+        dimensao: medias[dimensao],
+        'meta': pd.to_numeric(medias[COLUNA_META].apply(converter_para_minutos), errors='coerce')
+    })
+    return metas.dropna().drop_duplicates(subset=[dimensao]).reset_index(drop=True)
+
+def calcular_desvio_meta(tabela, metas, dimensao, coluna='valor_p2'):
+    """Junta as metas à tabela e marca o desvio de cada grupo (valor - meta)"""
+    analise = tabela.merge(metas, on=dimensao, how='left')
+    analise['desvio'] = analise[coluna] - analise['meta']
+    analise['dentro_meta'] = analise[coluna] <= analise['meta']
+    analise['acima_meta'] = analise[coluna] > analise['meta']
+    return analise
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+# Intervalos acima disso não contam como ociosidade (saída, troca de turno)
+INTERVALO_MAXIMO = 7200
+COLUNAS_DIARIA = ['colaborador', 'data', 'tempo_ocioso', 'qtd_intervalos']
+
+def calcular_ociosidade(df):
+    """Tempo ocioso de cada colaborador por dia de retirada, numa única ordenação da base
+
+    Intervalo é o tempo entre o fim de um atendimento e o início do seguinte do mesmo colaborador
+    no mesmo dia; valem só os de 0 a 7200s e, havendo mais de um, o maior do dia (almoço) sai.
+    Dias sem intervalo válido não aparecem.
+    """
+    df = df[df['usuário'].notna() & df['retirada'].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_DIARIA)
+
+    codigos, usuarios = pd.factorize(df['usuário'], sort=True)
+    dias = df['retirada'].dt.normalize().values
+    ordem = np.lexsort((df['inicio'].values, dias, codigos))
+    codigos, dias = codigos[ordem], dias[ordem]
+    inicio, fim = df['inicio'].values[ordem], df['fim'].values[ordem]
+
+    # Cada linha contra a seguinte da ordenação, quando as duas são do mesmo colaborador e dia
+    mesmo_dia = (codigos[1:] == codigos[:-1]) & (dias[1:] == dias[:-1])
+    intervalos = (inicio[1:] - fim[:-1]) / np.timedelta64(1, 's')
+    validos = mesmo_dia & (intervalos > 0) & (intervalos <= INTERVALO_MAXIMO)
+
+    resumo = (
+        pd.DataFrame({
+            'codigo': codigos[:-1][validos],
+            'dia': dias[:-1][validos],
+            'intervalo': intervalos[validos]
+        })
+        .groupby(['codigo', 'dia'], sort=True)['intervalo']
+        .agg(['sum', 'max', 'size'])
+    )
+    # O maior intervalo do dia é presumivelmente o almoço, quando há mais de um
+    almoco = resumo['size'] > 1
+
+    return pd.DataFrame({
+        'colaborador': usuarios[resumo.index.get_level_values('codigo')],
+        'data': pd.DatetimeIndex(resumo.index.get_level_values('dia')).date,
+        'tempo_ocioso': (resumo['sum'] - resumo['max'].where(almoco, 0)).values,
+        'qtd_intervalos': (resumo['size'] - almoco).values
+    }, columns=COLUNAS_DIARIA)
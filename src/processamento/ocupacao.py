@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+MINUTOS_DIA = 24 * 60
+COLUNAS_OCUPACAO = ['minuto', 'horario', 'gates_simultaneos', 'gates_media']
+
+def _intervalos_gates(df, por):
+    """Intervalos [inicio, fim) em segundos desde a meia-noite do primeiro dia, unidos por gate e grupo
+
+    Atendimentos sobrepostos ou encostados do mesmo gate viram um único intervalo, para que o gate
+    conte uma vez. Retorna (grupos, inicios, fins, origem, valores dos grupos).
+    """
+    validos = df[
+        df['inicio'].notna() & df['fim'].notna() & df['guichê'].notna() & (df['fim'] > df['inicio'])
+    ]
+    if por:
+        validos = validos.dropna(subset=por)
+    if validos.empty:
+        return None
+
+    if por:
+        grupos, valores = pd.MultiIndex.from_frame(validos[por]).factorize(sort=True)
+    else:
+        grupos, valores = np.zeros(len(validos), dtype='int64'), None
+    gates, nomes_gates = pd.factorize(validos['guichê'])
+    origem = validos['inicio'].min().normalize()
+    inicios = ((validos['inicio'] - origem).dt.total_seconds()).values.astype('int64')
+    fins = ((validos['fim'] - origem).dt.total_seconds()).values.astype('int64')
+
+    # Chave (grupo, gate) deslocada no tempo: um único cummax percorre todos os gates ordenados
+    chave = grupos.astype('int64') * len(nomes_gates) + gates
+    ordem = np.lexsort((inicios, chave))
+    deslocamento = chave[ordem] * (fins.max() + 1)
+    a, b = inicios[ordem] + deslocamento, fins[ordem] + deslocamento
+    fim_corrente = np.maximum.accumulate(b)
+    novo = np.r_[True, a[1:] > fim_corrente[:-1]]
+    posicoes = np.flatnonzero(novo)
+    fins_unidos = np.maximum.reduceat(b, posicoes) - deslocamento[posicoes]
+    return grupos[ordem][posicoes], inicios[ordem][posicoes], fins_unidos, origem, valores
+
+def varrer_intervalos(grupos, inicios, fins, origem, valores, por):
+    """Quantidade de intervalos [inicio, fim) abertos em cada minuto, por varredura dos eventos
+
+    `inicios`/`fins` são segundos desde `origem` (meia-noite) e `grupos` os códigos dos valores de
+    `por` (MultiIndex `valores`). Os intervalos entram como +1/-1 numa única ordenação de eventos e
+    a soma acumulada dá quantos estão abertos em cada instante. Por minuto de cada dia (e grupo)
+    com atividade, retorna [data, *por, minuto, horario, pico, media], com o pico no minuto e a
+    média ponderada pelo tempo.
+    """
+    ordem = np.argsort(grupos, kind='stable')
+    grupos, inicios, fins = grupos[ordem], inicios[ordem], fins[ordem]
+
+    # Eventos de todos os grupos numa linha do tempo só: cada grupo ocupa um trecho próprio e,
+    # como seus eventos somam zero, o acumulado volta a zero na passagem entre grupos
+    trecho = (fins.max() // 86400 + 1) * 86400
+    tempos = np.r_[inicios, fins] + np.r_[grupos, grupos] * trecho
+    tempos, deltas = np.unique(tempos, return_inverse=True)
+    deltas = np.bincount(deltas, weights=np.r_[np.ones(len(inicios)), -np.ones(len(fins))], minlength=len(tempos))
+    nivel = np.cumsum(deltas)
+    integral = np.r_[0, np.cumsum(nivel[:-1] * np.diff(tempos))]
+
+    # Dias com atividade de cada grupo, do primeiro início ao último fim
+    limites_grupo = np.r_[0, np.flatnonzero(np.diff(grupos)) + 1]
+    dia_inicio = np.minimum.reduceat(inicios // 86400, limites_grupo)
+    dia_fim = np.maximum.reduceat((fins - 1) // 86400, limites_grupo)
+    grupo_dia = np.repeat(grupos[limites_grupo], dia_fim - dia_inicio + 1)
+    dia = np.concatenate([np.arange(primeiro, ultimo + 1) for primeiro, ultimo in zip(dia_inicio, dia_fim)])
+    minutos = np.tile(np.arange(MINUTOS_DIA), len(dia))
+    segundos = np.repeat(grupo_dia * trecho + dia * 86400, MINUTOS_DIA) + minutos * 60
+
+    def consultar(instantes):
+        """Nível e integral acumulada do número de intervalos abertos em cada instante"""
+        k = np.searchsorted(tempos, instantes, side='right') - 1
+        nivel_k = np.where(k >= 0, nivel[np.maximum(k, 0)], 0)
+        integral_k = np.where(k >= 0, integral[np.maximum(k, 0)] + nivel_k * (instantes - tempos[np.maximum(k, 0)]), 0)
+        return nivel_k, integral_k
+
+    nivel_inicio, integral_inicio = consultar(segundos)
+    _, integral_fim = consultar(segundos + 60)
+
+    # Pico do minuto: nível no começo do minuto ou após qualquer evento dentro dele
+    minuto_evento = tempos // 60
+    limites = np.r_[0, np.flatnonzero(np.diff(minuto_evento)) + 1]
+    pico_evento = np.maximum.reduceat(nivel, limites)
+    k = np.searchsorted(minuto_evento[limites], segundos // 60)
+    k_valido = np.minimum(k, len(limites) - 1)
+    dentro = minuto_evento[limites][k_valido] == segundos // 60
+    pico = np.where(dentro, np.maximum(nivel_inicio, pico_evento[k_valido]), nivel_inicio)
+
+    resultado = pd.DataFrame({'data': origem + pd.to_timedelta(np.repeat(dia, MINUTOS_DIA), unit='D')})
+    codigos = np.repeat(grupo_dia, MINUTOS_DIA)
+    for i, coluna in enumerate(por):
+        resultado[coluna] = pd.Categorical.from_codes(codigos, valores.levels[i][valores.codes[i]])
+    resultado['minuto'] = minutos
+    resultado['horario'] = resultado['data'] + pd.to_timedelta(minutos, unit='min')
+    resultado['pico'] = pico.astype('int64')
+    resultado['media'] = (integral_fim - integral_inicio) / 60
+    return resultado
+
+def calcular_ocupacao(df, por=None):
+    """Gates atendendo ao mesmo tempo em cada minuto de cada dia (e grupo de `por`) com atividade
+
+    Retorna [data, *por, minuto, horario, gates_simultaneos, gates_media]: o pico de gates em
+    atendimento no minuto e a média ponderada pelo tempo.
+    """
+    por = [por] if isinstance(por, str) else list(por or [])
+    colunas = ['data', *por, *COLUNAS_OCUPACAO]
+    intervalos = _intervalos_gates(df, por)
+    if intervalos is None:
+        return pd.DataFrame(columns=colunas)
+    return varrer_intervalos(*intervalos, por).rename(
+        columns={'pico': 'gates_simultaneos', 'media': 'gates_media'}
+    )[colunas]
+
+def resumir_ocupacao_hora(ocupacao):
+    """Pico de gates simultâneos e média de gates em atendimento em cada hora do dia"""
+    horas = ocupacao['minuto'] // 60
+    return (
+        ocupacao.groupby(horas.rename('hora'))
+        .agg(gates_simultaneos=('gates_simultaneos', 'max'), gates_media=('gates_media', 'mean'))
+        .reindex(range(24), fill_value=0)
+        .reset_index()
+    )
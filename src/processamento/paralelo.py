@@ -0,0 +1,106 @@
+import os
+import atexit
+import shutil
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Abaixo disso o custo de subir processos supera o ganho
+MIN_LINHAS_PARALELO = 200_000
+
+# Pool único reaproveitado por todas as chamadas e sessões, criado na primeira execução paralela
+_POOL = None
+_TRAVA_POOL = threading.Lock()
+
+def obter_processos():
+    """Quantidade de processos do executor: DASHBOARD_PROCESSOS, ou 1 (sem pool) quando não configurado"""
+    configurado = os.getenv('DASHBOARD_PROCESSOS')
+    if configurado:
+        return max(1, int(configurado))
+    return 1
+
+def fatiar_por_dias(dias, n_fatias):
+    """Divide as linhas em fatias de dias consecutivos com volumes parecidos; devolve as posições de cada fatia"""
+    ordem = np.argsort(dias, kind='stable')
+    dias_ordenados = dias[ordem]
+    # Cortes só em troca de dia, para que cada dia fique inteiro numa única fatia
+    trocas = np.flatnonzero(np.r_[True, dias_ordenados[1:] != dias_ordenados[:-1]])
+    alvos = np.linspace(0, len(ordem), n_fatias + 1)[1:-1]
+    cortes = np.unique(trocas[np.clip(np.searchsorted(trocas, alvos), 0, len(trocas) - 1)])
+    cortes = cortes[cortes > 0]
+    return [fatia for fatia in np.split(ordem, cortes) if len(fatia)]
+
+def _obter_pool(processos):
+    """Pool forkserver compartilhado: os filhos nascem de um servidor limpo, não do servidor com threads"""
+    global _POOL
+    with _TRAVA_POOL:
+        if _POOL is None:
+            contexto = multiprocessing.get_context('forkserver')
+            contexto.set_forkserver_preload(['processamento.paralelo'])
+            _POOL = ProcessPoolExecutor(max_workers=processos, mp_context=contexto)
+            atexit.register(_POOL.shutdown, cancel_futures=True)
+        return _POOL
+
+def _descartar_pool(pool):
+    """Tira de uso um pool quebrado (filho morto) para que a próxima chamada crie outro"""
+    global _POOL
+    with _TRAVA_POOL:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _mapear_colunas(df, pasta):
+    """Grava cada coluna como .npy na pasta; textos e tipos estendidos vão como códigos + valores distintos"""
+    colunas = []
+    for posicao, nome in enumerate(df.columns):
+        serie = df.iloc[:, posicao]
+        arquivo = os.path.join(pasta, f'{posicao}.npy')
+        if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biufmM':
+            np.save(arquivo, serie.values)
+            valores = None
+        else:
+            codigos, valores = pd.factorize(serie, use_na_sentinel=False)
+            np.save(arquivo, codigos)
+        colunas.append((nome, arquivo, valores))
+    return colunas
+
+def _aplicar_fatia(tarefa):
+    """Monta no filho o DataFrame da fatia lendo só as posições dela dos arquivos mapeados"""
+    funcao, colunas, posicoes = tarefa
+    dados = {}
+    for nome, arquivo, valores in colunas:
+        fatia = np.load(arquivo, mmap_mode='r')[posicoes]
+        dados[nome] = fatia if valores is None else valores.take(fatia)
+    return funcao(pd.DataFrame(dados))
+
+def executar_particionado(df, fatias, funcao, processos=None, min_linhas=MIN_LINHAS_PARALELO):
+    """Aplica `funcao` a cada fatia (posições) da base num pool de processos e devolve os parciais em ordem
+
+    `funcao` precisa ser de nível de módulo (ou um partial dela). Com um único processo (o padrão
+    sem DASHBOARD_PROCESSOS), sem forkserver (Windows) ou com bases abaixo de `min_linhas`, roda em
+    série no próprio processo. As colunas chegam aos filhos como arquivos .npy mapeados em memória
+    (em /dev/shm quando existe), e cada filho lê só as linhas da sua fatia.
+    """
+    processos = obter_processos() if processos is None else processos
+    paralelo = (
+        processos > 1 and len(fatias) > 1 and len(df) >= min_linhas
+        and 'forkserver' in multiprocessing.get_all_start_methods()
+    )
+    if not paralelo:
+        return [funcao(df.take(posicoes)) for posicoes in fatias]
+
+    pasta = tempfile.mkdtemp(prefix='dashboard_', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        colunas = _mapear_colunas(df, pasta)
+        pool = _obter_pool(processos)
+        try:
+            return list(pool.map(_aplicar_fatia, [(funcao, colunas, posicoes) for posicoes in fatias]))
+        except BrokenProcessPool:
+            _descartar_pool(pool)
+            raise
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
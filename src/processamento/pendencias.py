@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# Tempo mínimo para uma senha ainda ser atendida na faixa em que foi retirada
+MINUTOS_ATENDIMENTO = 8
+
+def acumular_pendencias(saldo):
+    """Pendências ao fim de cada faixa pela recorrência P[t] = max(0, P[t-1] + saldo[t]), com P[-1] = 0
+
+    `saldo` (retiradas - atendidas) tem uma linha por série e uma coluna por faixa. A recorrência
+    equivale ao passeio acumulado refletido em zero: S[t] - min(0, min(S[:t+1])).
+    """
+    acumulado = np.cumsum(saldo, axis=-1)
+    return acumulado - np.minimum(np.minimum.accumulate(acumulado, axis=-1), 0)
+
+def calcular_pendencias(df, minutos=60, por=None, minutos_atendimento=MINUTOS_ATENDIMENTO):
+    """Retiradas, atendidas, viáveis e pendências (bola de neve) por dia, grupo e faixa de `minutos`
+
+    Cada dia de retirada (e valor de `por`, se houver) é uma série de faixas do dia inteiro que
+    começa sem pendências; atendidas contam na faixa do início, dentro do dia da retirada.
+    Senhas viáveis são as retiradas com pelo menos `minutos_atendimento` restantes na faixa.
+    Retorna [data, *por, faixa, hora, retiradas, atendidas, senhas_viaveis, senhas_inviaveis, pendentes],
+    com `hora` em horas (fracionária abaixo de 60 minutos).
+    """
+    por = [por] if isinstance(por, str) else list(por or [])
+    faixas = 24 * 60 // minutos
+    colunas = ['data', *por, 'faixa', 'hora', 'retiradas', 'atendidas', 'senhas_viaveis', 'senhas_inviaveis', 'pendentes']
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+
+    def faixa(coluna):
+        return ((df[coluna].dt.hour * 60 + df[coluna].dt.minute) // minutos).rename('faixa')
+
+    chaves = [df['retirada'].dt.normalize().rename('data'), *[df[coluna] for coluna in por]]
+    viavel = df['retirada'].dt.minute % minutos <= minutos - minutos_atendimento
+    contagens = pd.concat([
+        df.groupby([*chaves, faixa('retirada')]).size().rename('retiradas'),
+        df['id'].groupby([*chaves, faixa('inicio')]).count().rename('atendidas'),
+        viavel.groupby([*chaves, faixa('retirada')]).sum().rename('senhas_viaveis')
+    ], axis=1)
+
+    # Todas as faixas do dia para cada série, em blocos contíguos: uma linha da matriz por série
+    series = contagens.index.droplevel('faixa').unique().sort_values()
+    grade = pd.MultiIndex.from_arrays(
+        [np.repeat(series.get_level_values(nivel), faixas) for nivel in range(series.nlevels)]
+        + [np.tile(np.arange(faixas), len(series))],
+        names=['data', *por, 'faixa']
+    )
+    tabela = contagens.reindex(grade, fill_value=0).fillna(0).astype('int64')
+    tabela['senhas_inviaveis'] = tabela['retiradas'] - tabela['senhas_viaveis']
+
+    saldo = (tabela['retiradas'] - tabela['atendidas']).values.reshape(len(series), faixas)
+    tabela['pendentes'] = acumular_pendencias(saldo).ravel()
+
+    tabela = tabela.reset_index()
+    tabela['hora'] = tabela['faixa'] if minutos == 60 else tabela['faixa'] * minutos / 60
+    return tabela[colunas]
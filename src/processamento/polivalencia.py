@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+COLUNAS_SOMA = ['qtd', 'n_tpatend', 'soma_tpatend']
+
+def construir_matrizes(celulas, dimensao):
+    """Matrizes colaborador × valor da dimensão com quantidade e tempo médio de atendimento (min)"""
+    agrupado = celulas.groupby(['usuário', dimensao])[COLUNAS_SOMA].sum()
+    quantidade = agrupado['qtd'].unstack(fill_value=0)
+    tempo = (agrupado['soma_tpatend'] / agrupado['n_tpatend'].where(agrupado['n_tpatend'] > 0) / 60).unstack()
+    return quantidade, tempo
+
+def calcular_distribuicao(quantidade):
+    """Desvio padrão da participação (%) dos valores atendidos por cada colaborador"""
+    participacao = quantidade.div(quantidade.sum(axis=1), axis=0) * 100
+    return participacao.where(quantidade > 0).std(axis=1)
+
+def calcular_metricas_polivalencia(celulas):
+    """Métricas de polivalência de todos os colaboradores a partir das células do cubo
+
+    Retorna (metricas, matrizes), em que matrizes guarda (quantidade, tempo) por colaborador
+    × operação e × cliente, usadas nos níveis e no detalhe de cada colaborador.
+    """
+    matrizes = {
+        'operacoes': construir_matrizes(celulas, 'OPERAÇÃO'),
+        'clientes': construir_matrizes(celulas, 'CLIENTE')
+    }
+    por_usuario = celulas.groupby('usuário')[COLUNAS_SOMA].sum()
+    usuarios = por_usuario.index
+
+    # Turno predominante pelo horário de início; empate fica com o primeiro em ordem alfabética
+    turnos = celulas.groupby(['usuário', 'turno_atendimento'])['qtd'].sum().unstack(fill_value=0)
+    ops_qtd, _ = matrizes['operacoes']
+    cli_qtd, _ = matrizes['clientes']
+
+    metricas = pd.DataFrame({
+        'colaborador': usuarios,
+        'turno': turnos.idxmax(axis=1).reindex(usuarios).values,
+        'num_operacoes': (ops_qtd > 0).sum(axis=1).reindex(usuarios, fill_value=0).values,
+        'num_clientes': (cli_qtd > 0).sum(axis=1).reindex(usuarios, fill_value=0).values,
+        'distribuicao_ops': calcular_distribuicao(ops_qtd).reindex(usuarios).values,
+        'distribuicao_clientes': calcular_distribuicao(cli_qtd).reindex(usuarios).values,
+        'total_atendimentos': por_usuario['qtd'].values,
+        'tempo_medio': (
+            por_usuario['soma_tpatend'] / por_usuario['n_tpatend'].where(por_usuario['n_tpatend'] > 0) / 60
+        ).values
+    })
+    return metricas, matrizes
+
+def calcular_niveis(quantidade, tempo, colunas=None):
+    """Nível (0 a 1) de cada colaborador em cada valor: 70% tempo relativo (menor é melhor) e 30% volume
+
+    Volume e tempo são relativos ao maior valor do próprio colaborador. Com `colunas`, valores
+    que o colaborador não atendeu entram com nível zero.
+    """
+    if colunas is not None:
+        quantidade = quantidade.reindex(columns=colunas, fill_value=0)
+        tempo = tempo.reindex(columns=colunas)
+
+    volumes = quantidade.div(quantidade.max(axis=1), axis=0)
+    tempo_max = tempo.max(axis=1).values[:, np.newaxis]
+    # Sem tempo no valor conta como o maior tempo do colaborador (nível de tempo zero)
+    tempos = 1 - np.where(tempo.isna(), tempo_max, tempo.values) / tempo_max
+    return 0.7 * pd.DataFrame(tempos, index=tempo.index, columns=tempo.columns) + 0.3 * volumes
+
+TURNOS = ['TURNO A', 'TURNO B', 'TURNO C']
+COLUNAS_RANKING_TURNO = ['colaborador', 'num_operacoes', 'num_clientes', 'total_atendimentos', 'score']
+
+def _resumo_grupos(celulas, por):
+    """Volume, tempo e valores distintos (nulos não contam) de cada grupo numa agregação das células"""
+    agrupado = celulas.groupby(por, sort=True)
+    resumo = agrupado[COLUNAS_SOMA].sum()
+    colunas = [coluna for coluna in ['usuário', 'OPERAÇÃO', 'CLIENTE'] if coluna not in np.atleast_1d(por)]
+    return resumo.join(agrupado[colunas].nunique())
+
+def _ranking_turno(por_usuario, total):
+    """Ranking dos colaboradores contra os totais do turno: 40% operações, 40% clientes e 20% volume"""
+    por_usuario = por_usuario.drop(index='Ceparking', errors='ignore')
+    por_usuario = por_usuario[por_usuario['qtd'] > 0]
+    score = (
+        por_usuario['OPERAÇÃO'] / max(total['OPERAÇÃO'], 1) * 0.4 +
+        por_usuario['CLIENTE'] / max(total['CLIENTE'], 1) * 0.4 +
+        por_usuario['qtd'] / max(total['qtd'], 1) * 0.2
+    ) * 100
+    ranking = pd.DataFrame({
+        'colaborador': por_usuario.index,
+        'num_operacoes': por_usuario['OPERAÇÃO'].values,
+        'num_clientes': por_usuario['CLIENTE'].values,
+        'total_atendimentos': por_usuario['qtd'].values,
+        'score': score.values
+    }, columns=COLUNAS_RANKING_TURNO)
+    return ranking.sort_values('score', ascending=False, kind='stable').reset_index(drop=True)
+
+def calcular_polivalencia_turnos(celulas):
+    """Métricas de cada turno (horário de início) e rankings de polivalência numa passada pelas células
+
+    Retorna (turnos, rankings): `turnos` indexado por turno com total_atendimentos, media_tempo (min),
+    colaboradores, operacoes, clientes e as distribuições por operação e cliente; `rankings` tem o
+    ranking de cada turno e de 'Todos', com distintos e volume comparados aos totais do recorte.
+    """
+    por_turno = _resumo_grupos(celulas, 'turno_atendimento').reindex(TURNOS, fill_value=0)
+    por_turno_usuario = _resumo_grupos(celulas, ['turno_atendimento', 'usuário'])
+    distribuicoes = {
+        coluna: celulas.groupby(['turno_atendimento', coluna])['qtd'].sum()
+        for coluna in ['OPERAÇÃO', 'CLIENTE']
+    }
+
+    def distribuicao(coluna, turno):
+        if turno not in distribuicoes[coluna].index.get_level_values(0):
+            return {}
+        return distribuicoes[coluna].loc[turno].sort_values(ascending=False, kind='stable').to_dict()
+
+    n_tpatend = por_turno['n_tpatend']
+    turnos = pd.DataFrame({
+        'total_atendimentos': por_turno['qtd'].astype('int64'),
+        'media_tempo': por_turno['soma_tpatend'] / n_tpatend.where(n_tpatend > 0) / 60,
+        'colaboradores': por_turno['usuário'].astype('int64'),
+        'operacoes': por_turno['OPERAÇÃO'].astype('int64'),
+        'clientes': por_turno['CLIENTE'].astype('int64'),
+        'distribuicao_ops': [distribuicao('OPERAÇÃO', turno) for turno in TURNOS],
+        'distribuicao_clientes': [distribuicao('CLIENTE', turno) for turno in TURNOS]
+    }, index=pd.Index(TURNOS, name='turno'))
+
+    rankings = {'Todos': _ranking_turno(_resumo_grupos(celulas, 'usuário'), {
+        'OPERAÇÃO': celulas['OPERAÇÃO'].nunique(),
+        'CLIENTE': celulas['CLIENTE'].nunique(),
+        'qtd': celulas['qtd'].sum()
+    })}
+    for turno in TURNOS:
+        if turno in por_turno_usuario.index.get_level_values(0):
+            por_usuario = por_turno_usuario.loc[turno]
+        else:
+            por_usuario = por_turno_usuario.iloc[:0].droplevel(0)
+        rankings[turno] = _ranking_turno(por_usuario, por_turno.loc[turno])
+    return turnos, rankings
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from processamento.cubo import MEDIDAS_CUBO
+
+# Faixas logarítmicas: cada faixa cobre (GAMA^(i-2), GAMA^(i-1)] segundos, erro relativo de ~1% nos quantis
+GAMA = 1.02
+QUANTIS_PADRAO = (0.5, 0.9, 0.95)
+
+def indice_faixa(valores):
+    """Faixa logarítmica de cada tempo em segundos; tempos abaixo de 1s caem na faixa 0"""
+    valores = np.asarray(valores, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        faixas = np.ceil(np.log(valores) / np.log(GAMA)) + 1
+    return np.where(valores >= 1, faixas, 0).astype('int16')
+
+def valor_faixa(faixas):
+    """Valor representativo de cada faixa (ponto de menor erro relativo dentro dela)"""
+    faixas = np.asarray(faixas, dtype='float64')
+    return np.where(faixas > 0, 2 * GAMA ** (faixas - 1) / (GAMA + 1), 0.0)
+
+def rotulo_quantil(quantil):
+    """Nome da coluna do quantil (0.9 -> 'p90')"""
+    return f"p{quantil * 100:g}"
+
+def construir_esbocos(df, posicoes):
+    """Histograma esparso (célula, faixa, qtd) de cada medida, alinhado às linhas do cubo
+
+    `posicoes` é a linha do cubo de cada registro (ver posicoes_no_cubo). Somar as contagens
+    das células de um recorte dá o histograma do recorte inteiro, por isso os esboços se combinam
+    em qualquer agregação do cubo.
+    """
+    esbocos = {}
+    for medida in MEDIDAS_CUBO:
+        valores = df[medida].astype('float64').values
+        validos = ~np.isnan(valores)
+        esbocos[medida] = (
+            pd.DataFrame({
+                'celula': posicoes[validos],
+                'faixa': indice_faixa(valores[validos])
+            })
+            .groupby(['celula', 'faixa'], sort=True)
+            .size()
+            .reset_index(name='qtd')
+        )
+    return esbocos
+
+def calcular_quantis(celulas, esboco, por, quantis=QUANTIS_PADRAO):
+    """Quantis (em segundos) da medida por grupo, combinando os esboços das células do cubo
+
+    Retorna [por..., n, p50, ...]; `celulas` precisa manter o índice original do cubo.
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    # Células repetidas (ex.: períodos sobrepostos) contam uma vez em cada grupo
+    selecionado = esboco.merge(celulas[por], left_on='celula', right_index=True)
+    histograma = selecionado.groupby(por + ['faixa'])['qtd'].sum().reset_index()
+
+    grupos = histograma.groupby(por, sort=False)['qtd']
+    acumulado = grupos.cumsum()
+    total = grupos.transform('sum')
+
+    resultado = grupos.sum().rename('n').to_frame()
+    for quantil in quantis:
+        # Primeira faixa cuja contagem acumulada passa da posição do quantil
+        alcancadas = histograma[acumulado > quantil * (total - 1)]
+        faixas = alcancadas.groupby(por, sort=False)['faixa'].first()
+        resultado[rotulo_quantil(quantil)] = pd.Series(valor_faixa(faixas), index=faixas.index)
+    return resultado.reset_index()
@@ -0,0 +1,186 @@
+from functools import partial
+import numpy as np
+import pandas as pd
+from processamento.paralelo import obter_processos, fatiar_por_dias, executar_particionado
+
+# Cada chegada simulada custa bem mais que uma linha agregada: o pool compensa em bases menores
+MIN_CHEGADAS_PARALELO = 10_000
+# Limite de elementos (dias × replicações × chegadas) das matrizes de um bloco de dias
+MAX_ELEMENTOS_BLOCO = 4_000_000
+
+COLUNAS_SIMULACAO = [
+    'hora', 'gates', 'retiradas', 'espera_media', 'espera_p10', 'espera_p90', 'pendentes', 'espera_observada'
+]
+
+def escala_historica(df):
+    """Gates por hora do dia: média dos gates distintos que iniciaram atendimento, nos dias em que a hora teve atendimento"""
+    atendidos = df[df['inicio'].notna() & df['guichê'].notna()]
+    gates = atendidos.groupby(
+        [atendidos['inicio'].dt.normalize().rename('data'), atendidos['inicio'].dt.hour.rename('hora')]
+    )['guichê'].nunique()
+    return gates.groupby('hora').mean().round().reindex(range(24), fill_value=0).astype('int64').values
+
+def amostras_servico(df):
+    """Tempos de atendimento (s) observados por OPERAÇÃO, com a chave None para o conjunto todo"""
+    atendidos = df[df['tpatend'] > 0]
+    amostras = {
+        operacao: grupo.values.astype('int64')
+        for operacao, grupo in atendidos.groupby('OPERAÇÃO')['tpatend']
+    }
+    amostras[None] = atendidos['tpatend'].values.astype('int64')
+    return amostras
+
+def _abertura_gates(escala):
+    """Gates abertos por hora (gate g abre nas horas com escala > g) e horas até a próxima abertura"""
+    escala = np.asarray(escala, dtype='int64')
+    aberto = np.arange(escala.max())[:, None] < escala[None, :]
+    # Horas até a próxima hora aberta, dando a volta no dia: percorre dois dias de trás para frente
+    atraso = np.zeros(aberto.shape, dtype='int64')
+    proxima = np.full(len(aberto), np.iinfo('int64').max // 2)
+    for h in range(47, -1, -1):
+        proxima = np.where(aberto[:, h % 24], h, proxima)
+        if h < 24:
+            atraso[:, h] = proxima - h
+    return aberto, atraso
+
+def _simular_bloco(chegadas, servicos, escala):
+    """Fila FCFS dos dias do bloco com gates abertos por hora, todas as replicações a cada passo
+
+    `chegadas` (dias, n) são segundos desde a meia-noite, ordenados e completados com a última
+    chegada; `servicos` (dias, replicações, n) os tempos sorteados (zero nos complementos).
+    Cada chegada vai para o gate que pode começar antes: livre e em hora aberta (o atendimento
+    pode passar do fechamento). Retorna os inícios (dias, replicações, n).
+    """
+    aberto, atraso = _abertura_gates(escala)
+
+    def abrir(tempos, gates):
+        """Primeiro instante a partir de `tempos` em que cada gate está aberto"""
+        hora = tempos // 3600
+        hora_dia = hora % 24
+        return np.where(aberto[gates, hora_dia], tempos, (hora + atraso[gates, hora_dia]) * 3600)
+
+    gates = np.arange(len(aberto))
+    dias, replicacoes, n = servicos.shape
+    # Livre de cada gate já levado à próxima hora aberta: a chegada só precisa ser ajustada por
+    # (dia, gate), igual em todas as replicações, e o candidato é o maior dos dois
+    livre = np.broadcast_to(abrir(np.zeros(len(gates), dtype='int64'), gates), (dias, replicacoes, len(gates))).copy()
+    inicios = np.empty((dias, replicacoes, n), dtype='int64')
+    for j in range(n):
+        candidato = np.maximum(livre, abrir(chegadas[:, j, None], gates[None, :])[:, None, :])
+        gate = candidato.argmin(axis=2)[..., None]
+        inicio = np.take_along_axis(candidato, gate, axis=2)
+        np.put_along_axis(livre, gate, abrir(inicio + servicos[:, :, j, None], gate), axis=2)
+        inicios[:, :, j] = inicio[..., 0]
+    return inicios
+
+def _simular_dias(df, escala, amostras, replicacoes, semente):
+    """Somas por replicação e hora da espera (s) e das pendências ao fim da hora nos dias de `df`
+
+    Cada dia começa sem fila e sorteia seus tempos com a semente (semente, dia), de modo que o
+    resultado não depende de como os dias são fatiados entre processos.
+    """
+    datas = df['retirada'].dt.normalize()
+    dias = datas.values.view('int64') // (86400 * 10**9)
+    segundos = ((df['retirada'] - datas).dt.total_seconds()).values.astype('int64')
+    operacoes = df['OPERAÇÃO'].values
+    ordem = np.lexsort((segundos, dias))
+    dias, segundos, operacoes = dias[ordem], segundos[ordem], operacoes[ordem]
+    chaves, inicio_dia, chegadas_dia = np.unique(dias, return_index=True, return_counts=True)
+
+    resultado = {
+        'soma_espera': np.zeros((replicacoes, 24)),
+        'soma_pendentes': np.zeros((replicacoes, 24)),
+        'retiradas': np.zeros(24, dtype='int64'),
+        'dias': len(chaves)
+    }
+    # Blocos de dias consecutivos com matrizes de tamanho limitado
+    bloco = max(1, MAX_ELEMENTOS_BLOCO // (replicacoes * max(chegadas_dia.max(), 1)))
+    for primeiro in range(0, len(chaves), bloco):
+        indices = range(primeiro, min(primeiro + bloco, len(chaves)))
+        n = chegadas_dia[indices.start:indices.stop].max()
+        chegadas = np.empty((len(indices), n), dtype='int64')
+        servicos = np.zeros((len(indices), replicacoes, n), dtype='int64')
+        for linha, i in enumerate(indices):
+            fatia = slice(inicio_dia[i], inicio_dia[i] + chegadas_dia[i])
+            chegadas[linha, :chegadas_dia[i]] = segundos[fatia]
+            chegadas[linha, chegadas_dia[i]:] = segundos[fatia][-1]
+            rng = np.random.default_rng([semente, int(chaves[i])])
+            codigos, valores = pd.factorize(operacoes[fatia], use_na_sentinel=False)
+            for codigo, operacao in enumerate(valores):
+                posicoes = np.flatnonzero(codigos == codigo)
+                amostra = amostras.get(operacao)
+                if amostra is None or not len(amostra):
+                    amostra = amostras[None]
+                servicos[linha][:, posicoes] = amostra[rng.integers(len(amostra), size=(replicacoes, len(posicoes)))]
+
+        inicios = _simular_bloco(chegadas, servicos, escala)
+        valido = np.arange(n)[None, :] < chegadas_dia[indices.start:indices.stop, None]
+        hora_chegada = np.broadcast_to((chegadas // 3600)[:, None, :], inicios.shape)
+        mascara = np.broadcast_to(valido[:, None, :], inicios.shape)
+        replicacao = np.broadcast_to(np.arange(replicacoes)[None, :, None], inicios.shape)
+
+        # Espera somada por (replicação, hora da retirada)
+        posicao = (replicacao * 24 + hora_chegada)[mascara]
+        resultado['soma_espera'] += np.bincount(
+            posicao, weights=(inicios - chegadas[:, None, :])[mascara], minlength=replicacoes * 24
+        ).reshape(replicacoes, 24)
+
+        # Pendências ao fim de cada hora: retiradas até ali menos atendimentos iniciados até ali
+        serie = (np.arange(len(indices))[:, None, None] * replicacoes + replicacao)[mascara]
+        horas_inicio = np.minimum(inicios // 3600, 24)[mascara]
+        iniciados = np.bincount(serie * 25 + horas_inicio, minlength=len(indices) * replicacoes * 25)
+        iniciados = iniciados.reshape(len(indices), replicacoes, 25)[:, :, :24].cumsum(axis=2)
+        retiradas = np.zeros((len(indices), 24), dtype='int64')
+        np.add.at(retiradas, (np.nonzero(valido)[0], (chegadas // 3600)[valido]), 1)
+        resultado['soma_pendentes'] += (retiradas.cumsum(axis=1)[:, None, :] - iniciados).sum(axis=0)
+        resultado['retiradas'] += retiradas.sum(axis=0)
+    return resultado
+
+def simular_escala(df, escala=None, replicacoes=100, semente=0, processos=None):
+    """Monte Carlo da fila por hora repetindo as retiradas do período sob uma escala de gates por hora
+
+    As chegadas são as retiradas históricas; cada replicação sorteia o tempo de atendimento de
+    cada senha entre os observados na sua OPERAÇÃO. `escala` tem 24 posições (gates abertos em
+    cada hora; a histórica se None). Os dias são divididos entre processos e, dentro de cada
+    processo, as replicações avançam juntas a cada chegada. Retorna por hora [hora, gates,
+    retiradas, espera_media, espera_p10, espera_p90, pendentes, espera_observada]: espera média
+    (min) das senhas retiradas na hora, com o intervalo de 10% a 90% entre replicações, e
+    pendências médias ao fim da hora.
+    """
+    df = df[df['retirada'].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_SIMULACAO)
+    escala = escala_historica(df) if escala is None else np.asarray(escala, dtype='int64')
+    if len(escala) != 24:
+        raise ValueError("A escala deve ter 24 horas")
+    if escala.max() <= 0:
+        raise ValueError("A escala não tem gates abertos")
+    amostras = amostras_servico(df)
+    if not len(amostras[None]):
+        raise ValueError("Não há tempos de atendimento para sortear")
+
+    base = df[['retirada', 'OPERAÇÃO']]
+    dias = base['retirada'].dt.normalize().values.view('int64')
+    fatias = fatiar_por_dias(dias, obter_processos() if processos is None else processos)
+    parciais = executar_particionado(
+        base, fatias, partial(_simular_dias, escala=escala, amostras=amostras, replicacoes=replicacoes, semente=semente),
+        processos, min_linhas=MIN_CHEGADAS_PARALELO
+    )
+    soma_espera = sum(parcial['soma_espera'] for parcial in parciais)
+    soma_pendentes = sum(parcial['soma_pendentes'] for parcial in parciais)
+    retiradas = sum(parcial['retiradas'] for parcial in parciais)
+    total_dias = sum(parcial['dias'] for parcial in parciais)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        espera = soma_espera / retiradas / 60
+    observada = df['tpesper'].groupby(df['retirada'].dt.hour).mean().reindex(range(24)) / 60
+    return pd.DataFrame({
+        'hora': range(24),
+        'gates': escala,
+        'retiradas': retiradas,
+        'espera_media': espera.mean(axis=0),
+        'espera_p10': np.quantile(espera, 0.1, axis=0),
+        'espera_p90': np.quantile(espera, 0.9, axis=0),
+        'pendentes': soma_pendentes.mean(axis=0) / total_dias,
+        'espera_observada': observada.values
+    })
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from processamento.cubo import agregar_cubo
+from processamento.metricas import DIMENSOES, MEDIDAS
+from processamento.quantis import calcular_quantis, rotulo_quantil
+
+# Granularidades das janelas consecutivas (semanas de segunda a domingo)
+FREQUENCIAS = {'Diária': 'D', 'Semanal': 'W', 'Mensal': 'M'}
+
+def janelas_tendencia(fim, frequencia, quantidade):
+    """Início das `quantidade` janelas consecutivas que terminam na janela que contém `fim`"""
+    ultima = pd.Timestamp(fim).to_period(frequencia)
+    return pd.period_range(end=ultima, periods=quantidade).start_time
+
+def calcular_tendencia(celulas, dimensao, medida, frequencia, janelas, quantil=None, esbocos=None, historico=None):
+    """Medida por dimensão em cada janela numa única agregação das células do cubo
+
+    `historico` é o intervalo (primeira, última data) coberto pela base; janelas fora dele ficam
+    sem valor. Dentro dele, janelas sem atendimento valem zero na quantidade e ficam sem valor
+    nas médias. Retorna [dimensao, janela, valor, contagem] com todas as combinações de grupo e
+    janela (contagem zero nas janelas sem dados); tempos em minutos.
+    """
+    if dimensao not in DIMENSOES:
+        raise ValueError(f"Dimensão não suportada: {dimensao}")
+    if medida not in MEDIDAS:
+        raise ValueError(f"Medida não suportada: {medida}")
+
+    config = MEDIDAS[medida]
+    # Mesmo índice das células: os esboços são casados pela posição no cubo
+    celulas = celulas.assign(janela=celulas['data'].dt.to_period(frequencia).dt.start_time)
+    por = [dimensao, 'janela']
+    if quantil is None:
+        agregado = agregar_cubo(celulas, por)
+        valor, contagem = config['valor'], config['contagem']
+    else:
+        if esbocos is None or medida not in esbocos:
+            raise ValueError(f"Sem esboço de quantis para a medida: {medida}")
+        agregado = calcular_quantis(celulas, esbocos[medida], por, [quantil])
+        valor, contagem = rotulo_quantil(quantil), 'n'
+
+    grupos = agregado[dimensao].drop_duplicates().sort_values()
+    grade = pd.MultiIndex.from_product([grupos, janelas], names=por)
+    # Na quantidade valor e contagem são a mesma coluna
+    tendencia = agregado.set_index(por)[list(dict.fromkeys([valor, contagem]))].reindex(grade)
+    valores = tendencia[valor].values * config['escala']
+
+    # Janela coberta: a base tem dados de algum dia dela
+    if historico is None:
+        historico = (celulas['data'].min(), celulas['data'].max())
+    primeira, ultima = pd.Timestamp(historico[0]), pd.Timestamp(historico[1])
+    inicios = grade.get_level_values('janela')
+    coberta = np.asarray(
+        (inicios >= primeira.to_period(frequencia).start_time) & (inicios <= ultima.to_period(frequencia).start_time)
+    )
+    if medida == 'quantidade':
+        # Janela coberta sem atendimento tem quantidade zero, não ausente
+        valores = np.where(np.isnan(valores) & coberta, 0.0, valores)
+    valores = np.where(coberta, valores, np.nan)
+    return pd.DataFrame({
+        dimensao: grade.get_level_values(dimensao),
+        'janela': grade.get_level_values('janela'),
+        'valor': valores,
+        'contagem': tendencia[contagem].fillna(0).astype('int64').values
+    })
+
+def resumir_tendencia(tendencia, dimensao):
+    """Uma linha por grupo com a série das janelas (para sparklines), último valor e variação
+
+    A variação compara a última janela com a média das anteriores.
+    """
+    if tendencia.empty:
+        return pd.DataFrame(columns=[dimensao, 'serie', 'ultimo', 'media_anterior', 'variacao', 'total'])
+
+    valores = tendencia.pivot(index=dimensao, columns='janela', values='valor').sort_index(axis=1)
+    contagens = tendencia.pivot(index=dimensao, columns='janela', values='contagem')
+    anteriores = valores.iloc[:, :-1].mean(axis=1)
+    ultimo = valores.iloc[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variacao = ((ultimo - anteriores) / anteriores.where(anteriores != 0) * 100).round(2)
+
+    return pd.DataFrame({
+        dimensao: valores.index,
+        'serie': [[None if pd.isna(v) else float(v) for v in linha] for linha in valores.values],
+        'ultimo': ultimo.values,
+        'media_anterior': anteriores.values,
+        'variacao': variacao.values,
+        'total': contagens.sum(axis=1).values
+    }).sort_values('total', ascending=False).reset_index(drop=True)
@@ -0,0 +1,217 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import hashlib
+from processamento.consolidados import construir_agregados, atualizar_particoes, montar_agregados, criar_repositorio_particoes
+from processamento.distintos import construir_distintos, combinar_distintos
+from processamento.armazem import ler_lotes
+
+# Regras usadas até a escolha do usuário na sidebar
+LIMITES_PADRAO = {
+    'tpatend_min': 60,
+    'tpatend_max': 1800,
+    'tpesper_max': 14400,
+    'status': ('ATENDIDO', 'TRANSFERIDA')
+}
+
+# Fora da memória, sem períodos escolhidos, a base das abas cobre os últimos dias do armazém
+JANELA_PADRAO_DIAS = 60
+
+def indexar_validacao(df):
+    """Ordenações de tpatend/tpesper e códigos de status para validar em tempo de consulta"""
+    indices = {}
+    for coluna in ['tpatend', 'tpesper']:
+        valores = pd.to_numeric(df[coluna], errors='coerce').values
+        ordem = np.argsort(valores, kind='stable')
+        indices[coluna] = {'ordem': ordem, 'valores': valores[ordem]}
+
+    codigos, status = pd.factorize(df['status'])
+    indices['status'] = {'codigos': codigos, 'valores': status}
+    return indices
+
+def mascara_faixa(indice, minimo=None, maximo=None):
+    """Linhas com valor em [minimo, maximo] via busca binária no vetor ordenado"""
+    valores = indice['valores']
+    inicio = 0 if minimo is None else np.searchsorted(valores, minimo, side='left')
+    # NaN fica no fim da ordenação e nunca entra na faixa
+    fim = np.searchsorted(valores, np.inf if maximo is None else maximo, side='right')
+
+    mascara = np.zeros(len(valores), dtype=bool)
+    mascara[indice['ordem'][inicio:fim]] = True
+    return mascara
+
+def mascara_status(indice, status_aceitos):
+    """Linhas cujo status está entre os aceitos, comparando só os códigos
+
+    Os status são comparados como texto, como são oferecidos na sidebar.
+    """
+    aceitos = np.flatnonzero(np.isin(indice['valores'].astype(str), list(status_aceitos)))
+    return np.isin(indice['codigos'], aceitos)
+
+def normalizar_limites(limites):
+    """Converte os limites em tupla ordenada, usada como chave de cache"""
+    return tuple(sorted(
+        (chave, tuple(sorted(valor)) if isinstance(valor, (list, tuple, set)) else valor)
+        for chave, valor in {**LIMITES_PADRAO, **(limites or {})}.items()
+    ))
+
+def montar_falhas(regras, atendimento_ok, espera_ok, status_ok, index):
+    """Tabela com uma coluna booleana por regra, True onde a linha é rejeitada"""
+    return pd.DataFrame({
+        f"tpatend fora de {regras['tpatend_min']}-{regras['tpatend_max']}s": ~atendimento_ok,
+        f"tpesper acima de {regras['tpesper_max']}s": ~espera_ok,
+        'status não aceito': ~status_ok
+    }, index=index)
+
+def calcular_falhas_lote(df, regras):
+    """Mesmas regras de montar_falhas comparando direto, para lotes lidos do armazém sem índices"""
+    tpatend = pd.to_numeric(df['tpatend'], errors='coerce')
+    tpesper = pd.to_numeric(df['tpesper'], errors='coerce')
+    return montar_falhas(
+        regras,
+        tpatend.between(regras['tpatend_min'], regras['tpatend_max']).values,
+        (tpesper <= regras['tpesper_max']).values,
+        (df['status'].notna() & df['status'].astype(str).isin(regras['status'])).values,
+        df.index
+    )
+
+def gerar_relatorio_qualidade(df, falhas, mask):
+    """Resume as rejeições por regra, dia e cliente a partir das máscaras já calculadas"""
+    rejeitadas = falhas[~mask].assign(
+        data=df.loc[~mask, 'retirada'].dt.date,
+        CLIENTE=df.loc[~mask, 'CLIENTE']
+    )
+    rejeicoes = rejeitadas.melt(id_vars=['data', 'CLIENTE'], var_name='regra', value_name='rejeitada')
+    rejeicoes = (
+        rejeicoes[rejeicoes['rejeitada']]
+        .groupby(['regra', 'data', 'CLIENTE'], dropna=False)
+        .size()
+        .reset_index(name='quantidade')
+    )
+
+    validos = df[mask]
+    ids_duplicados = int(validos['id'].duplicated(keep=False).sum()) if 'id' in validos.columns else 0
+
+    return {
+        'linhas_validas': int(mask.sum()),
+        'linhas_rejeitadas': int((~mask).sum()),
+        'rejeitadas_por_regra': falhas.sum().astype(int).to_dict(),
+        'rejeicoes': rejeicoes,
+        'ids_duplicados': ids_duplicados
+    }
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _particoes_diarias(limites):
+    """Partições diárias dos agregados por conjunto de limites, reaproveitadas entre cargas e sessões"""
+    return criar_repositorio_particoes()
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _aplicar_validacao_cache(_df, _indices, versao_bruto, limites):
+    """Base válida, agregados (cubo, esboços, consolidados, distintos) e relatório de qualidade em cache por versão e limites"""
+    regras = dict(limites)
+    falhas = montar_falhas(
+        regras,
+        mascara_faixa(_indices['tpatend'], regras['tpatend_min'], regras['tpatend_max']),
+        mascara_faixa(_indices['tpesper'], None, regras['tpesper_max']),
+        mascara_status(_indices['status'], regras['status']),
+        _df.index
+    )
+    mask = ~falhas.any(axis=1)
+
+    df_valido = _df[mask]
+    # Uma nova carga só reprocessa os dias que mudaram
+    cubo, esbocos, consolidados = construir_agregados(df_valido, _particoes_diarias(limites), versao_bruto)
+    versao_limites = hashlib.sha1(repr(limites).encode()).hexdigest()[:8]
+    return (
+        df_valido,
+        cubo,
+        esbocos,
+        consolidados,
+        construir_distintos(df_valido),
+        f"{versao_bruto}:{versao_limites}",
+        gerar_relatorio_qualidade(_df, falhas, mask)
+    )
+
+def combinar_relatorios(relatorios, contagens_ids):
+    """Soma os relatórios de qualidade dos lotes; IDs duplicados são contados na base inteira"""
+    contagens = pd.concat(contagens_ids).groupby(level=0, dropna=False).sum()
+    return {
+        'total_linhas': sum(r['linhas_validas'] + r['linhas_rejeitadas'] for r in relatorios),
+        'linhas_validas': sum(r['linhas_validas'] for r in relatorios),
+        'linhas_rejeitadas': sum(r['linhas_rejeitadas'] for r in relatorios),
+        'rejeitadas_por_regra': (
+            pd.DataFrame([r['rejeitadas_por_regra'] for r in relatorios]).sum().astype(int).to_dict()
+        ),
+        # Lotes têm dias disjuntos, então as rejeições por dia não se repetem entre eles
+        'rejeicoes': pd.concat([r['rejeicoes'] for r in relatorios], ignore_index=True),
+        'ids_duplicados': int(contagens[contagens > 1].sum())
+    }
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _agregar_armazem_cache(_armazem, versao, limites):
+    """Agregados e relatório de qualidade do armazém, validando e agregando um lote (mês) por vez
+
+    Só os agregados ficam em memória; as partições diárias fazem recargas reprocessarem só os dias alterados.
+    """
+    regras = dict(limites)
+    repositorio = _particoes_diarias(limites)
+    particoes, distintos, relatorios, contagens_ids = {}, [], [], []
+    for lote in ler_lotes(_armazem):
+        falhas = calcular_falhas_lote(lote, regras)
+        mask = ~falhas.any(axis=1)
+        valido = lote[mask]
+
+        particoes.update(atualizar_particoes(valido, repositorio, versao))
+        distintos.append(construir_distintos(valido))
+        relatorios.append(gerar_relatorio_qualidade(lote, falhas, mask))
+        contagens_ids.append(valido['id'].value_counts(dropna=False))
+
+    cubo, esbocos, consolidados = montar_agregados(particoes, _armazem['modelo'])
+    return cubo, esbocos, consolidados, combinar_distintos(distintos), combinar_relatorios(relatorios, contagens_ids)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _janela_armazem_cache(_armazem, versao, limites, inicio, fim):
+    """Linhas válidas entre `inicio` e `fim`, lidas só das partições que cobrem o intervalo"""
+    regras = dict(limites)
+    partes = [
+        lote[~calcular_falhas_lote(lote, regras).any(axis=1).values]
+        for lote in ler_lotes(_armazem, inicio, fim)
+    ]
+    return pd.concat([_armazem['modelo']] + partes, ignore_index=True)
+
+def aplicar_validacao(dados, limites=None, janela=None):
+    """Aplica as regras de validação à base bruta e devolve o dicionário pronto para as abas
+
+    Com a base no armazém em disco, `janela` (início, fim) limita as linhas carregadas em
+    `base` às datas dos períodos; cubo, esboços e consolidados cobrem o histórico inteiro.
+    """
+    limites = normalizar_limites(limites)
+    versao_limites = hashlib.sha1(repr(limites).encode()).hexdigest()[:8]
+    if 'armazem' in dados:
+        cubo, esbocos, consolidados, distintos, relatorio = _agregar_armazem_cache(
+            dados['armazem'], dados['versao_bruto'], limites
+        )
+        if janela is None:
+            fim = cubo['data'].max()
+            fim = fim.date() if pd.notna(fim) else pd.Timestamp.now().date()
+            janela = (fim - pd.Timedelta(days=JANELA_PADRAO_DIAS), fim)
+        df_valido = _janela_armazem_cache(dados['armazem'], dados['versao_bruto'], limites, *janela)
+        # A base cobre só a janela: caches chaveados pela versão (opções dos seletores) mudam com ela
+        versao = f"{dados['versao_bruto']}:{versao_limites}:{janela[0]}:{janela[1]}"
+    else:
+        df_valido, cubo, esbocos, consolidados, distintos, versao, relatorio = _aplicar_validacao_cache(
+            dados['bruto'], dados['indices_validacao'], dados['versao_bruto'], limites
+        )
+
+    return {
+        **dados,
+        # Cópia rasa: colunas auxiliares criadas pelas abas não alteram a base em cache
+        'base': df_valido.copy(deep=False),
+        'cubo': cubo,
+        'esbocos': esbocos,
+        'consolidados': consolidados,
+        'distintos': distintos,
+        'versao': versao,
+        'limites_validacao': dict(limites),
+        'qualidade': {**dados['carga'], **relatorio}
+    }
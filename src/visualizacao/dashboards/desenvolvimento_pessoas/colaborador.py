@@ -4,29 +4,21 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import timedelta
+from visualizacao.otimizacao import fragmento, obter_visao_periodo
 
 def analisar_colaborador(dados, filtros_master, colaborador, filtros_local=None):
     """Analisa dados de um colaborador específico"""
-    # Primeiro aplicar filtros master
-    df = dados['base'].copy()
-    
-    # Aplicar filtros master (período e filtros globais)
-    mask_master = (
-        (df['retirada'].dt.date >= filtros_master['periodo2']['inicio']) &
-        (df['retirada'].dt.date <= filtros_master['periodo2']['fim'])
-    )
+    # Primeiro aplicar filtros master sobre o recorte do período (sem copiar a base)
+    df_master = obter_visao_periodo(dados, filtros_master['periodo2']['inicio'], filtros_master['periodo2']['fim'])
     
     if 'cliente' in filtros_master and "Todos" not in filtros_master['cliente']:
-        mask_master &= df['CLIENTE'].isin(filtros_master['cliente'])
+        df_master = df_master[df_master['CLIENTE'].isin(filtros_master['cliente'])]
         
     if 'operacao' in filtros_master and "Todas" not in filtros_master['operacao']:
-        mask_master &= df['OPERAÇÃO'].isin(filtros_master['operacao'])
-
-    # Aplicar máscara master primeiro
-    df = df[mask_master].copy()
+        df_master = df_master[df_master['OPERAÇÃO'].isin(filtros_master['operacao'])]
     
-    # Depois aplicar filtro do colaborador selecionado
-    df = df[df['usuário'] == colaborador].copy()
+    # Depois aplicar filtro do colaborador selecionado (cópia só das linhas dele)
+    df = df_master[df_master['usuário'] == colaborador].copy()
     
     # Por último, aplicar filtros locais de refinamento
     if filtros_local:
@@ -54,7 +46,7 @@ def analisar_colaborador(dados, filtros_master, colaborador, filtros_local=None)
     metricas_op['tpesper'] = metricas_op['tpesper'] / 60
     
     # Calcular médias gerais considerando filtros master
-    medias_gerais = dados['base'][mask_master].groupby('OPERAÇÃO').agg({
+    medias_gerais = df_master.groupby('OPERAÇÃO').agg({
         'tpatend': 'mean'
     }).reset_index()
     medias_gerais['tpatend'] = medias_gerais['tpatend'] / 60
@@ -167,18 +159,13 @@ def criar_grafico_operacoes(metricas_op):
 
 def criar_grafico_evolucao_diaria(dados, filtros_master, colaborador):
     """Cria gráfico de evolução diária"""
-    df = dados['base']
     # Aplicar filtros master
-    mask = (
-        (df['retirada'].dt.date >= filtros_master['periodo2']['inicio']) &
-        (df['retirada'].dt.date <= filtros_master['periodo2']['fim'])
-    )
+    df_periodo = obter_visao_periodo(dados, filtros_master['periodo2']['inicio'], filtros_master['periodo2']['fim'])
     
     # Calcular média geral do período para comparação
-    df_periodo = df[mask]
     meta_geral = df_periodo['tpatend'].mean() / 60
     
-    df_filtrado = df[mask & (df['usuário'] == colaborador)]
+    df_filtrado = df_periodo[df_periodo['usuário'] == colaborador]
     
     # Agrupar por dia
     evolucao = df_filtrado.groupby(df_filtrado['retirada'].dt.date).agg({
@@ -306,27 +293,27 @@ def mostrar_aba(dados, filtros_master):
         - ⚠️ Oportunidade de Melhoria: Operação com maior variação absoluta
         """)
     
+    mostrar_secao_colaborador(dados, filtros_master)
+
+@fragmento
+def mostrar_secao_colaborador(dados, filtros_master):
+    """Seletores locais e análise do colaborador, reexecutados isoladamente a cada interação"""
     try:
         # Aplicar filtros master para obter lista de clientes disponíveis
-        df_filtrado = dados['base'].copy()
-        mask_master = (
-            (df_filtrado['retirada'].dt.date >= filtros_master['periodo2']['inicio']) &
-            (df_filtrado['retirada'].dt.date <= filtros_master['periodo2']['fim'])
-        )
+        df_periodo = obter_visao_periodo(dados, filtros_master['periodo2']['inicio'], filtros_master['periodo2']['fim'])
+        df_filtrado = df_periodo
         
         # Lista de clientes deve respeitar filtro master
         clientes_disponiveis = []
         if 'cliente' in filtros_master and "Todos" not in filtros_master['cliente']:
             clientes_disponiveis = filtros_master['cliente']
-            mask_master &= df_filtrado['CLIENTE'].isin(clientes_disponiveis)
+            df_filtrado = df_filtrado[df_filtrado['CLIENTE'].isin(clientes_disponiveis)]
         else:
             # Se não houver filtro master, usar todos os clientes disponíveis no período
-            clientes_disponiveis = sorted(df_filtrado[mask_master]['CLIENTE'].dropna().unique())
+            clientes_disponiveis = sorted(df_filtrado['CLIENTE'].dropna().unique())
             
         if 'operacao' in filtros_master and "Todas" not in filtros_master['operacao']:
-            mask_master &= df_filtrado['OPERAÇÃO'].isin(filtros_master['operacao'])
-        
-        df_filtrado = df_filtrado[mask_master]
+            df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros_master['operacao'])]
         
         # Linha de seletores para filtros locais
         col1, col2, col3, col4 = st.columns(4)
@@ -336,7 +323,8 @@ def mostrar_aba(dados, filtros_master):
             colaborador = st.selectbox(
                 "Selecione o Colaborador",
                 options=colaboradores,
-                help="Escolha um colaborador para análise detalhada"
+                help="Escolha um colaborador para análise detalhada",
+                key="colaborador_selecionado"
             )
         
         # Filtros locais
@@ -345,7 +333,8 @@ def mostrar_aba(dados, filtros_master):
             filtros_local['turno'] = st.selectbox(
                 "Filtrar por Turno",
                 options=["Todos", "TURNO A", "TURNO B", "TURNO C"],
-                help="Filtre por turno específico"
+                help="Filtre por turno específico",
+                key="colaborador_turno"
             )
             
         with col3:
@@ -354,22 +343,20 @@ def mostrar_aba(dados, filtros_master):
             filtros_local['cliente'] = st.selectbox(
                 "Filtrar por Cliente",
                 options=clientes,
-                help="Filtre por cliente específico"
+                help="Filtre por cliente específico",
+                key="colaborador_cliente"
             )
 
         with col4:
             # Datas disponíveis considerando filtros master
-            mask_periodo = (
-                (dados['base']['retirada'].dt.date >= filtros_master['periodo2']['inicio']) &
-                (dados['base']['retirada'].dt.date <= filtros_master['periodo2']['fim'])
-            )
-            datas_disponiveis = sorted(dados['base'][mask_periodo]['retirada'].dt.date.unique())
+            datas_disponiveis = sorted(df_periodo['retirada'].dt.date.unique())
             datas_opcoes = ["Todas"] + [data.strftime("%d/%m/%Y") for data in datas_disponiveis]
             
             data_selecionada = st.selectbox(
                 "Selecione a Data",
                 options=datas_opcoes,
-                help="Escolha uma data específica ou 'Todas' para ver o período completo"
+                help="Escolha uma data específica ou 'Todas' para ver o período completo",
+                key="colaborador_data"
             )
             
             # Conversão da data selecionada
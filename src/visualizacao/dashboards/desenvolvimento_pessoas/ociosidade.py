@@ -1,8 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import json
 from datetime import datetime, timedelta
+from visualizacao.otimizacao import fragmento, obter_visao_periodo
+from processamento.ociosidade import COLUNAS_DIARIA, calcular_ociosidade
+from processamento.cubo import rotular_turno
+from processamento.comparacao import comparar_periodos, periodos_filtros
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -35,29 +40,19 @@ def formatar_tempo(segundos):
     segs = int(segundos % 60)
     return f"{horas:02d}:{minutos:02d}:{segs:02d} min"
 
-def get_turno(hour):
-    """Determina o turno com base na hora"""
-    if 7 <= hour < 15:
-        return 'TURNO A'
-    elif 15 <= hour < 23:
-        return 'TURNO B'
-    else:
-        return 'TURNO C'
-
-def calcular_ociosidade_por_periodo(dados, filtros, periodo, adicional_filters=None):
-    """Calcula o tempo de ociosidade por colaborador no período especificado"""
-    df = dados['base'].copy()
-    
-    if df.empty:
+def calcular_ociosidade_diaria(dados, filtros, adicional_filters=None):
+    """Calcula o tempo de ociosidade de cada colaborador por dia, cobrindo os dois períodos de uma vez"""
+    if dados['base'].empty:
         st.warning("Base de dados está vazia")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=COLUNAS_DIARIA)
     
-    # Aplicar filtros de data
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo]['fim'])
+    # Aplicar filtros de data: a ociosidade é diária, então o intervalo que cobre os dois períodos basta
+    periodos = periodos_filtros(filtros)
+    df_filtrado = obter_visao_periodo(
+        dados,
+        min(inicio for inicio, _ in periodos.values()),
+        max(fim for _, fim in periodos.values())
     )
-    df_filtrado = df[mask]
     
     # Aplicar filtros adicionais
     if filtros['cliente'] != ['Todos']:
@@ -67,77 +62,38 @@ def calcular_ociosidade_por_periodo(dados, filtros, periodo, adicional_filters=N
         df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
         
     if filtros['turno'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['retirada'].dt.hour.apply(get_turno).isin(filtros['turno'])]
+        df_filtrado = df_filtrado[np.isin(rotular_turno(df_filtrado['retirada'].dt.hour, 7), filtros['turno'])]
     
     if adicional_filters:
         if adicional_filters['colaborador'] != "Todos":
             df_filtrado = df_filtrado[df_filtrado['usuário'] == adicional_filters['colaborador']]
         if adicional_filters['turno'] != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['retirada'].dt.hour.apply(get_turno) == adicional_filters['turno']]
+            df_filtrado = df_filtrado[rotular_turno(df_filtrado['retirada'].dt.hour, 7) == adicional_filters['turno']]
         if adicional_filters['cliente'] != "Todos":
             df_filtrado = df_filtrado[df_filtrado['CLIENTE'] == adicional_filters['cliente']]
         if adicional_filters['data_especifica']:
             df_filtrado = df_filtrado[df_filtrado['retirada'].dt.date == adicional_filters['data_especifica']]
     
-    # Calcular ociosidade por colaborador
-    ociosidade = []
-    for usuario in df_filtrado['usuário'].unique():
-        # Agrupar por dia
-        for data in df_filtrado[df_filtrado['usuário'] == usuario]['retirada'].dt.date.unique():
-            atend_dia = df_filtrado[
-                (df_filtrado['usuário'] == usuario) & 
-                (df_filtrado['retirada'].dt.date == data)
-            ].copy()
-            
-            if len(atend_dia) > 0:
-                # Ordenar por horário
-                atend_dia = atend_dia.sort_values('inicio')
-                
-                # Calcular intervalos entre atendimentos
-                intervalos = []
-                
-                # Intervalo entre atendimentos
-                for i in range(len(atend_dia)-1):
-                    fim_atual = atend_dia['fim'].iloc[i]
-                    inicio_prox = atend_dia['inicio'].iloc[i+1]
-                    intervalo = (inicio_prox - fim_atual).total_seconds()
-                    # Considerar apenas intervalos menores que 2 horas (7200 segundos)
-                    if 0 < intervalo <= 7200:
-                        intervalos.append(intervalo)
-                
-                if intervalos:
-                    # Remover o maior intervalo (presumivelmente almoço)
-                    if len(intervalos) > 1:
-                        intervalos.remove(max(intervalos))
-                    
-                    tempo_ocioso = sum(intervalos)
-                    ociosidade.append({
-                        'colaborador': usuario,
-                        'data': data,
-                        'tempo_ocioso': tempo_ocioso,
-                        'qtd_intervalos': len(intervalos)
-                    })
+    # Intervalos de todos os colaboradores e dias numa única ordenação
+    return calcular_ociosidade(df_filtrado)
+
+def calcular_ociosidade_comparativa(dados, filtros, adicional_filters=None):
+    """Média diária de ociosidade por colaborador nos dois períodos, lado a lado"""
+    diaria = calcular_ociosidade_diaria(dados, filtros, adicional_filters)
     
-    # Criar DataFrame com média por colaborador
-    if ociosidade:
-        df_ociosidade = pd.DataFrame(ociosidade)
-        df_ociosidade = df_ociosidade.groupby('colaborador')['tempo_ocioso'].mean().reset_index()
-        return df_ociosidade
+    # Dias que caem nos dois períodos (sobreposição) contam em ambos
+    df_comp = comparar_periodos(
+        diaria, 'colaborador', periodos_filtros(filtros), {'tempo_ocioso': 'mean'},
+        coluna_data='data', como='outer', medida='tempo_ocioso'
+    )
+    # Colaborador sem ociosidade no período 1 conta como crescimento de 100%
+    df_comp['variacao'] = df_comp['variacao'].replace([float('inf')], 100)
     
-    return pd.DataFrame()
+    return df_comp[['colaborador', 'tempo_ocioso_p1', 'tempo_ocioso_p2', 'linhas_p1', 'linhas_p2', 'variacao']]
 
-def criar_grafico_comparativo(dados_p1, dados_p2, filtros, mostrar_apenas_p2=True):
+def criar_grafico_comparativo(df_comp, filtros, mostrar_apenas_p2=True):
     """Cria gráfico comparativo de ociosidade entre períodos"""
     try:
-        # Merge dos dados
-        df_comp = pd.merge(
-            dados_p1, 
-            dados_p2, 
-            on='colaborador',
-            suffixes=('_p1', '_p2'),
-            how='outer'
-        ).fillna(0)
-        
         # Filtrar para mostrar apenas colaboradores com dados no período 2 se a opção estiver ativada
         if mostrar_apenas_p2:
             df_comp = df_comp[df_comp['tempo_ocioso_p2'] > 0]
@@ -149,10 +105,6 @@ def criar_grafico_comparativo(dados_p1, dados_p2, filtros, mostrar_apenas_p2=Tru
         # Ordena por tempo de ociosidade do período 2 (crescente - menores tempos no topo)
         df_comp = df_comp.sort_values('tempo_ocioso_p2', ascending=False)
         
-        # Calcula variação percentual
-        df_comp['variacao'] = ((df_comp['tempo_ocioso_p2'] - df_comp['tempo_ocioso_p1']) / 
-                              df_comp['tempo_ocioso_p1'] * 100).replace([float('inf')], 100)
-        
         cores_tema = obter_cores_tema()
         
         # Prepara legendas
@@ -223,18 +175,9 @@ def criar_grafico_comparativo(dados_p1, dados_p2, filtros, mostrar_apenas_p2=Tru
         st.error(f"Erro ao criar gráfico: {str(e)}")
         return None
 
-def gerar_insights_ociosidade(ocio_p1, ocio_p2, mostrar_apenas_p2=True):
+def gerar_insights_ociosidade(df_insights, mostrar_apenas_p2=True):
     """Gera insights sobre a ociosidade dos colaboradores"""
     try:
-        # Merge dos dados
-        df_insights = pd.merge(
-            ocio_p1, 
-            ocio_p2, 
-            on='colaborador',
-            suffixes=('_p1', '_p2'),
-            how='outer'
-        ).fillna(0)
-        
         # Filtrar para mostrar apenas colaboradores com dados no período 2 se a opção estiver ativada
         if mostrar_apenas_p2:
             df_insights = df_insights[df_insights['tempo_ocioso_p2'] > 0]
@@ -244,10 +187,6 @@ def gerar_insights_ociosidade(ocio_p1, ocio_p2, mostrar_apenas_p2=True):
             st.warning("Não há dados disponíveis para gerar insights com os filtros atuais.")
             return
         
-        # Calcular variação percentual
-        df_insights['variacao'] = ((df_insights['tempo_ocioso_p2'] - df_insights['tempo_ocioso_p1']) / 
-                                  df_insights['tempo_ocioso_p1'] * 100).replace([float('inf')], 100)
-        
         # Criar 4 colunas principais
         col_perf1, col_perf2, col_perf3, col_insights = st.columns([0.25, 0.25, 0.25, 0.25])
         
@@ -362,27 +301,29 @@ def mostrar_aba(dados, filtros):
         """)
     
     try:
-        # Aplicar filtros master primeiro
-        df = dados['base'].copy()
-        mask_master = (
-            (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-            (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-        )
+        st.session_state['tema_atual'] = detectar_tema()
+        mostrar_secao_ociosidade(dados, filtros)
+    
+    except Exception as e:
+        st.error(f"Erro ao mostrar aba: {str(e)}")
+        st.exception(e)
+
+@fragmento
+def mostrar_secao_ociosidade(dados, filtros):
+    """Filtros locais, gráfico e análise de ociosidade, reexecutados isoladamente a cada interação"""
+    try:
+        # Aplicar filtros master primeiro, sobre o recorte em cache do período
+        df_filtrado = obter_visao_periodo(dados, filtros['periodo2']['inicio'], filtros['periodo2']['fim'])
         
         # Filtrar clientes baseado no filtro master
         if 'cliente' in filtros and "Todos" not in filtros['cliente']:
-            mask_master &= df['CLIENTE'].isin(filtros['cliente'])
+            df_filtrado = df_filtrado[df_filtrado['CLIENTE'].isin(filtros['cliente'])]
             clientes_permitidos = sorted(filtros['cliente'])
         else:
-            clientes_permitidos = sorted(df[mask_master]['CLIENTE'].dropna().unique())
+            clientes_permitidos = sorted(df_filtrado['CLIENTE'].dropna().unique())
             
         if 'operacao' in filtros and "Todas" not in filtros['operacao']:
-            mask_master &= df['OPERAÇÃO'].isin(filtros['operacao'])
-        
-        df_filtrado = df[mask_master]
-        dados_filtrados = {'base': df_filtrado}
-        
-        st.session_state['tema_atual'] = detectar_tema()
+            df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
         
         # Filtros locais
         col1, col2, col3, col4 = st.columns(4)
@@ -414,11 +355,7 @@ def mostrar_aba(dados, filtros):
 
         with col4:
             # Obter lista de datas disponíveis no período
-            mask_periodo = (
-                (df_filtrado['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-                (df_filtrado['retirada'].dt.date <= filtros['periodo2']['fim'])
-            )
-            datas_disponiveis = sorted(df_filtrado[mask_periodo]['retirada'].dt.date.unique())
+            datas_disponiveis = sorted(df_filtrado['retirada'].dt.date.unique())
             datas_opcoes = ["Todas"] + [data.strftime("%d/%m/%Y") for data in datas_disponiveis]
             
             data_selecionada = st.selectbox(
@@ -441,9 +378,10 @@ def mostrar_aba(dados, filtros):
             'data_especifica': data_especifica
         }
         
-        # Calcular ociosidade usando filtros adicionais
-        ocio_p1 = calcular_ociosidade_por_periodo(dados_filtrados, filtros, 'periodo1', adicional_filters)
-        ocio_p2 = calcular_ociosidade_por_periodo(dados_filtrados, filtros, 'periodo2', adicional_filters)
+        # Calcular ociosidade dos dois períodos numa única agregação, usando filtros adicionais
+        df_comp = calcular_ociosidade_comparativa(dados, filtros, adicional_filters)
+        tem_p1 = df_comp['linhas_p1'].any()
+        tem_p2 = df_comp['linhas_p2'].any()
         
         # Adicionar checkbox para mostrar/ocultar usuários que só têm dados no período 1
         # Usado estilo menos destacado para o checkbox
@@ -451,10 +389,9 @@ def mostrar_aba(dados, filtros):
         
         # Contar quantos colaboradores estão sendo filtrados
         apenas_p1 = 0
-        if not ocio_p1.empty and not ocio_p2.empty:
-            df_merged = pd.merge(ocio_p1, ocio_p2, on='colaborador', how='outer', suffixes=('_p1', '_p2')).fillna(0)
-            total_colaboradores = len(df_merged)
-            apenas_p1 = len(df_merged[df_merged['tempo_ocioso_p2'] == 0])
+        if tem_p1 and tem_p2:
+            total_colaboradores = len(df_comp)
+            apenas_p1 = len(df_comp[df_comp['tempo_ocioso_p2'] == 0])
         
         # Se houver colaboradores apenas no período 1, mostrar o checkbox de forma mais discreta
         if apenas_p1 > 0:
@@ -480,23 +417,23 @@ def mostrar_aba(dados, filtros):
             st.markdown('<hr style="margin: 8px 0; opacity: 0.3">', unsafe_allow_html=True)
         
         # Verificar se há dados após os filtros
-        if ocio_p1.empty and ocio_p2.empty:
+        if not tem_p1 and not tem_p2:
             st.warning("Não há dados suficientes para análise de ociosidade no período selecionado.")
             return
         
         # Se apenas período 1 estiver vazio
-        if ocio_p1.empty and not ocio_p2.empty:
+        if not tem_p1 and tem_p2:
             st.warning("Não há dados de ociosidade para o período 1, mas existem para o período 2.")
         
         # Se apenas período 2 estiver vazio
-        if not ocio_p1.empty and ocio_p2.empty:
+        if tem_p1 and not tem_p2:
             st.warning("Não há dados de ociosidade para o período 2, mas existem para o período 1.")
             if mostrar_apenas_p2:
                 st.info("Como o filtro está ativo para mostrar apenas colaboradores com dados no período 2, nenhum gráfico será exibido.")
                 return
         
         # Criar gráfico com a opção de filtro
-        fig = criar_grafico_comparativo(ocio_p1, ocio_p2, filtros, mostrar_apenas_p2)
+        fig = criar_grafico_comparativo(df_comp, filtros, mostrar_apenas_p2)
         if fig:
             st.plotly_chart(
                 fig,
@@ -512,7 +449,7 @@ def mostrar_aba(dados, filtros):
         st.markdown("---")
         st.subheader("📈 Análise Detalhada")
         with st.expander("Ver análise detalhada", expanded=True):
-            gerar_insights_ociosidade(ocio_p1, ocio_p2, mostrar_apenas_p2)
+            gerar_insights_ociosidade(df_comp, mostrar_apenas_p2)
     
     except Exception as e:
         st.error(f"Erro ao mostrar aba: {str(e)}")
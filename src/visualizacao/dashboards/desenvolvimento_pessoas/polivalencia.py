@@ -3,62 +3,14 @@ import pandas as pd
 import plotly.express as px
 import numpy as np
 import plotly.graph_objects as go
+from visualizacao.otimizacao import obter_cubo
+from processamento.cubo import filtrar_cubo
+from processamento.polivalencia import calcular_metricas_polivalencia, calcular_niveis
 
 def calcular_polivalencia(dados, filtros):
-    """Calcula métricas de polivalência por colaborador"""
-    df = dados['base']
-    
-    # Aplicar filtros de período
-    mask = (
-        (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-        (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-    )
-    df_filtrado = df[mask]
-    
-    # Calcular métricas por colaborador
-    metricas_colaborador = []
-    
-    for usuario in df_filtrado['usuário'].unique():
-        df_user = df_filtrado[df_filtrado['usuário'] == usuario]
-        
-        # Métricas por operação
-        ops_count = df_user['OPERAÇÃO'].value_counts()
-        ops_tempo = df_user.groupby('OPERAÇÃO')['tpatend'].mean() / 60
-        
-        # Métricas por cliente
-        clientes_count = df_user['CLIENTE'].value_counts()
-        clientes_tempo = df_user.groupby('CLIENTE')['tpatend'].mean() / 60
-        
-        # Calcular turno predominante
-        df_user['turno'] = df_user['inicio'].dt.hour.map(
-            lambda x: 'TURNO A' if 6 <= x < 14 else ('TURNO B' if 14 <= x < 22 else 'TURNO C')
-        )
-        turno_pred = df_user['turno'].mode().iloc[0]
-        
-        # Calcular scores de polivalência
-        score_ops = len(ops_count)  # Número de operações diferentes
-        score_clientes = len(clientes_count)  # Número de clientes diferentes
-        
-        # Calcular distribuição de atendimentos
-        distribuicao_ops = (ops_count / ops_count.sum() * 100).std()  # Desvio padrão da distribuição
-        distribuicao_clientes = (clientes_count / clientes_count.sum() * 100).std()
-        
-        metricas_colaborador.append({
-            'colaborador': usuario,
-            'turno': turno_pred,
-            'num_operacoes': score_ops,
-            'num_clientes': score_clientes,
-            'distribuicao_ops': distribuicao_ops,
-            'distribuicao_clientes': distribuicao_clientes,
-            'total_atendimentos': len(df_user),
-            'tempo_medio': df_user['tpatend'].mean() / 60,
-            'operacoes': ops_count.to_dict(),
-            'clientes': clientes_count.to_dict(),
-            'tempos_ops': ops_tempo.to_dict(),
-            'tempos_clientes': clientes_tempo.to_dict()
-        })
-    
-    return pd.DataFrame(metricas_colaborador)
+    """Calcula métricas de polivalência de todos os colaboradores numa agregação das células do período"""
+    celulas = filtrar_cubo(obter_cubo(dados), filtros['periodo2']['inicio'], filtros['periodo2']['fim'])
+    return calcular_metricas_polivalencia(celulas)
 
 def calcular_ranking_polivalencia(metricas_df):
     """Calcula o ranking de polivalência"""
@@ -74,55 +26,14 @@ def calcular_ranking_polivalencia(metricas_df):
         metricas_df['vol_norm'] * 0.2
     )
     
-    return metricas_df.sort_values('score_polivalencia', ascending=False)
-
-def calcular_nivel_polivalencia_operacoes(dados_colab):
-    """Calcula o nível de polivalência por operação considerando volume e tempo"""
-    operacoes = dados_colab['operacoes']
-    tempos_ops = dados_colab['tempos_ops']
-    
-    # Normalizar volumes (0 a 1)
-    vol_max = max(operacoes.values())
-    volumes_norm = {op: vol/vol_max for op, vol in operacoes.items()}
-    
-    # Normalizar tempos (inverso, pois menor tempo é melhor)
-    tempo_max = max(tempos_ops.values())
-    tempos_norm = {op: 1 - (tempo/tempo_max) for op, tempo in tempos_ops.items()}
-    
-    # Calcular score final (70% tempo, 30% volume)
-    scores = {}
-    for op in operacoes.keys():
-        scores[op] = (0.7 * tempos_norm[op]) + (0.3 * volumes_norm[op])
-    
-    return scores
-
-def calcular_nivel_polivalencia_clientes(dados_colab, dados_base):
-    """Calcula o nível de polivalência por cliente considerando volume e tempo"""
-    # Obter lista completa de clientes da base de dados e converter para strings
-    todos_clientes = {str(cliente) for cliente in dados_base['base']['CLIENTE'].dropna().unique()}
-    
-    # Converter chaves dos dicionários para strings
-    clientes = {str(k): v for k, v in dados_colab['clientes'].items()}
-    tempos_clientes = {str(k): v for k, v in dados_colab['tempos_clientes'].items()}
-    
-    # Normalizar volumes (0 a 1)
-    vol_max = max(clientes.values()) if clientes else 1
-    volumes_norm = {cli: clientes.get(cli, 0)/vol_max for cli in todos_clientes}
-    
-    # Normalizar tempos (inverso, pois menor tempo é melhor)
-    tempo_max = max(tempos_clientes.values()) if tempos_clientes else 1
-    tempos_norm = {cli: 1 - (tempos_clientes.get(cli, tempo_max)/tempo_max) for cli in todos_clientes}
-    
-    # Calcular score final (70% tempo, 30% volume)
-    scores = {}
-    for cli in todos_clientes:
-        scores[cli] = (0.7 * tempos_norm[cli]) + (0.3 * volumes_norm[cli])
-    
-    return scores
+    # Índice passa a ser a posição no ranking
+    return metricas_df.sort_values('score_polivalencia', ascending=False).reset_index(drop=True)
 
-def mostrar_detalhes_colaborador(colaborador, metricas, dados_base):
+def mostrar_detalhes_colaborador(colaborador, metricas, matrizes, dados_base):
     """Mostra análise detalhada de um colaborador"""
     dados_colab = metricas[metricas['colaborador'] == colaborador].iloc[0]
+    ops_qtd, ops_tempo = matrizes['operacoes']
+    cli_qtd, cli_tempo = matrizes['clientes']
     
     st.subheader(f"📊 Análise Detalhada - {colaborador}")
     
@@ -142,11 +53,16 @@ def mostrar_detalhes_colaborador(colaborador, metricas, dados_base):
     
     with col1:
         # Gráfico radar para clientes
-        scores_clientes = calcular_nivel_polivalencia_clientes(dados_colab, dados_base)
+        # Todos os clientes da base entram no radar; os não atendidos ficam com nível zero
+        todos_clientes = obter_cubo(dados_base)['CLIENTE'].dropna().unique()
+        scores_clientes = calcular_niveis(
+            cli_qtd.loc[[colaborador]], cli_tempo.loc[[colaborador]], todos_clientes
+        ).iloc[0].rename(index=str)
         
-        # Ordenar clientes alfabeticamente e remover PRIORIDADE (agora como string)
-        clientes_ordenados = sorted([cli for cli in scores_clientes.keys() if str(cli) != 'PRIORIDADE'])
-        valores_ordenados = [scores_clientes[cli] for cli in clientes_ordenados]
+        # Ordenar clientes alfabeticamente e remover PRIORIDADE
+        scores_clientes = scores_clientes.drop('PRIORIDADE', errors='ignore').sort_index()
+        clientes_ordenados = scores_clientes.index.tolist()
+        valores_ordenados = scores_clientes.tolist()
         
         fig_radar = go.Figure()
         fig_radar.add_trace(go.Scatterpolar(
@@ -184,12 +100,17 @@ def mostrar_detalhes_colaborador(colaborador, metricas, dados_base):
     
     with col2:
         # Gráfico de barras horizontal para operações
-        scores_operacoes = calcular_nivel_polivalencia_operacoes(dados_colab)
+        # Só as operações que o colaborador atendeu
+        volumes = ops_qtd.loc[colaborador]
+        atendidas = volumes[volumes > 0].index
+        scores_operacoes = calcular_niveis(
+            ops_qtd.loc[[colaborador], atendidas], ops_tempo.loc[[colaborador], atendidas]
+        ).iloc[0]
         
         df_ops = pd.DataFrame({
-            'Operação': list(scores_operacoes.keys()),
-            'Score': list(scores_operacoes.values()),
-            'Volume': list(dados_colab['operacoes'].values())
+            'Operação': atendidas,
+            'Score': scores_operacoes.values,
+            'Volume': volumes[atendidas].values
         }).sort_values('Score', ascending=True)
         
         fig_bars = go.Figure()
@@ -235,7 +156,7 @@ def mostrar_aba(dados, filtros):
     
     try:
         # Calcular métricas e ranking
-        metricas = calcular_polivalencia(dados, filtros)
+        metricas, matrizes = calcular_polivalencia(dados, filtros)
         ranking = calcular_ranking_polivalencia(metricas)
         
   # Filtros e seleção na ordem correta
@@ -267,7 +188,7 @@ def mostrar_aba(dados, filtros):
             return
 
         # Mostrar detalhes do colaborador selecionado
-        mostrar_detalhes_colaborador(colaborador_selecionado, ranking, dados)
+        mostrar_detalhes_colaborador(colaborador_selecionado, ranking, matrizes, dados)
 
     except Exception as e:
         st.error("Erro ao analisar dados de polivalência")
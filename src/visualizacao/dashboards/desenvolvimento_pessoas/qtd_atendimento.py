@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.graph_objects as go
 import json
 from datetime import datetime
+from visualizacao.otimizacao import comparar_cubo, filtros_cubo_adicionais
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -28,63 +29,42 @@ def obter_cores_tema():
         'erro': '#ff6b6b' if is_dark else '#ff5757'
     }
 
-def calcular_atendimentos_por_periodo(dados, filtros, periodo, adicional_filters=None):
-    """Calcula a quantidade de atendimentos por colaborador no período especificado"""
-    df = dados['base']
-    
-    if df.empty:
+def calcular_atendimentos_comparativos(dados, filtros, adicional_filters=None):
+    """Calcula a quantidade de atendimentos por colaborador nos dois períodos numa única agregação"""
+    if dados['base'].empty:
         st.warning("Base de dados está vazia")
         return pd.DataFrame()
     
-    # Aplicar filtros de data
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo]['fim'])
-    )
-    df_filtrado = df[mask]
+    # Filtros master de cliente e operação, refinados pelos seletores da aba
+    filtros_cubo = {}
+    if 'cliente' in filtros and "Todos" not in filtros['cliente']:
+        filtros_cubo['CLIENTE'] = filtros['cliente']
+    if 'operacao' in filtros and "Todas" not in filtros['operacao']:
+        filtros_cubo['OPERAÇÃO'] = filtros['operacao']
+    filtros_cubo = filtros_cubo_adicionais(adicional_filters, filtros_cubo)
     
-    # Aplicar filtros adicionais
-    if adicional_filters:
-        if adicional_filters['colaborador'] != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['usuário'] == adicional_filters['colaborador']]
-        
-        if adicional_filters['turno'] != "Todos":
-            # Mapear hora para turno
-            df_filtrado['turno'] = df_filtrado['inicio'].dt.hour.map(
-                lambda x: 'TURNO A' if 6 <= x < 14 else ('TURNO B' if 14 <= x < 22 else 'TURNO C')
-            )
-            df_filtrado = df_filtrado[df_filtrado['turno'] == adicional_filters['turno']]
-        
-        if adicional_filters['cliente'] != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['CLIENTE'] == adicional_filters['cliente']]
-            
-        if adicional_filters['data_especifica']:
-            df_filtrado = df_filtrado[df_filtrado['retirada'].dt.date == adicional_filters['data_especifica']]
+    # Agrupar por colaborador e período
+    df_comp = comparar_cubo(dados, filtros, 'usuário', filtros_cubo, medida='qtd', como='outer')
     
-    # Agrupar por colaborador usando a coluna correta
-    atendimentos = df_filtrado.groupby('usuário')['id'].count().reset_index()
-    atendimentos.columns = ['colaborador', 'quantidade']
+    # Sem atendimentos em algum dos períodos não há comparação
+    if df_comp.empty or not (df_comp['linhas_p1'].any() and df_comp['linhas_p2'].any()):
+        return pd.DataFrame()
+    
+    df_comp = df_comp.rename(columns={
+        'usuário': 'colaborador',
+        'qtd_p1': 'quantidade_p1',
+        'qtd_p2': 'quantidade_p2'
+    })
+    # Colaborador sem atendimentos no período 1 conta como crescimento de 100%
+    df_comp['variacao'] = df_comp['variacao'].replace([float('inf')], 100)
     
-    return atendimentos
+    return df_comp[['colaborador', 'quantidade_p1', 'quantidade_p2', 'variacao']]
 
-def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
+def criar_grafico_comparativo(df_comp, filtros):
     try:
-        # Merge dos dados
-        df_comp = pd.merge(
-            dados_p1, 
-            dados_p2, 
-            on='colaborador',
-            suffixes=('_p1', '_p2'),
-            how='outer'
-        ).fillna(0)
-        
         # Ordena por quantidade do período 2 (decrescente)
         df_comp = df_comp.sort_values('quantidade_p2', ascending=True)
         
-        # Calcula variação percentual
-        df_comp['variacao'] = ((df_comp['quantidade_p2'] - df_comp['quantidade_p1']) / 
-                              df_comp['quantidade_p1'] * 100).replace([float('inf')], 100)
-        
         cores_tema = obter_cores_tema()
         
         # Prepara legendas
@@ -190,22 +170,9 @@ def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
         st.error(f"Erro ao criar gráfico: {str(e)}")
         return None
 
-def gerar_insights_atendimentos(atend_p1, atend_p2):
+def gerar_insights_atendimentos(df_insights):
     """Gera insights sobre os atendimentos dos colaboradores"""
     try:
-        # Merge dos dados
-        df_insights = pd.merge(
-            atend_p1, 
-            atend_p2, 
-            on='colaborador',
-            suffixes=('_p1', '_p2'),
-            how='outer'
-        ).fillna(0)
-        
-        # Calcula variação percentual
-        df_insights['variacao'] = ((df_insights['quantidade_p2'] - df_insights['quantidade_p1']) / 
-                                  df_insights['quantidade_p1'] * 100).replace([float('inf')], 100)
-        
         # Criar 4 colunas principais
         col_perf1, col_perf2, col_perf3, col_insights = st.columns([0.25, 0.25, 0.25, 0.25])
         
@@ -306,7 +273,7 @@ def gerar_insights_atendimentos(atend_p1, atend_p2):
 def mostrar_aba(dados, filtros):
     """Mostra a aba de Quantidade de Atendimento"""
     # Aplicar filtros master primeiro
-    df = dados['base'].copy()
+    df = dados['base']
     mask_master = (
         (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
         (df['retirada'].dt.date <= filtros['periodo2']['fim'])
@@ -323,7 +290,6 @@ def mostrar_aba(dados, filtros):
         mask_master &= df['OPERAÇÃO'].isin(filtros['operacao'])
     
     df_filtrado = df[mask_master]
-    dados_filtrados = {'base': df_filtrado}
     
     # Debug de períodos usando dados filtrados
     data_min = df_filtrado['retirada'].dt.date.min()
@@ -367,6 +333,8 @@ def mostrar_aba(dados, filtros):
         """)
 
     try:
+        st.session_state['tema_atual'] = detectar_tema()
+        
         # Verificar se o período selecionado está contido nos dados
         if (filtros['periodo2']['inicio'] < data_min or 
             filtros['periodo2']['fim'] > data_max):
@@ -440,15 +408,14 @@ def mostrar_aba(dados, filtros):
         }
 
         # Calcular métricas para cada período com os filtros
-        atend_p1 = calcular_atendimentos_por_periodo(dados_filtrados, filtros, 'periodo1', adicional_filters)
-        atend_p2 = calcular_atendimentos_por_periodo(dados_filtrados, filtros, 'periodo2', adicional_filters)
+        df_comp = calcular_atendimentos_comparativos(dados, filtros, adicional_filters)
         
-        if atend_p1.empty or atend_p2.empty:
+        if df_comp.empty:
             st.warning("Não há dados suficientes para o período ou filtros selecionados.")
             return
 
         # Cria e exibe o gráfico comparativo
-        fig = criar_grafico_comparativo(atend_p1, atend_p2, filtros)
+        fig = criar_grafico_comparativo(df_comp, filtros)
         if fig:
             st.plotly_chart(
                 fig, 
@@ -460,7 +427,7 @@ def mostrar_aba(dados, filtros):
         st.markdown("---")
         st.subheader("📈 Análise Detalhada")
         with st.expander("Ver análise detalhada", expanded=True):
-            gerar_insights_atendimentos(atend_p1, atend_p2)
+            gerar_insights_atendimentos(df_comp)
     
     except Exception as e:
         st.error(f"Erro ao mostrar aba: {str(e)}")
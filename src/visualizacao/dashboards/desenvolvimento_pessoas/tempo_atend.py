@@ -2,6 +2,7 @@ import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
 import json
+from visualizacao.otimizacao import comparar_cubo, filtros_cubo_adicionais
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -33,62 +34,29 @@ def formatar_tempo(minutos):
     segundos = int((minutos - minutos_int) * 60)
     return f"{minutos_int:02d}:{segundos:02d}"
 
-def calcular_metricas_por_periodo(dados, filtros, periodo_key, adicional_filters=None):
-    """Calcula métricas por colaborador para um período específico"""
-    df = dados['base']
-    
-    # Aplicar filtros de data
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo_key]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo_key]['fim'])
+def calcular_metricas_comparativas(dados, filtros, adicional_filters=None):
+    """Calcula métricas por colaborador nos dois períodos numa única agregação"""
+    df_comp = comparar_cubo(
+        dados, filtros, 'usuário', filtros_cubo_adicionais(adicional_filters),
+        medida='media_tpatend', como='inner'
     )
-    df_filtrado = df[mask]
-    
-    # Aplicar filtros adicionais se fornecidos
-    if adicional_filters:
-        if adicional_filters['turno'] != "Todos":
-            # Mapear hora para turno
-            df_filtrado['turno'] = df_filtrado['inicio'].dt.hour.map(
-                lambda x: 'TURNO A' if 6 <= x < 14 else ('TURNO B' if 14 <= x < 22 else 'TURNO C')
-            )
-            df_filtrado = df_filtrado[df_filtrado['turno'] == adicional_filters['turno']]
-        
-        if adicional_filters['cliente'] != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['CLIENTE'] == adicional_filters['cliente']]
-            
-        if adicional_filters['data_especifica']:
-            df_filtrado = df_filtrado[df_filtrado['retirada'].dt.date == adicional_filters['data_especifica']]
-        
-        if adicional_filters['colaborador'] != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['usuário'] == adicional_filters['colaborador']]
     
-    # Calcular métricas
-    metricas = df_filtrado.groupby('usuário').agg({
-        'id': 'count',
-        'tpatend': 'mean'
-    }).reset_index()
-    
-    # Converter tempo para minutos
-    metricas['tpatend'] = metricas['tpatend'] / 60
+    # Calcular métricas, com o tempo convertido para minutos
+    metricas = pd.DataFrame({
+        'usuário': df_comp['usuário'],
+        'id_p1': df_comp['qtd_p1'],
+        'tpatend_p1': df_comp['media_tpatend_p1'] / 60,
+        'id_p2': df_comp['qtd_p2'],
+        'tpatend_p2': df_comp['media_tpatend_p2'] / 60,
+        'variacao': df_comp['variacao']
+    })
+    metricas['total'] = metricas['tpatend_p1'] + metricas['tpatend_p2']
     
     return metricas
 
-def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
+def criar_grafico_comparativo(df_comp, filtros):
     """Cria gráfico comparativo entre períodos"""
     try:
-        # Merge e prepara dados
-        df_comp = pd.merge(
-            dados_p1, 
-            dados_p2,
-            on='usuário',
-            suffixes=('_p1', '_p2')
-        )
-        
-        # Calcula total e variação percentual
-        df_comp['total'] = df_comp['tpatend_p1'] + df_comp['tpatend_p2']
-        df_comp['variacao'] = ((df_comp['tpatend_p2'] - df_comp['tpatend_p1']) / 
-                              df_comp['tpatend_p1'] * 100)
-        
         # Ordena por tempo do período 2 decrescente (maiores tempos no topo)
         df_comp = df_comp.sort_values('tpatend_p2', ascending=False)
         
@@ -209,17 +177,9 @@ def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
         st.error(f"Erro ao criar gráfico: {str(e)}")
         return None, None
 
-def gerar_insights_atendimentos(atend_p1, atend_p2):
+def gerar_insights_atendimentos(df_insights):
     """Gera insights sobre os tempos de atendimento dos colaboradores"""
     try:
-        # Merge dos dados
-        df_insights = pd.merge(
-            atend_p1, 
-            atend_p2, 
-            on='usuário',
-            suffixes=('_p1', '_p2')
-        ).fillna(0)
-        
         # Criar 4 colunas principais
         col_perf1, col_perf2, col_perf3, col_insights = st.columns([0.25, 0.25, 0.25, 0.25])
         
@@ -363,7 +323,7 @@ def mostrar_aba(dados, filtros):
 
     try:
         # Aplicar filtros master primeiro
-        df = dados['base'].copy()
+        df = dados['base']
         mask_master = (
             (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
             (df['retirada'].dt.date <= filtros['periodo2']['fim'])
@@ -443,15 +403,14 @@ def mostrar_aba(dados, filtros):
         }
 
         # Calcular métricas para cada período com os filtros
-        dados_p1 = calcular_metricas_por_periodo(dados, filtros, 'periodo1', adicional_filters)
-        dados_p2 = calcular_metricas_por_periodo(dados, filtros, 'periodo2', adicional_filters)
+        df_comp = calcular_metricas_comparativas(dados, filtros, adicional_filters)
 
-        if dados_p1.empty or dados_p2.empty:
+        if df_comp.empty:
             st.warning("Não há dados suficientes para o período ou filtros selecionados.")
             return
 
         # Criar gráfico comparativo
-        fig, df_merged = criar_grafico_comparativo(dados_p1, dados_p2, filtros)
+        fig, df_merged = criar_grafico_comparativo(df_comp, filtros)
         
         # Exibir gráfico
         st.plotly_chart(fig, use_container_width=True)
@@ -499,7 +458,7 @@ def mostrar_aba(dados, filtros):
             )
         
         # Gerar insights detalhados
-        gerar_insights_atendimentos(dados_p1, dados_p2)
+        gerar_insights_atendimentos(df_comp)
     
     except Exception as e:
         st.error("Erro ao gerar análise de tempo de atendimento")
@@ -15,10 +15,7 @@ def normalizar_nome(nome):
 
 def calcular_performance(dados, filtros):
     """Calcula métricas de performance por colaborador"""
-    df = dados['base'].copy()
-    
-    # Normalizar nomes dos usuários
-    df['usuário_norm'] = df['usuário'].apply(normalizar_nome)
+    df = dados['base']
     
     # Aplicar filtros de data
     mask = (
@@ -29,13 +26,15 @@ def calcular_performance(dados, filtros):
     # Aplicar filtros adicionais se existirem
     if filtros['turno'] != ['Todos']:
         turno_map = {'TURNO A': 'A', 'TURNO B': 'B', 'TURNO C': 'C'}
-        df['turno'] = df['inicio'].dt.hour.map(
+        turno = df['inicio'].dt.hour.map(
             lambda x: 'A' if 6 <= x < 14 else ('B' if 14 <= x < 22 else 'C')
         )
         turnos = [turno_map[t] for t in filtros['turno'] if t in turno_map]
-        mask &= df['turno'].isin(turnos)
+        mask &= turno.isin(turnos)
     
+    # Normalizar nomes só das linhas filtradas, sem alterar a base
     df_filtrado = df[mask]
+    df_filtrado = df_filtrado.assign(usuário_norm=df_filtrado['usuário'].apply(normalizar_nome))
     
     # Calcular métricas por colaborador (agora usando nome normalizado)
     metricas = df_filtrado.groupby('usuário_norm').agg({
@@ -249,7 +248,7 @@ def mostrar_aba(dados, filtros_master):
 
     try:
         # Aplicar filtros master primeiro
-        df = dados['base'].copy()
+        df = dados['base']
         mask_master = (
             (df['retirada'].dt.date >= filtros_master['periodo2']['inicio']) &
             (df['retirada'].dt.date <= filtros_master['periodo2']['fim'])
@@ -300,10 +299,10 @@ def mostrar_aba(dados, filtros_master):
 
         # Aplicar filtros locais
         if turno_local != "Todos":
-            df['turno'] = df['inicio'].dt.hour.map(
+            turno = df['inicio'].dt.hour.map(
                 lambda x: 'TURNO A' if 6 <= x < 14 else ('TURNO B' if 14 <= x < 22 else 'TURNO C')
             )
-            df = df[df['turno'] == turno_local]
+            df = df[turno == turno_local]
             
         if cliente_local != "Todos":
             df = df[df['CLIENTE'] == cliente_local]
@@ -1,51 +1,32 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 import json
+from visualizacao.otimizacao import fragmento, obter_opcoes_coluna, obter_chegadas
+from processamento.comboios import ESCOPOS, detectar_comboios, tabela_mapa_calor
 
-def criar_mapa_calor(dados, filtros, cliente=None):
+def obter_chegadas_selecao(dados, filtros, cliente=None):
+    """Chegadas de 15 minutos do período 2, gerais ou de um cliente, a partir da agregação em cache"""
+    inicio, fim = filtros['periodo2']['inicio'], filtros['periodo2']['fim']
+    if cliente is None:
+        return obter_chegadas(dados, inicio, fim)
+    # Uma agregação por cliente serve a todos os clientes do seletor
+    chegadas = obter_chegadas(dados, inicio, fim, 'CLIENTE')
+    return chegadas[chegadas['CLIENTE'] == cliente].drop(columns='CLIENTE')
+
+def criar_mapa_calor(chegadas, cliente=None):
     """Cria mapa de calor de retirada de senhas"""
-    df = dados['base']
     cores_tema = obter_cores_tema()
     
-    # Aplicar filtros de data para período 2
-    mask = (
-        (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-        (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-    )
-    df_filtrado = df[mask]
-    
-    # Filtrar por cliente se especificado
-    if cliente:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'] == cliente]
-    
-    # Criar matriz de dados para o mapa de calor
-    pivot = pd.pivot_table(
-        df_filtrado,
-        values='id',
-        index=df_filtrado['retirada'].dt.strftime('%d/%m/%Y'),
-        columns=df_filtrado['retirada'].dt.hour,
-        aggfunc='count',
-        fill_value=0
-    )
-    
-    # Ordenar o índice (datas) em ordem decrescente
-    pivot = pivot.reindex(index=sorted(pivot.index, key=lambda x: pd.to_datetime(x, format='%d/%m/%Y'), reverse=True))
-    
-    # Garantir todas as horas do dia (0-23)
-    todas_horas = range(24)
-    for hora in todas_horas:
-        if hora not in pivot.columns:
-            pivot[hora] = 0
-    pivot = pivot.reindex(columns=sorted(pivot.columns))
+    # Matriz dia × hora somando as faixas de 15 minutos, datas em ordem decrescente
+    pivot = tabela_mapa_calor(chegadas)
     
     # Criar mapa de calor com configurações atualizadas
     fig = go.Figure(data=go.Heatmap(
         z=pivot.values,
         x=[f"{h:02d}h" for h in pivot.columns],
-        y=pivot.index,
+        y=pivot.index.strftime('%d/%m/%Y'),
         text=pivot.values,
         texttemplate="%{text}" if "%{text} != 0" else "",  # Mostrar apenas valores não-zero
         textfont={
@@ -159,27 +140,38 @@ def mostrar_aba(dados, filtros):
         - 💡 Recomendações operacionais
         """)
     
+    mostrar_secao_comboio(dados, filtros)
+
+@fragmento
+def mostrar_secao_comboio(dados, filtros):
+    """Seletor, mapa de calor e análise, reexecutados isoladamente a cada interação"""
     try:
         # Seleção de visualização
         tipo_analise = st.radio(
             "Visualizar:",
             ["Geral", "Por Cliente"],
-            horizontal=True
+            horizontal=True,
+            key="comboio_i_tipo_analise"
         )
         
+        cliente_selecionado = None
         if tipo_analise == "Por Cliente":
             # Convert CLIENTE values to strings before sorting
-            clientes = sorted(dados['base']['CLIENTE'].astype(str).unique())
+            opcoes_cliente = obter_opcoes_coluna(dados, 'CLIENTE')
             cliente_selecionado = st.selectbox(
                 "Selecione o Cliente:",
-                clientes
+                list(opcoes_cliente)
             )
-            
-            # Criar mapa de calor para o cliente selecionado
-            fig, pivot = criar_mapa_calor(dados, filtros, cliente_selecionado)
+            chegadas = obter_chegadas_selecao(dados, filtros, opcoes_cliente[cliente_selecionado])
         else:
-            # Criar mapa de calor geral
-            fig, pivot = criar_mapa_calor(dados, filtros)
+            chegadas = obter_chegadas_selecao(dados, filtros)
+        
+        if chegadas.empty:
+            st.warning("Não existem dados para o período selecionado.")
+            return
+        
+        # Criar mapa de calor (geral ou do cliente selecionado)
+        fig, pivot = criar_mapa_calor(chegadas, cliente_selecionado)
         
         # Exibir gráfico
         st.plotly_chart(fig, use_container_width=True)
@@ -187,36 +179,39 @@ def mostrar_aba(dados, filtros):
         # Insights
         st.subheader("📊 Análise Detalhada")
         with st.expander("Ver análise detalhada", expanded=True):
-            df = dados['base']
-            
-            # Preparação dos dados
-            df['hora'] = df['retirada'].dt.hour
-            df['data'] = df['retirada'].dt.date
             dias_semana = {
-                'Sunday': 'Domingo',
-                'Monday': 'Segunda-feira',
-                'Tuesday': 'Terça-feira',
-                'Wednesday': 'Quarta-feira',
-                'Thursday': 'Quinta-feira',
-                'Friday': 'Sexta-feira',
-                'Saturday': 'Sábado'
+                0: 'Segunda-feira',
+                1: 'Terça-feira',
+                2: 'Quarta-feira',
+                3: 'Quinta-feira',
+                4: 'Sexta-feira',
+                5: 'Sábado',
+                6: 'Domingo'
             }
-            df['dia_semana'] = df['retirada'].dt.day_name().map(dias_semana)
-            df['periodo_15min'] = df['retirada'].dt.floor('15T')
             
-            # Cálculos básicos
-            picos = df.groupby('hora')['id'].count()
-            hora_pico = picos.idxmax()
-            dias_mov = df.groupby(['dia_semana', 'data'])['id'].count().groupby('dia_semana').mean()
-            dia_mais_mov = dias_mov.idxmax()
+            # Cálculos básicos sobre a matriz dia × hora do mapa de calor
+            picos = pivot.mean()
+            totais_dia = pivot.sum(axis=1)
+            dias_mov = totais_dia.groupby(pivot.index.dayofweek.map(dias_semana)).mean()
             horarios_criticos = picos[picos > picos.mean() + picos.std()]
             
-            def identificar_comboios(grupo):
-                return (grupo['id'].count() > grupo['id'].count().mean() + grupo['id'].count().std())
-            
-            comboios = df.groupby(['data', 'periodo_15min']).filter(identificar_comboios)
-            comboios_por_data = df.groupby(['data', 'periodo_15min'])['id'].count()
-            threshold = int(comboios_por_data.mean() + comboios_por_data.std())
+            # Regra do comboio: faixas de 15 minutos acima de média + fator × desvio da referência
+            col_escopo, col_fator = st.columns(2)
+            with col_escopo:
+                escopo = st.radio(
+                    "Referência do limite:",
+                    list(ESCOPOS),
+                    format_func=ESCOPOS.get,
+                    horizontal=True,
+                    key="comboio_i_escopo"
+                )
+            with col_fator:
+                fator = st.slider(
+                    "Fator do desvio padrão:", min_value=0.5, max_value=3.0, value=1.0, step=0.5,
+                    key="comboio_i_fator"
+                )
+            comboios = detectar_comboios(chegadas, escopo=escopo, fator=fator)
+            threshold = int(chegadas['retiradas'].mean() + fator * np.nan_to_num(chegadas['retiradas'].std()))
 
             # 1. Visão Geral em duas colunas
             col1, col2 = st.columns(2)
@@ -229,6 +224,7 @@ def mostrar_aba(dados, filtros):
                 - Média diária: **{media_diaria:,}** senhas
                 - Total de dias: **{total_dias}**
                 - Limite de alerta: **{threshold}** senhas/15min
+                - Comboios detectados: **{len(comboios):,}** faixas de 15min
                 """)
                 
                 st.subheader("⏱️ Horários Críticos")
@@ -254,12 +250,13 @@ def mostrar_aba(dados, filtros):
             
             with col3:
                 st.subheader("📊 Maiores Concentrações")
-                top_concentracoes = comboios_por_data.nlargest(5)
-                for (data, periodo), qtd in top_concentracoes.items():
+                if comboios.empty:
+                    st.markdown("- Nenhuma faixa acima do limite")
+                for comboio in comboios.head(5).itertuples():
                     st.markdown(f"""
-                    - **{data.strftime('%d/%m/%Y')} {periodo.strftime('%H:%M')}**
-                      - Senhas: **{int(qtd):,}**
-                      - {f"⚠️ Acima do limite" if qtd > threshold else ""}
+                    - **{comboio.faixa.strftime('%d/%m/%Y %H:%M')}**
+                      - Senhas: **{int(comboio.retiradas):,}**
+                      - ⚠️ Acima do limite de {comboio.limite:.0f}
                     """)
 
             with col4:
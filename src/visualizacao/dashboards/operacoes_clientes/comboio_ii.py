@@ -1,9 +1,14 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import json
+from visualizacao.otimizacao import fragmento, obter_visao_periodo, obter_opcoes_coluna, obter_distintos, obter_linhas_hora, obter_pendencias, obter_fila, obter_simulacao
+from processamento.pendencias import acumular_pendencias
+from processamento.fila import resumir_fila_hora
+from processamento.distintos import contar_distintos
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -28,77 +33,54 @@ def obter_cores_tema():
         'alerta': '#ff6b6b' if is_dark else '#ff5757'        # Vermelho
     }
 
-def calcular_potencial_atendimento(df_filtrado, minutos_atendimento=8):
-    """Calcula quantas senhas poderiam ser atendidas dentro da hora"""
-    df = df_filtrado.copy()
-    df['minuto_retirada'] = df['retirada'].dt.minute
-    df['atendimento_viavel'] = df['minuto_retirada'] <= (60 - minutos_atendimento)
-    
-    metricas_viaveis = pd.DataFrame()
-    metricas_viaveis['hora'] = range(24)
-    viaveis = df[df['atendimento_viavel']].groupby(df['retirada'].dt.hour).size()
-    metricas_viaveis['senhas_viaveis'] = metricas_viaveis['hora'].map(viaveis).fillna(0)
-    
-    return metricas_viaveis
-
 def calcular_metricas_hora(dados, filtros, cliente=None, operacao=None, data_especifica=None):
     """Calcula métricas de senhas por hora considerando o efeito bola de neve"""
-    df = dados['base']
-    
-    # Aplicar filtros de data
-    if data_especifica:
-        mask = (df['retirada'].dt.date == data_especifica)
-    else:
-        mask = (
-            (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-            (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-        )
-    df_filtrado = df[mask]
-    
-    # Filtrar por cliente se especificado
+    # Cliente e operação selecionam séries da tabela de pendências do período, calculada uma vez
+    selecao = {}
     if cliente:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'] == cliente]
-    
-    # Filtrar por operação se especificado
+        selecao['CLIENTE'] = cliente
     if operacao:
-        df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'] == operacao]
-    
-    # Agrupar por hora mantendo os IDs
-    metricas_hora = pd.DataFrame()
-    metricas_hora['hora'] = range(24)
-    
-    # Agrupar mantendo os IDs das senhas e garantir valores numéricos
-    retiradas_grupo = df_filtrado.groupby(df_filtrado['retirada'].dt.hour)
-    metricas_hora['retiradas'] = pd.Series(retiradas_grupo.size()).reindex(range(24)).fillna(0)
+        selecao['OPERAÇÃO'] = operacao
     
-    # Nova forma de calcular senhas_hora
-    senhas_por_hora = {}
-    for hora in range(24):
-        senhas_hora = df_filtrado[df_filtrado['retirada'].dt.hour == hora]['id'].tolist()
-        senhas_por_hora[hora] = senhas_hora
-    
-    metricas_hora['senhas_hora'] = metricas_hora['hora'].map(senhas_por_hora)
-    
-    # Calcular atendidas e pendentes com valores padrão
-    atendidas = df_filtrado.groupby(df_filtrado['inicio'].dt.hour)['id'].count()
-    metricas_hora['atendidas'] = metricas_hora['hora'].map(atendidas).fillna(0)
+    tabela = obter_pendencias(dados, filtros['periodo2']['inicio'], filtros['periodo2']['fim'], list(selecao) or None)
+    mascara = np.ones(len(tabela), dtype=bool)
+    for coluna, valor in selecao.items():
+        mascara &= (tabela[coluna] == valor).values
+    if data_especifica:
+        mascara &= (tabela['data'] == pd.Timestamp(data_especifica)).values
     
-    # Calcular pendentes com efeito bola de neve
-    metricas_hora['pendentes'] = 0
-    pendentes_acumulados = 0
+    colunas = ['retiradas', 'atendidas', 'senhas_viaveis', 'senhas_inviaveis']
+    metricas_hora = (
+        tabela[mascara].groupby('hora')[colunas].sum()
+        .reindex(range(24), fill_value=0)
+        .rename_axis('hora').reset_index()
+    )
+    if data_especifica:
+        metricas_hora['pendentes'] = tabela[mascara].set_index('hora')['pendentes'].reindex(range(24), fill_value=0).values
+    else:
+        # Perfil do período: a bola de neve corre sobre a soma dos dias em cada hora
+        metricas_hora['pendentes'] = acumular_pendencias(
+            (metricas_hora['retiradas'] - metricas_hora['atendidas']).values
+        )
     
-    for idx in metricas_hora.index:
-        total_para_atender = metricas_hora.loc[idx, 'retiradas'] + pendentes_acumulados
-        atendidas_hora = metricas_hora.loc[idx, 'atendidas']
-        pendentes_acumulados = max(0, total_para_atender - atendidas_hora)
-        metricas_hora.loc[idx, 'pendentes'] = pendentes_acumulados
+    # Fila reconstruída minuto a minuto (retirada até início), resumida por hora
+    fila = obter_fila(dados, filtros['periodo2']['inicio'], filtros['periodo2']['fim'], list(selecao) or None)
+    mascara_fila = np.ones(len(fila), dtype=bool)
+    for coluna, valor in selecao.items():
+        mascara_fila &= (fila[coluna] == valor).values
+    if data_especifica:
+        mascara_fila &= (fila['data'] == pd.Timestamp(data_especifica)).values
+    fila_hora = resumir_fila_hora(fila[mascara_fila])
+    metricas_hora['fila_maxima'] = fila_hora['fila_maxima'].values
+    metricas_hora['fila_media'] = fila_hora['fila_media'].values
     
-    # Adicionar métricas de viabilidade
-    metricas_viaveis = calcular_potencial_atendimento(df_filtrado)
-    metricas_hora['senhas_viaveis'] = metricas_viaveis['senhas_viaveis']
-    metricas_hora['senhas_inviaveis'] = metricas_hora['retiradas'] - metricas_hora['senhas_viaveis']
+    # Recorte do dia (ou período) do detalhamento das senhas, lido hora a hora pelo índice (dia, hora)
+    if data_especifica:
+        recorte = (data_especifica, data_especifica, selecao)
+    else:
+        recorte = (filtros['periodo2']['inicio'], filtros['periodo2']['fim'], selecao)
     
-    return metricas_hora, df_filtrado
+    return metricas_hora, recorte
 
 def criar_grafico_comboio(metricas_hora, cliente=None):
     """Cria gráfico de barras para análise de comboio"""
@@ -165,6 +147,21 @@ def criar_grafico_comboio(metricas_hora, cliente=None):
             marker=dict(size=8),
         )
     )
+    
+    # Adiciona linha da maior fila na hora (pessoas esperando ao mesmo tempo)
+    if 'fila_maxima' in metricas_hora:
+        fig.add_trace(
+            go.Scatter(
+                name='Fila Máxima (pessoas)',
+                x=metricas_hora['hora'],
+                y=replace_zeros(metricas_hora['fila_maxima']),
+                customdata=metricas_hora['fila_media'].round(1),
+                mode='lines+markers',
+                line=dict(color='#e67700', width=2),
+                marker=dict(size=8),
+                hovertemplate='%{x:02d}:00h<br>Fila máxima: %{y}<br>Fila média: %{customdata}<extra></extra>'
+            )
+        )
 
     # Atualiza layout para acomodar os rótulos maiores
     titulo = f"Análise Hora a Hora {'- ' + cliente if cliente else 'Geral'}"
@@ -236,7 +233,7 @@ def criar_grafico_comboio(metricas_hora, cliente=None):
 
 def gerar_insights_comboio(metricas, dados=None, data_selecionada=None, cliente=None, operacao=None):
     """Gera insights sobre o padrão de chegada em comboio"""
-    metricas_df, df_base = metricas
+    metricas_df, (inicio, fim, filtros_base) = metricas
     
     # Cálculos principais
     total_retiradas = metricas_df['retiradas'].sum()
@@ -259,6 +256,7 @@ def gerar_insights_comboio(metricas, dados=None, data_selecionada=None, cliente=
     hora_pico_retiradas = metricas_df.loc[metricas_df['retiradas'].idxmax()]
     hora_pico_pendentes = metricas_df.loc[metricas_df['pendentes'].idxmax()]
     hora_pico_atendidas = metricas_df.loc[metricas_df['atendidas'].idxmax()]
+    hora_pico_fila = metricas_df.loc[metricas_df['fila_maxima'].idxmax()]
     
     # Criar ranking dos 7 maiores picos
     top_7_picos = metricas_df.nlargest(7, 'retiradas')
@@ -294,6 +292,7 @@ def gerar_insights_comboio(metricas, dados=None, data_selecionada=None, cliente=
         - Pico de retiradas: **{int(hora_pico_retiradas['retiradas']):,}** às **{int(hora_pico_retiradas['hora']):02d}:00h**
         - Pico de pendências: **{int(hora_pico_pendentes['pendentes']):,}** às **{int(hora_pico_pendentes['hora']):02d}:00h**
         - Pico de atendimentos: **{int(hora_pico_atendidas['atendidas']):,}** às **{int(hora_pico_atendidas['hora']):02d}:00h**
+        - Maior fila: **{int(hora_pico_fila['fila_maxima']):,}** pessoas às **{int(hora_pico_fila['hora']):02d}:00h** (média de {hora_pico_fila['fila_media']:.1f} na hora)
         """)
         
         st.subheader("💡 Recomendações")
@@ -330,7 +329,8 @@ def gerar_insights_comboio(metricas, dados=None, data_selecionada=None, cliente=
         'retirada', 'inicio', 'fim', 'guichê', 'usuário'
     ]
     
-    dados_detalhados = []
+    # Gates distintos por hora de início no recorte, contados uma vez para todos os picos
+    gates_por_hora = contar_distintos(obter_distintos(dados), 'guichê', 'hora', inicio, fim, filtros_base)
     
     # Criar tabs para cada horário de pico
     tabs = st.tabs([f"{idx + 1}º) {int(pico.hora):02d}:00h ({int(pico.retiradas)} senhas)" 
@@ -339,15 +339,12 @@ def gerar_insights_comboio(metricas, dados=None, data_selecionada=None, cliente=
     for tab, (_, pico) in zip(tabs, top_7_picos.iterrows()):
         with tab:
             hora = int(pico['hora'])
-            senhas_hora = pico['senhas_hora']
-            
-            # Buscar detalhes das senhas na base
-            detalhes_senhas = df_base[df_base['id'].isin(senhas_hora)].copy()
             
-            # Formatar as colunas de data/hora
-            for col in ['retirada', 'inicio', 'fim']:
-                if col in detalhes_senhas.columns:
-                    detalhes_senhas[col] = detalhes_senhas[col].dt.strftime('%H:%M:%S')
+            # Senhas retiradas na hora, na ordem da base, com data/hora formatadas
+            detalhes_senhas = obter_linhas_hora(dados, inicio, fim, hora, 'retirada', filtros_base)
+            detalhes_senhas = detalhes_senhas.assign(**{
+                col: detalhes_senhas[col].dt.strftime('%H:%M:%S') for col in ['retirada', 'inicio', 'fim']
+            })
             
             # Mostrar resumo do horário
             st.write(f"### Detalhes do Horário {hora:02d}:00h")
@@ -396,8 +393,7 @@ def gerar_insights_comboio(metricas, dados=None, data_selecionada=None, cliente=
             col4.metric("Potencial Real de Atendimento", potencial)
             
             # Calcular gates ativos do horário atual
-            gates_ativos = len(df_base[df_base['inicio'].dt.hour == hora]['guichê'].unique())
-            col5.metric("Gates Ativos", gates_ativos)
+            col5.metric("Gates Ativos", int(gates_por_hora.get(hora, 0)))
             
             # Exibir tabela detalhada
             st.dataframe(
@@ -418,6 +414,139 @@ def gerar_insights_comboio(metricas, dados=None, data_selecionada=None, cliente=
                 use_container_width=True
             )
 
+def criar_grafico_simulacao(atual, cenario, titulo):
+    """Espera média simulada por hora (escala atual, cenário e observada) com as pendências do cenário"""
+    cores_tema = obter_cores_tema()
+    fig = go.Figure()
+    
+    # Pendências médias ao fim da hora, no eixo da direita
+    for nome, tabela, cor in [('Pendências (Atual)', atual, cores_tema['secundaria']), ('Pendências (Cenário)', cenario, cores_tema['alerta'])]:
+        fig.add_trace(
+            go.Bar(
+                name=nome,
+                x=tabela['hora'],
+                y=tabela['pendentes'].round(1),
+                marker_color=cor,
+                opacity=0.35,
+                yaxis='y2',
+                hovertemplate='%{x:02d}:00h<br>Pendências: %{y}<extra></extra>'
+            )
+        )
+    
+    # Faixa de 10% a 90% das replicações do cenário
+    fig.add_trace(
+        go.Scatter(
+            x=list(cenario['hora']) + list(cenario['hora'])[::-1],
+            y=list(cenario['espera_p90']) + list(cenario['espera_p10'])[::-1],
+            fill='toself',
+            fillcolor='rgba(255, 87, 87, 0.15)',
+            line=dict(width=0),
+            hoverinfo='skip',
+            name='Cenário (10% a 90%)'
+        )
+    )
+    for nome, tabela, coluna, estilo in [
+        ('Espera Simulada (Atual)', atual, 'espera_media', dict(color=cores_tema['primaria'], width=2)),
+        ('Espera Simulada (Cenário)', cenario, 'espera_media', dict(color=cores_tema['alerta'], width=3)),
+        ('Espera Observada', atual, 'espera_observada', dict(color='#2ecc71', width=2, dash='dot'))
+    ]:
+        fig.add_trace(
+            go.Scatter(
+                name=nome,
+                x=tabela['hora'],
+                y=tabela[coluna].round(1),
+                customdata=tabela['gates'],
+                mode='lines+markers',
+                line=estilo,
+                marker=dict(size=6),
+                hovertemplate='%{x:02d}:00h<br>Espera: %{y} min<br>Gates: %{customdata}<extra></extra>'
+            )
+        )
+    
+    fig.update_layout(
+        title={'text': titulo, 'font': {'size': 18, 'color': cores_tema['texto']}, 'x': 0.5, 'xanchor': 'center'},
+        xaxis=dict(
+            title='Hora do Dia',
+            tickmode='array',
+            ticktext=[f'{i:02d}h' for i in range(24)],
+            tickvals=list(range(24)),
+            tickfont={'color': cores_tema['texto']},
+            gridcolor=cores_tema['grid'],
+            range=[-0.5, 23.5]
+        ),
+        yaxis=dict(title='Espera Média (min)', tickfont={'color': cores_tema['texto']}, gridcolor=cores_tema['grid'], rangemode='tozero'),
+        yaxis2=dict(title='Pendências ao Fim da Hora', overlaying='y', side='right', showgrid=False, rangemode='tozero'),
+        barmode='group',
+        height=500,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor=cores_tema['fundo'],
+        legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1, 'font': {'color': cores_tema['texto']}},
+        margin=dict(l=40, r=60, t=100, b=60)
+    )
+    return fig
+
+def mostrar_simulacao(dados, filtros, filtros_base=None, nome=None):
+    """Simulação de reforço (ou redução) de gates numa faixa de horas sobre as retiradas do Período 2"""
+    st.subheader("🧪 Simulação de Escala de Gates")
+    if not st.checkbox("Simular um cenário de escala", key="comboio_ii_simular"):
+        st.caption("Repete as retiradas do período com tempos de atendimento sorteados por operação sob outra escala de gates")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        hora_inicio, hora_fim = st.slider(
+            "Horário do reforço:", min_value=0, max_value=24, value=(6, 9), format="%02d:00",
+            key="comboio_ii_sim_horas"
+        )
+    with col2:
+        extras = st.number_input(
+            "Gates a mais (negativo para retirar):", min_value=-50, max_value=50, value=2, step=1,
+            key="comboio_ii_sim_gates"
+        )
+    with col3:
+        replicacoes = st.select_slider(
+            "Replicações:", options=[50, 100, 200, 500], value=100, key="comboio_ii_sim_replicacoes",
+            help="Mais replicações estreitam a faixa de incerteza e aumentam o tempo de cálculo"
+        )
+    
+    inicio, fim = filtros['periodo2']['inicio'], filtros['periodo2']['fim']
+    try:
+        with st.spinner("Simulando..."):
+            atual = obter_simulacao(dados, inicio, fim, filtros_base, replicacoes=replicacoes)
+            if atual.empty:
+                st.warning("Não há retiradas para simular no período selecionado.")
+                return
+            escala = atual['gates'].values.copy()
+            escala[hora_inicio:hora_fim] = np.maximum(escala[hora_inicio:hora_fim] + extras, 0)
+            cenario = obter_simulacao(dados, inicio, fim, filtros_base, escala=escala, replicacoes=replicacoes)
+    except ValueError as e:
+        st.warning(f"Não foi possível simular o cenário: {e}")
+        return
+    
+    # Médias do dia ponderadas pelas retiradas de cada hora
+    def espera_dia(tabela):
+        return np.nansum(tabela['espera_media'] * tabela['retiradas']) / max(tabela['retiradas'].sum(), 1)
+    
+    espera_atual, espera_cenario = espera_dia(atual), espera_dia(cenario)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Espera Média Simulada (Atual)", f"{espera_atual:.1f} min")
+    col2.metric(
+        "Espera Média no Cenário", f"{espera_cenario:.1f} min",
+        delta=f"{round(espera_cenario - espera_atual, 1) + 0:+.1f} min", delta_color="inverse"
+    )
+    col3.metric("Pico de Pendências (Atual)", f"{atual['pendentes'].max():.1f}")
+    col4.metric(
+        "Pico de Pendências no Cenário", f"{cenario['pendentes'].max():.1f}",
+        delta=f"{round(cenario['pendentes'].max() - atual['pendentes'].max(), 1) + 0:+.1f}", delta_color="inverse"
+    )
+    
+    titulo = f"Cenário: {extras:+d} gates das {hora_inicio:02d}h às {hora_fim:02d}h" + (f" - {nome}" if nome else "")
+    st.plotly_chart(criar_grafico_simulacao(atual, cenario, titulo), use_container_width=True, key="comboio_ii_sim_grafico")
+    st.caption(
+        "Escala atual: média de gates distintos atendendo em cada hora nos dias do período. "
+        "Compare a espera simulada atual com a observada para avaliar a aderência do modelo."
+    )
+
 def mostrar_aba(dados, filtros):
     """Mostra a aba de análise detalhada de chegada em comboio"""
     st.header("Análise de Chegada em Comboio II")
@@ -454,18 +583,28 @@ def mostrar_aba(dados, filtros):
         - 🎯 Horários críticos
         - ⚠️ Alertas de sobrecarga
         - 💡 Sugestões de distribuição
+
+        6. **Simulação de Escala**:
+        - Retiradas do período repetidas com outra escala de gates
+        - Tempos de atendimento sorteados por operação
+        - Espera e pendências esperadas por hora
         """)
 
     try:
         st.session_state['tema_atual'] = detectar_tema()
-        
+        mostrar_secao_comboio(dados, filtros)
+    
+    except Exception as e:
+        st.error("Erro ao gerar a aba de Análise de Chegada em Comboio II")
+        st.exception(e)
+
+@fragmento
+def mostrar_secao_comboio(dados, filtros):
+    """Seletores, gráfico e análise hora a hora, reexecutados isoladamente a cada interação"""
+    try:
         # Obter datas disponíveis na base dentro do período 2
-        df = dados['base']
-        mask_periodo = (
-            (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-            (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-        )
-        datas_disponiveis = sorted(df[mask_periodo]['retirada'].dt.date.unique())
+        df_periodo = obter_visao_periodo(dados, filtros['periodo2']['inicio'], filtros['periodo2']['fim'])
+        datas_disponiveis = sorted(df_periodo['retirada'].dt.date.unique())
         
         if len(datas_disponiveis) == 0:
             st.warning("Não existem dados para o período selecionado.")
@@ -485,7 +624,8 @@ def mostrar_aba(dados, filtros):
         
         if tipo_analise == "Por Cliente":
             # Convert CLIENTE values to strings before sorting
-            clientes = sorted(dados['base']['CLIENTE'].astype(str).unique())
+            opcoes_cliente = obter_opcoes_coluna(dados, 'CLIENTE')
+            clientes = list(opcoes_cliente)
             cliente_selecionado = st.selectbox(
                 "Selecione o Cliente:",
                 clientes,
@@ -501,13 +641,15 @@ def mostrar_aba(dados, filtros):
             data_especifica = datas_dict[data_formatada]
             
             # Calcular métricas e criar gráfico (converter cliente_selecionado de volta para o tipo original)
-            cliente_original = dados['base'].loc[dados['base']['CLIENTE'].astype(str) == cliente_selecionado, 'CLIENTE'].iloc[0]
+            cliente_original = opcoes_cliente[cliente_selecionado]
             metricas = calcular_metricas_hora(dados, filtros, cliente=cliente_original, data_especifica=data_especifica)
             fig = criar_grafico_comboio(metricas[0], cliente_selecionado)
+            filtros_simulacao, nome_simulacao = {'CLIENTE': cliente_original}, cliente_selecionado
             
         elif tipo_analise == "Por Operação":
             # Convert OPERAÇÃO values to strings before sorting
-            operacoes = sorted(dados['base']['OPERAÇÃO'].astype(str).unique())
+            opcoes_operacao = obter_opcoes_coluna(dados, 'OPERAÇÃO')
+            operacoes = list(opcoes_operacao)
             operacao_selecionada = st.selectbox(
                 "Selecione a Operação:",
                 operacoes,
@@ -523,9 +665,10 @@ def mostrar_aba(dados, filtros):
             data_especifica = datas_dict[data_formatada]
             
             # Calcular métricas e criar gráfico (converter operacao_selecionada de volta para o tipo original)
-            operacao_original = dados['base'].loc[dados['base']['OPERAÇÃO'].astype(str) == operacao_selecionada, 'OPERAÇÃO'].iloc[0]
+            operacao_original = opcoes_operacao[operacao_selecionada]
             metricas = calcular_metricas_hora(dados, filtros, operacao=operacao_original, data_especifica=data_especifica)
             fig = criar_grafico_comboio(metricas[0], operacao_selecionada)
+            filtros_simulacao, nome_simulacao = {'OPERAÇÃO': operacao_original}, operacao_selecionada
         
         else:
             # Seletor de data com formato dd/mm/aaaa
@@ -539,6 +682,7 @@ def mostrar_aba(dados, filtros):
             # Calcular métricas e criar gráfico geral
             metricas = calcular_metricas_hora(dados, filtros, data_especifica=data_especifica)
             fig = criar_grafico_comboio(metricas[0])
+            filtros_simulacao, nome_simulacao = None, None
         
         # Exibir gráfico primeiro
         st.plotly_chart(fig, use_container_width=True)
@@ -550,6 +694,9 @@ def mostrar_aba(dados, filtros):
             gerar_insights_comboio(metricas, dados, data_especifica, 
                                  cliente_selecionado if tipo_analise == "Por Cliente" else None,
                                  operacao_selecionada if tipo_analise == "Por Operação" else None)
+        
+        st.markdown("---")
+        mostrar_simulacao(dados, filtros, filtros_simulacao, nome_simulacao)
     
     except Exception as e:
         st.error("Erro ao gerar a aba de Análise de Chegada em Comboio II")
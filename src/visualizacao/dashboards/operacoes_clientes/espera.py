@@ -4,6 +4,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
+from visualizacao.otimizacao import obter_tabela_metrica, escolher_estatistica, obter_opcoes_coluna, obter_fila, filtros_cubo_sidebar
+from processamento.fila import resumir_fila_hora
+from visualizacao.tendencia import escolher_modo, mostrar_tendencia
+from processamento.metricas import extrair_metas, calcular_desvio_meta
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -47,99 +51,28 @@ def determinar_turno(hora):
     else:  # 23-7
         return 'TURNO C'
 
-def calcular_tempos_por_periodo(dados, filtros, periodo, grupo='CLIENTE'):
-    """Calcula tempos médios de espera por cliente/operação no período"""
-    df = dados['base']
-    df_medias = dados['medias']
+def calcular_tempos_comparativos(dados, filtros, grupo='CLIENTE', quantil=None):
+    """Calcula tempos médios (ou o percentil `quantil`) de espera por cliente/operação nos dois períodos"""
+    # Tabela servida pelo motor de métricas, já com os filtros de cliente, operação e turno
+    tabela = obter_tabela_metrica(dados, filtros, grupo, 'tpesper', quantil=quantil)
     
-    # Aplicar filtros de data
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo]['fim'])
-    )
-    df_filtrado = df[mask].copy()
-    
-    # Determina o turno com base no horário de retirada
-    df_filtrado['TURNO'] = df_filtrado['retirada'].apply(determinar_turno)
-    
-    # Aplicar filtros
-    if filtros['cliente'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'].isin(filtros['cliente'])]
-    
-    if filtros['operacao'] != ['Todas']:
-        df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
-    
-    if filtros['turno'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['TURNO'].isin(filtros['turno'])]
-    
-    if len(df_filtrado) == 0:
-        st.warning(f"Nenhum dado encontrado para o período {periodo} com os filtros selecionados.")
+    # Verifica se há dados nos dois períodos após todos os filtros
+    if tabela.empty:
+        st.warning("Nenhum dado encontrado nos períodos selecionados com os filtros aplicados.")
         return pd.DataFrame()
     
-    # Calcula média de espera usando 'tpesper' ao invés de 'tpespera'
-    tempos = df_filtrado.groupby(grupo)['tpesper'].agg([
-        ('media', 'mean'),
-        ('contagem', 'count')
-    ]).reset_index()
-    
-    # Converte tempo para minutos
-    tempos['media'] = tempos['media'] / 60
-    
-    return tempos
+    # Médias (ou percentis) em minutos
+    return tabela.rename(columns={
+        'valor_p1': 'media_p1',
+        'valor_p2': 'media_p2'
+    })[[grupo, 'media_p1', 'contagem_p1', 'media_p2', 'contagem_p2', 'variacao']]
 
-def converter_para_minutos(valor):
-    """Converte diferentes formatos de tempo para minutos"""
-    if pd.isna(valor):
-        return None
-    if isinstance(valor, (int, float)):
-        return float(valor)
-    if isinstance(valor, str):
-        try:
-            partes = valor.split(':')
-            if len(partes) == 2:
-                horas, minutos = map(int, partes)
-                return horas * 60 + minutos
-            elif len(partes) == 3:
-                horas, minutos, segundos = map(int, partes)
-                return horas * 60 + minutos + segundos / 60
-        except:
-            return None
-    if hasattr(valor, 'hour') and hasattr(valor, 'minute'):
-        return valor.hour * 60 + valor.minute
-    return None
-
-def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE', filtros=None):
+def criar_grafico_comparativo(df_comp, metas, grupo='CLIENTE', filtros=None, rotulo='Tempo Médio'):
     """Cria gráfico comparativo de tempos médios entre períodos"""
     cores_tema = obter_cores_tema()
     
-    # Ajusta os dados de meta se disponíveis
-    if dados_medias is not None:
-        try:
-            dados_medias = dados_medias.iloc[1:].copy()
-            dados_medias.columns = ['CLIENTE', 'OPERAÇÃO', 'TEMPO DE ATENDIMENTO (MEDIA)', 'TURNO A', 'TURNO B']
-            dados_medias = dados_medias.reset_index(drop=True)
-            
-            dados_medias['TEMPO DE ATENDIMENTO (MEDIA)'] = pd.to_numeric(
-                dados_medias['TEMPO DE ATENDIMENTO (MEDIA)'],
-                errors='coerce'
-            )
-            dados_medias = dados_medias.dropna(subset=['TEMPO DE ATENDIMENTO (MEDIA)'])
-        except Exception as e:
-            dados_medias = None
-    
-    # Merge dos dados dos dois períodos
-    df_comp = pd.merge(
-        dados_p1,
-        dados_p2,
-        on=grupo,
-        suffixes=('_p1', '_p2')
-    )
-    
-    df_comp['variacao'] = ((df_comp['media_p2'] - df_comp['media_p1']) 
-                          / df_comp['media_p1'] * 100)
-    
     # Ordena por total decrescente
-    df_comp['total'] = df_comp['media_p1'] + df_comp['media_p2']
+    df_comp = df_comp.assign(total=df_comp['media_p1'] + df_comp['media_p2'])
     df_comp = df_comp.sort_values('total', ascending=False)
     
     fig = go.Figure()
@@ -212,36 +145,27 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
         )
     )
     
-    # Adiciona linha de meta se disponível
-    if dados_medias is not None and isinstance(dados_medias, pd.DataFrame) and not dados_medias.empty:
-        try:
-            coluna_meta = 'TEMPO DE ATENDIMENTO (MEDIA)'
-            if coluna_meta in dados_medias.columns:
-                metas = dados_medias[[grupo, coluna_meta]].dropna(subset=[coluna_meta])
-                
-                if not metas.empty:
-                    df_metas = pd.merge(df_comp[[grupo]], metas, on=grupo, how='left')
-                    df_metas = df_metas.dropna(subset=[coluna_meta])
-                    
-                    if not df_metas.empty:
-                        fig.add_trace(
-                            go.Scatter(
-                                name='Meta Individual',
-                                y=df_metas[grupo],
-                                x=df_metas[coluna_meta],
-                                mode='markers+text',
-                                marker=dict(
-                                    symbol='diamond',
-                                    size=10,
-                                    color=cores_tema['erro']
-                                ),
-                                text=[f"{formatar_tempo(x)} min" for x in df_metas[coluna_meta]],
-                                textposition='middle right',
-                                textfont=dict(color=cores_tema['erro'])
-                            )
-                        )
-        except Exception as e:
-            pass
+    # Adiciona marcadores de meta se disponíveis
+    if metas is not None and not metas.empty:
+        df_metas = calcular_desvio_meta(df_comp, metas, grupo, 'media_p2').dropna(subset=['meta'])
+        
+        if not df_metas.empty:
+            fig.add_trace(
+                go.Scatter(
+                    name='Meta Individual',
+                    y=df_metas[grupo],
+                    x=df_metas['meta'],
+                    mode='markers+text',
+                    marker=dict(
+                        symbol='diamond',
+                        size=10,
+                        color=cores_tema['erro']
+                    ),
+                    text=[f"{formatar_tempo(x)} min" for x in df_metas['meta']],
+                    textposition='middle right',
+                    textfont=dict(color=cores_tema['erro'])
+                )
+            )
     
     # Adiciona anotações de variação
     for i, row in df_comp.iterrows():
@@ -260,7 +184,7 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
     # Atualiza layout
     fig.update_layout(
         title={
-            'text': f'Comparativo de Tempo Médio de Espera por {grupo}',
+            'text': f'Comparativo de {rotulo} de Espera por {grupo}',
             'font': {'size': 16, 'color': cores_tema['texto']}
         },
         barmode='stack',
@@ -286,7 +210,7 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
     
     # Atualiza eixos
     fig.update_xaxes(
-        title='Tempo Médio (minutos)',
+        title=f'{rotulo} (minutos)',
         title_font={'color': cores_tema['texto']},
         tickfont={'color': cores_tema['texto']},
         gridcolor=cores_tema['grid'],
@@ -309,7 +233,7 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
     
     return fig
 
-def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=None):
+def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", metas=None, rotulo='Tempo médio'):
     """Gera insights sobre os tempos de espera"""
     col1, col2 = st.columns(2)
     
@@ -325,33 +249,24 @@ def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=Non
         st.markdown(f"""
         ##### Período 1
         - Total de atendimentos: **{total_atendimentos_p1:,}**
-        - Tempo médio de espera: **{formatar_tempo(media_geral_p1)} min**
+        - {rotulo} de espera: **{formatar_tempo(media_geral_p1)} min**
         
         ##### Período 2
         - Total de atendimentos: **{total_atendimentos_p2:,}**
-        - Tempo médio de espera: **{formatar_tempo(media_geral_p2)} min**
+        - {rotulo} de espera: **{formatar_tempo(media_geral_p2)} min**
         - Variação média: **{var_media:+.1f}%** {'📈' if var_media > 0 else '📉'}
         """)
 
     with col2:
         st.subheader("📊 Análise de Metas")
-        if dados_medias is not None and isinstance(dados_medias, pd.DataFrame):
+        if metas is not None:
             try:
                 # Análise de metas
-                coluna_meta = 'TEMPO DE ATENDIMENTO (MEDIA)'
-                if coluna_meta in dados_medias.columns and grupo in dados_medias.columns:
-                    dados_medias[coluna_meta] = dados_medias[coluna_meta].apply(converter_para_minutos)
-                    dados_medias = dados_medias.dropna(subset=[coluna_meta])
-                    
-                    df_analise = pd.merge(
-                        df_comp,
-                        dados_medias[[grupo, coluna_meta]],
-                        on=grupo,
-                        how='left'
-                    )
+                if not metas.empty:
+                    df_analise = calcular_desvio_meta(df_comp, metas, grupo, 'media_p2')
                     
-                    dentro_meta = df_analise[df_analise['media_p2'] <= df_analise[coluna_meta]]
-                    fora_meta = df_analise[df_analise['media_p2'] > df_analise[coluna_meta]]
+                    dentro_meta = df_analise[df_analise['dentro_meta']]
+                    fora_meta = df_analise[df_analise['acima_meta']]
                     total = len(df_analise)
                     perc_dentro = (len(dentro_meta) / total * 100) if total > 0 else 0
                     
@@ -375,13 +290,12 @@ def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=Non
                     # Top 3 mais distantes da meta
                     if not fora_meta.empty:
                         st.markdown("##### Maiores Desvios")
-                        fora_meta['desvio'] = fora_meta['media_p2'] - fora_meta[coluna_meta]
                         top_desvios = fora_meta.nlargest(3, 'desvio')
                         
                         for _, row in top_desvios.iterrows():
                             st.markdown(f"""
                             - **{row[grupo]}**:
-                                - Meta: {formatar_tempo(row[coluna_meta])} min
+                                - Meta: {formatar_tempo(row['meta'])} min
                                 - Atual: {formatar_tempo(row['media_p2'])} min
                                 - Desvio: +{formatar_tempo(row['desvio'])} min ⚠️
                             """)
@@ -419,6 +333,71 @@ def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=Non
                 - Acréscimo de **{formatar_tempo(aumento)} min** por atendimento
             """)
 
+def mostrar_fila_hora(dados, filtros, grupo='CLIENTE'):
+    """Tamanho da fila reconstruído minuto a minuto no período 2, resumido por hora do dia"""
+    st.subheader("👥 Tamanho da Fila por Hora")
+    st.caption(
+        "Cada senha conta na fila da retirada até o início do atendimento; "
+        "a fila máxima é o maior número de pessoas esperando ao mesmo tempo na hora"
+    )
+    
+    nome = "Cliente" if grupo == 'CLIENTE' else "Operação"
+    opcoes = obter_opcoes_coluna(dados, grupo)
+    selecionado = st.selectbox(f"{nome}:", ["Todos"] + list(opcoes), key=f"fila_espera_{grupo}")
+    
+    inicio, fim = filtros['periodo2']['inicio'], filtros['periodo2']['fim']
+    filtros_cubo = filtros_cubo_sidebar(filtros)
+    if selecionado == "Todos":
+        fila = obter_fila(dados, inicio, fim, filtros_cubo=filtros_cubo)
+    else:
+        fila = obter_fila(dados, inicio, fim, grupo, filtros_cubo)
+        fila = fila[(fila[grupo] == opcoes[selecionado]).values]
+    
+    if fila.empty:
+        st.info("Não há senhas atendidas para reconstruir a fila no período selecionado.")
+        return
+    
+    resumo = resumir_fila_hora(fila)
+    cores_tema = obter_cores_tema()
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        name='Fila Média',
+        x=resumo['hora'],
+        y=resumo['fila_media'].round(1),
+        marker_color=cores_tema['primaria'],
+        text=resumo['fila_media'].round(1),
+        textposition='outside'
+    ))
+    fig.add_trace(go.Scatter(
+        name='Fila Máxima',
+        x=resumo['hora'],
+        y=resumo['fila_maxima'],
+        mode='lines+markers',
+        line=dict(color=cores_tema['erro'], width=2),
+        marker=dict(size=8)
+    ))
+    fig.update_layout(
+        height=450,
+        xaxis=dict(
+            title="Hora do Dia",
+            tickmode='array',
+            tickvals=list(range(24)),
+            ticktext=[f'{h:02d}h' for h in range(24)],
+            gridcolor=cores_tema['grid']
+        ),
+        yaxis=dict(title="Pessoas na fila", gridcolor=cores_tema['grid']),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1}
+    )
+    st.plotly_chart(fig, use_container_width=True, key=f"grafico_fila_espera_{grupo}")
+    
+    pico = fila.loc[fila['fila_maxima'].idxmax()]
+    st.markdown(
+        f"- Maior fila do período: **{int(pico['fila_maxima'])}** pessoas em "
+        f"**{pico['horario'].strftime('%d/%m/%Y %H:%M')}**"
+    )
+
 def mostrar_aba(dados, filtros):
     """Mostra a aba de Tempo de Espera"""
     st.header("Tempo de Espera em Fila")
@@ -435,6 +414,7 @@ def mostrar_aba(dados, filtros):
         2. **Análises Disponíveis**:
         - **Por Cliente**: Tempo médio de espera por cliente
         - **Por Operação**: Tempo médio por tipo de serviço
+        - **Estatística**: Média ou percentis P50/P90/P95 (tempo que 50/90/95% dos clientes não esperam além)
         - **Comparativo**: Entre dois períodos selecionados
             - 🟢 Variação negativa = Redução no tempo (melhor)
             - 🔴 Variação positiva = Aumento no tempo (pior)
@@ -467,38 +447,38 @@ def mostrar_aba(dados, filtros):
         )
         
         grupo = "CLIENTE" if tipo_analise == "Cliente" else "OPERAÇÃO"
+        estatistica, quantil = escolher_estatistica("estatistica_espera")
+        rotulo = 'Tempo Médio' if quantil is None else f'Tempo {estatistica}'
         
-        tempos_p1 = calcular_tempos_por_periodo(dados, filtros, 'periodo1', grupo)
-        tempos_p2 = calcular_tempos_por_periodo(dados, filtros, 'periodo2', grupo)
+        if escolher_modo("modo_espera"):
+            mostrar_tendencia(dados, filtros, grupo, 'tpesper', f'{rotulo} (min)', "espera", quantil)
+            return
+        
+        df_comp = calcular_tempos_comparativos(dados, filtros, grupo, quantil)
         
-        if tempos_p1.empty or tempos_p2.empty:
+        if df_comp.empty:
             st.warning("Não há dados para exibir no período selecionado.")
             return
         
-        medias = dados.get('medias')
-        if medias is not None:
-            medias = medias.iloc[1:].copy()
-            medias.columns = ['CLIENTE', 'OPERAÇÃO', 'TEMPO DE ATENDIMENTO (MEDIA)', 'TURNO A', 'TURNO B']
-            medias = medias.reset_index(drop=True)
+        # Metas por cliente/operação lidas da planilha de médias
+        metas = extrair_metas(dados.get('medias'), grupo)
         
-        fig = criar_grafico_comparativo(tempos_p1, tempos_p2, medias, grupo, filtros)
+        fig = criar_grafico_comparativo(df_comp, metas, grupo, filtros, rotulo)
         st.plotly_chart(
             fig, 
             use_container_width=True,
-            key=f"grafico_espera_{grupo}_{st.session_state['tema_atual']}"
+            key=f"grafico_espera_{grupo}_{estatistica}_{st.session_state['tema_atual']}"
         )
         
         st.markdown("---")
         with st.expander("📊 Ver Insights", expanded=True):
-            df_comp = pd.merge(
-                tempos_p1,
-                tempos_p2,
-                on=grupo,
-                suffixes=('_p1', '_p2')
+            gerar_insights(
+                df_comp, grupo, metas=metas,
+                rotulo='Tempo médio' if quantil is None else f'{estatistica} médio dos grupos'
             )
-            df_comp['variacao'] = ((df_comp['media_p2'] - df_comp['media_p1']) 
-                                 / df_comp['media_p1'] * 100)
-            gerar_insights(df_comp, grupo, dados_medias=medias)
+        
+        st.markdown("---")
+        mostrar_fila_hora(dados, filtros, grupo)
     
     except Exception as e:
         st.error("Erro ao gerar a aba de Tempo de Espera")
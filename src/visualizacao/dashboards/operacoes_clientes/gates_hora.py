@@ -1,9 +1,14 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import json
 from datetime import datetime
 import math
+from visualizacao.otimizacao import fragmento, obter_visao_periodo, obter_opcoes_coluna, obter_distintos, obter_linhas_hora, obter_atividade_gates, obter_ocupacao
+from processamento.ocupacao import resumir_ocupacao_hora
+from processamento.cubo import filtrar_cubo
+from processamento.distintos import contar_distintos
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -29,110 +34,100 @@ def obter_cores_tema():
 
 def calcular_gates_hora(dados, filtros, cliente=None, operacao=None, data_especifica=None):
     """Calcula a quantidade de gates ativos por hora"""
-    df = dados['base']
-    
-    # Aplicar filtros de data
+    # Aplicar filtros de data sobre o recorte em cache
     if data_especifica:
-        mask = (df['retirada'].dt.date == data_especifica)
+        inicio = fim = data_especifica
     else:
-        mask = (
-            (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-            (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-        )
-    df_filtrado = df[mask]
+        inicio, fim = filtros['periodo2']['inicio'], filtros['periodo2']['fim']
+    filtros_grao = {}
     
     # Filtrar por cliente se especificado
     if cliente:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'] == cliente]
+        filtros_grao['CLIENTE'] = cliente
     
     # Filtrar por operação se especificado
     if operacao:
-        df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'] == operacao]
+        filtros_grao['OPERAÇÃO'] = operacao
     
     # Criar DataFrame para métricas por hora
     metricas_hora = pd.DataFrame()
     metricas_hora['hora'] = range(24)
     
-    # Calcular gates únicos ativos por hora
-    gates_por_hora = df_filtrado.groupby(df_filtrado['inicio'].dt.hour)['guichê'].nunique()
+    # Gates únicos por hora de início: união dos conjuntos de gates das células do período
+    distintos = obter_distintos(dados)
+    gates_por_hora = contar_distintos(distintos, 'guichê', 'hora', inicio, fim, filtros_grao)
     metricas_hora['gates_ativos'] = metricas_hora['hora'].map(gates_por_hora).fillna(0)
     
     # Calcular atendimentos por hora
-    atendimentos_hora = df_filtrado.groupby(df_filtrado['inicio'].dt.hour)['id'].count()
+    grao = filtrar_cubo(distintos['grao'], inicio, fim, filtros_grao)
+    atendimentos_hora = grao.groupby('hora')['qtd'].sum()
     metricas_hora['atendimentos'] = metricas_hora['hora'].map(atendimentos_hora).fillna(0)
     
     # Calcular média de atendimentos por gate
     metricas_hora['media_atendimentos_gate'] = (metricas_hora['atendimentos'] / 
                                                metricas_hora['gates_ativos']).fillna(0)
     
-    # Adicionar detalhes dos gates por hora
-    detalhes_gates = {}
-    for hora in range(24):
-        # Filtrar atendimentos da hora
-        mask_hora = (df_filtrado['inicio'].dt.hour == hora)
-        atendimentos_hora = df_filtrado[mask_hora].copy()
-        
-        if not atendimentos_hora.empty:
-            # Calcular total de atendimentos na hora para percentuais
-            total_atendimentos_hora = len(atendimentos_hora)
-            
-            # Calcular tempo de atendimento
-            atendimentos_hora['tempo_atendimento'] = (
-                atendimentos_hora['fim'] - atendimentos_hora['inicio']
-            ).dt.total_seconds() / 60
-            
-            # Função para calcular intervalo médio
-            def calcular_intervalo_medio(serie):
-                diff = serie.diff()
-                if diff.empty:
-                    return pd.Timedelta(seconds=0)
-                return diff.mean().total_seconds() / 60
-            
-            # Agrupar por gate e calcular métricas
-            detalhes = (
-                atendimentos_hora.groupby('guichê')
-                .agg({
-                    'id': 'count',
-                    'inicio': ['min', 'max', calcular_intervalo_medio],  # Média de intervalo
-                    'usuário': 'first',
-                    'tempo_atendimento': 'mean',  # Média tempo atendimento
-                })
-                .reset_index()
-            )
-            
-            # Renomear colunas
-            detalhes.columns = [
-                'gate', 'atendimentos', 'inicio', 'fim', 
-                'media_intervalo', 'usuario', 'media_tempo_atend'
-            ]
-            
-            # Adicionar coluna de senhas transferidas como 0 (já que não temos essa informação)
-            detalhes['senhas_transferidas'] = 0
-            
-            # Calcular tempo efetivo de operação em minutos
-            detalhes['tempo_operacao'] = (
-                (detalhes['fim'] - detalhes['inicio'])
-                .dt.total_seconds() / 60
-            ).round(0)
-            
-            # Calcular média de atendimentos por hora
-            detalhes['atend_por_hora'] = (
-                detalhes['atendimentos'] / (detalhes['tempo_operacao'] / 60)
-            ).round(1)
-            
-            # Calcular percentual de contribuição
-            detalhes['percentual_contribuicao'] = (
-                detalhes['atendimentos'] / total_atendimentos_hora * 100
-            ).round(1)
-            
-            detalhes_gates[hora] = detalhes
-        else:
-            detalhes_gates[hora] = pd.DataFrame()
+    # Detalhes de todos os gates em todas as horas numa única tabela (hora, gate); o seletor só recorta
+    atividade = obter_atividade_gates(dados, inicio, fim, filtros_grao)
+    
+    # O detalhamento da hora lê as linhas do recorte pelo índice (dia, hora) do início
+    return metricas_hora, (inicio, fim, filtros_grao), atividade
+
+def calcular_ocupacao_dia(dados, filtros, data_especifica, cliente=None, operacao=None):
+    """Gates em atendimento simultâneo por minuto no dia, a partir da ocupação do período em cache"""
+    inicio, fim = filtros['periodo2']['inicio'], filtros['periodo2']['fim']
+    selecao = {'CLIENTE': cliente} if cliente else {'OPERAÇÃO': operacao} if operacao else {}
+    ocupacao = obter_ocupacao(dados, inicio, fim, next(iter(selecao), None))
+    mascara = (ocupacao['data'] == pd.Timestamp(data_especifica)).values
+    for coluna, valor in selecao.items():
+        mascara &= (ocupacao[coluna] == valor).values
+    return ocupacao[mascara]
+
+def mostrar_ocupacao(ocupacao):
+    """Linha minuto a minuto dos gates atendendo ao mesmo tempo no dia selecionado"""
+    if ocupacao.empty or ocupacao['gates_simultaneos'].max() == 0:
+        st.info("Sem atendimentos com início e fim registrados neste dia.")
+        return
     
-    return metricas_hora, df_filtrado, detalhes_gates
+    pico = ocupacao.loc[ocupacao['gates_simultaneos'].idxmax()]
+    ativos = ocupacao[ocupacao['gates_media'] > 0]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pico de Gates Simultâneos", int(pico['gates_simultaneos']))
+    col2.metric("Horário do Pico", pico['horario'].strftime('%H:%M'))
+    col3.metric("Média com Atendimento", f"{ativos['gates_media'].mean():.1f}")
+    
+    cores_tema = obter_cores_tema()
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        name='Pico no minuto',
+        x=ocupacao['horario'],
+        y=ocupacao['gates_simultaneos'],
+        mode='lines',
+        line=dict(color=cores_tema['primaria'], width=1.5, shape='hv')
+    ))
+    fig.add_trace(go.Scatter(
+        name='Média no minuto',
+        x=ocupacao['horario'],
+        y=ocupacao['gates_media'].round(2),
+        mode='lines',
+        line=dict(color=cores_tema['secundaria'], width=1),
+        fill='tozeroy'
+    ))
+    fig.update_layout(
+        height=350,
+        xaxis_title="Horário",
+        yaxis_title="Gates em atendimento",
+        xaxis=dict(tickformat='%H:%M', gridcolor=cores_tema['grid']),
+        yaxis=dict(gridcolor=cores_tema['grid'], rangemode='tozero'),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor=cores_tema['fundo'],
+        margin=dict(t=30, b=40, l=40, r=40),
+        legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1}
+    )
+    st.plotly_chart(fig, use_container_width=True, key="ocupacao_chart")
 
-def criar_grafico_gates(metricas_hora, cliente=None):
-    """Cria gráfico de barras para análise de gates ativos"""
+def criar_grafico_gates(metricas_hora, cliente=None, ocupacao_hora=None):
+    """Cria gráfico de barras para análise de gates ativos, com o pico de gates simultâneos se houver"""
     cores_tema = obter_cores_tema()
     fig = go.Figure()
     
@@ -155,6 +150,19 @@ def criar_grafico_gates(metricas_hora, cliente=None):
         )
     )
     
+    # Pico de gates atendendo ao mesmo tempo na hora, na mesma escala das barras
+    if ocupacao_hora is not None:
+        fig.add_trace(
+            go.Scatter(
+                name='Pico de Gates Simultâneos',
+                x=ocupacao_hora['hora'],
+                y=ocupacao_hora['gates_simultaneos'],
+                mode='lines+markers',
+                line=dict(color='#e67700', width=2, dash='dot'),
+                marker=dict(size=7)
+            )
+        )
+    
     # Adicionar linha de média de atendimentos por gate
     fig.add_trace(
         go.Scatter(
@@ -372,9 +380,98 @@ def criar_relogio_interativo(horas_ativas, hora_selecionada=None):
         return int(hora_sel.split(":")[0])
     return None
 
-def gerar_insights_gates(metricas, data_selecionada=None, cliente=None, operacao=None):
+def criar_timeline_gates(hora, detalhes, atends):
+    """Linha do tempo da hora por gate com uma série para atendimentos e outra para intervalos
+
+    `atends` são os atendimentos da hora ordenados por gate e início; as barras de cada série são
+    montadas em vetores, então o número de traces não cresce com o volume de senhas.
+    """
+    cor_primaria = obter_cores_tema()['primaria']
+    fig = go.Figure()
+    
+    # Barra de fundo (60 minutos)
+    fig.add_trace(go.Bar(
+        x=detalhes['gate'],
+        y=[60] * len(detalhes),  # 60 minutos
+        marker_color='rgba(128, 128, 128, 0.2)',
+        name='Hora Total',
+        hoverinfo='skip'
+    ))
+
+    # Calcular minutos dentro da hora para início e fim
+    minuto_inicio = detalhes['inicio'].dt.minute
+    minuto_fim = detalhes['fim'].dt.minute
+    
+    # Ajustar casos onde fim é na próxima hora
+    minuto_fim = minuto_fim.where(minuto_fim >= minuto_inicio, 60)
+    
+    # Barra de tempo ativo (período real)
+    fig.add_trace(go.Bar(
+        x=detalhes['gate'],
+        y=minuto_fim - minuto_inicio,
+        base=minuto_inicio,
+        marker_color=cor_primaria,
+        name='Período Ativo',
+        hovertemplate='Horário: %{base:.0f}-%{y:.0f}min<br>Duração: %{y:.1f}min<extra></extra>'
+    ))
+
+    # Minutos (com segundos) desde o início da hora; atendimentos que passam da hora terminam em 60
+    inicio_hora = atends['inicio'].dt.floor('h')
+    inicio_min = ((atends['inicio'] - inicio_hora).dt.total_seconds() / 60).values
+    fim_min = np.clip(((atends['fim'] - inicio_hora).dt.total_seconds() / 60).values, None, 60)
+    gates = atends['guichê'].values
+    
+    # Série dos atendimentos (azul)
+    fig.add_trace(go.Bar(
+        x=gates,
+        y=fim_min - inicio_min,
+        base=inicio_min,
+        marker_color=cor_primaria,
+        name='Atendimento',
+        showlegend=False,
+        customdata=np.column_stack([
+            atends['inicio'].dt.strftime('%H:%M').values,
+            atends['fim'].dt.strftime('%H:%M').fillna('--:--').values
+        ]),
+        hovertemplate='Horário: %{customdata[0]}-%{customdata[1]}<br>Duração: %{y:.1f}min<extra></extra>'
+    ))
+    
+    # Série dos intervalos (escura): do fim de cada atendimento ao início do seguinte no mesmo gate
+    seguinte = np.r_[gates[1:] == gates[:-1], False] if len(gates) else np.array([], dtype=bool)
+    intervalo = np.r_[inicio_min[1:], np.nan][:len(gates)] - fim_min
+    validos = seguinte & (intervalo > 0)
+    fig.add_trace(go.Bar(
+        x=gates[validos],
+        y=intervalo[validos],
+        base=fim_min[validos],
+        marker_color='rgba(0,0,0,0.1)',
+        name='Intervalo',
+        showlegend=False,
+        hovertemplate='Intervalo: %{y:.1f}min<extra></extra>'
+    ))
+
+    fig.update_layout(
+        barmode='overlay',
+        title={'text': ''},
+        margin=dict(t=0, b=20, l=40, r=40),
+        xaxis_title='Gate',
+        yaxis_title='Minutos',
+        height=400,
+        xaxis={'tickfont': {'size': 14}},
+        yaxis={
+            'tickfont': {'size': 14},
+            'range': [0, 65],
+            'tickmode': 'array',
+            'tickvals': [0, 15, 30, 45, 60],
+            'ticktext': ['0', '15', '30', '45', '60']
+        }
+    )
+    
+    return fig
+
+def gerar_insights_gates(metricas, dados, data_selecionada=None, cliente=None, operacao=None):
     """Gera insights sobre o uso dos gates"""
-    metricas_df, df_base, detalhes_gates = metricas
+    metricas_df, (inicio, fim, filtros_base), atividade = metricas
     
     if 'hora_selecionada' not in st.session_state:
         st.session_state.hora_selecionada = None
@@ -390,7 +487,7 @@ def gerar_insights_gates(metricas, data_selecionada=None, cliente=None, operacao
     """, unsafe_allow_html=True)
     
     # Criação do seletor de hora - Removida a divisão em colunas para ocupar toda largura
-    horas_disponiveis = [hora for hora in range(24) if not detalhes_gates[hora].empty]
+    horas_disponiveis = [int(hora) for hora in atividade['hora'].unique()]
     if not horas_disponiveis:
         st.warning("Não há dados disponíveis para análise")
         return
@@ -420,8 +517,12 @@ def gerar_insights_gates(metricas, data_selecionada=None, cliente=None, operacao
 
     # Se tiver uma hora selecionada, mostrar análise detalhada
     if hora is not None:
-        detalhes = detalhes_gates[hora]
+        detalhes = atividade[atividade['hora'] == hora].drop(columns='hora').reset_index(drop=True)
         if not detalhes.empty:
+            # Atendimentos da hora com gate, ordenados por gate e início
+            df_hora = obter_linhas_hora(dados, inicio, fim, hora, 'inicio', filtros_base)
+            atends = df_hora[df_hora['guichê'].notna()].sort_values(['guichê', 'inicio'], kind='stable')
+            
             st.markdown(f"""
             <div style='background-color: #1a5fb4; padding: 1rem; border-radius: 10px; margin: 1rem 0; color: white;'>
                 <h3 style="margin: 0; color: white;">📊 Análise Detalhada - {hora:02d}:00h</h3>
@@ -436,30 +537,17 @@ def gerar_insights_gates(metricas, data_selecionada=None, cliente=None, operacao
             # Formatação da tabela
             df_display = detalhes[cols].copy()
             
-            # Adicionar colunas de períodos de atendimento
-            periodos_atendimento = {}
-            for gate in detalhes['gate']:
-                mask_gate = (df_base['guichê'] == gate) & (df_base['inicio'].dt.hour == hora)
-                atends = df_base[mask_gate].sort_values('inicio')
-                
-                # Criar lista de períodos para cada atendimento
-                periodos = []
-                for _, atend in atends.iterrows():
-                    inicio = f"{hora:02d}:{atend['inicio'].minute:02d}"
-                    fim = f"{hora:02d}:{atend['fim'].minute:02d}"
-                    periodos.append(f"{inicio}-{fim}")
-                
-                # Preencher dicionário com os períodos
-                periodos_atendimento[gate] = periodos
-            
-            # Encontrar o máximo de atendimentos para criar as colunas
-            max_atends = max(len(p) for p in periodos_atendimento.values())
-            
-            # Adicionar colunas de período ao DataFrame
-            for i in range(max_atends):
-                df_display[f'Atendimento {i+1}'] = df_display['gate'].map(
-                    lambda x: periodos_atendimento[x][i] if i < len(periodos_atendimento[x]) else '-'
-                )
+            # Períodos de atendimento de cada gate, em ordem de início, como colunas Atendimento 1..N
+            rotulos = (
+                f"{hora:02d}:" + atends['inicio'].dt.strftime('%M') + '-' +
+                f"{hora:02d}:" + atends['fim'].dt.strftime('%M').fillna('--')
+            )
+            periodos = pd.Series(
+                rotulos.values, index=[atends['guichê'].values, atends.groupby('guichê').cumcount().values]
+            ).unstack().reindex(detalhes['gate'].values).fillna('-')
+            max_atends = periodos.shape[1]
+            periodos.columns = [f'Atendimento {i+1}' for i in range(max_atends)]
+            df_display = pd.concat([df_display, periodos.set_axis(df_display.index)], axis=1)
             
             # Renomear e reorganizar colunas
             colunas_base = ['Gate', 'Atendente', 'Atendimentos', 'Contribuição (%)', 
@@ -482,97 +570,7 @@ def gerar_insights_gates(metricas, data_selecionada=None, cliente=None, operacao
             
             # Título seção de contribuição e gráfico
             st.markdown("### 📊 Contribuição por Gate (%)")
-            fig = go.Figure()
-            
-            # Barra de fundo (60 minutos)
-            fig.add_trace(go.Bar(
-                x=detalhes['gate'],
-                y=[60] * len(detalhes),  # 60 minutos
-                marker_color='rgba(128, 128, 128, 0.2)',
-                name='Hora Total',
-                hoverinfo='skip'
-            ))
-
-            # Calcular minutos dentro da hora para início e fim
-            minuto_inicio = detalhes['inicio'].dt.minute
-            minuto_fim = detalhes['fim'].dt.minute
-            
-            # Ajustar casos onde fim é na próxima hora
-            minuto_fim = minuto_fim.where(minuto_fim >= minuto_inicio, 60)
-            
-            # Criar rótulos com horários
-            rotulos = [
-                f"{hora:02d}:{inicio:02d}-{hora:02d}:{fim:02d}"
-                for inicio, fim in zip(minuto_inicio, minuto_fim)
-            ]
-            
-            # Barra de tempo ativo (período real)
-            fig.add_trace(go.Bar(
-                x=detalhes['gate'],
-                y=minuto_fim - minuto_inicio,
-                base=minuto_inicio,
-                marker_color=obter_cores_tema()['primaria'],
-                name='Período Ativo',
-                hovertemplate='Horário: %{base:.0f}-%{y:.0f}min<br>Duração: %{y:.1f}min<extra></extra>'
-            ))
-
-            # Criar visualização detalhada dos atendimentos
-            for idx, gate in enumerate(detalhes['gate']):
-                # Filtrar atendimentos do gate na hora específica
-                mask_gate = (df_base['guichê'] == gate) & (df_base['inicio'].dt.hour == hora)
-                atendimentos_gate = df_base[mask_gate].sort_values('inicio')
-                
-                if not atendimentos_gate.empty:
-                    # Para cada atendimento, criar uma barra
-                    for _, atend in atendimentos_gate.iterrows():
-                        inicio_min = atend['inicio'].minute + (atend['inicio'].second / 60)
-                        fim_min = atend['fim'].minute + (atend['fim'].second / 60)
-                        
-                        # Barra do atendimento (azul)
-                        fig.add_trace(go.Bar(
-                            x=[gate],
-                            y=[fim_min - inicio_min],
-                            base=[inicio_min],
-                            marker_color=obter_cores_tema()['primaria'],
-                            name='Atendimento',
-                            showlegend=False,
-                            hovertemplate=(
-                                f'Horário: {hora:02d}:{int(inicio_min):02d}-{hora:02d}:{int(fim_min):02d}<br>'
-                                f'Duração: {fim_min - inicio_min:.1f}min<extra></extra>'
-                            )
-                        ))
-                        
-                        # Se houver próximo atendimento, adicionar intervalo
-                        if _ < len(atendimentos_gate) - 1:
-                            proximo_inicio = atendimentos_gate.iloc[_ + 1]['inicio'].minute + (atendimentos_gate.iloc[_ + 1]['inicio'].second / 60)
-                            # Barra do intervalo (escura)
-                            fig.add_trace(go.Bar(
-                                x=[gate],
-                                y=[proximo_inicio - fim_min],
-                                base=[fim_min],
-                                marker_color='rgba(0,0,0,0.1)',
-                                name='Intervalo',
-                                showlegend=False,
-                                hovertemplate='Intervalo: %{y:.1f}min<extra></extra>'
-                            ))
-
-            fig.update_layout(
-                barmode='overlay',
-                title={'text': ''},
-                margin=dict(t=0, b=20, l=40, r=40),
-                xaxis_title='Gate',
-                yaxis_title='Minutos',
-                height=400,
-                xaxis={'tickfont': {'size': 14}},
-                yaxis={
-                    'tickfont': {'size': 14},
-                    'range': [0, 65],
-                    'tickmode': 'array',
-                    'tickvals': [0, 15, 30, 45, 60],
-                    'ticktext': ['0', '15', '30', '45', '60']
-                }
-            )
-            
+            fig = criar_timeline_gates(hora, detalhes, atends)
             st.plotly_chart(fig, use_container_width=True)
             
             # Título seção de desempenho (mantido mas com estilo consistente)
@@ -661,13 +659,18 @@ def mostrar_aba(dados, filtros):
 
     try:
         st.session_state['tema_atual'] = detectar_tema()
-        
-        df = dados['base']
-        mask_periodo = (
-            (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-            (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-        )
-        datas_disponiveis = sorted(df[mask_periodo]['retirada'].dt.date.unique())
+        mostrar_secao_gates(dados, filtros)
+    
+    except Exception as e:
+        st.error("Erro ao gerar a aba de Gates em Atividade/Hora")
+        st.exception(e)
+
+@fragmento
+def mostrar_secao_gates(dados, filtros):
+    """Seletores, gráfico e detalhamento dos gates, reexecutados isoladamente a cada interação"""
+    try:
+        df_periodo = obter_visao_periodo(dados, filtros['periodo2']['inicio'], filtros['periodo2']['fim'])
+        datas_disponiveis = sorted(df_periodo['retirada'].dt.date.unique())
         
         if len(datas_disponiveis) == 0:
             st.warning("Não existem dados para o período selecionado.")
@@ -685,7 +688,7 @@ def mostrar_aba(dados, filtros):
         
         if tipo_analise == "Por Cliente":
             # Convert CLIENTE values to strings before sorting
-            clientes = sorted(dados['base']['CLIENTE'].astype(str).unique())
+            clientes = list(obter_opcoes_coluna(dados, 'CLIENTE'))
             cliente_selecionado = st.selectbox(
                 "Selecione o Cliente:",
                 clientes,
@@ -702,11 +705,13 @@ def mostrar_aba(dados, filtros):
             metricas = calcular_gates_hora(dados, filtros, 
                                          cliente=cliente_selecionado, 
                                          data_especifica=data_especifica)
-            fig = criar_grafico_gates(metricas[0], cliente_selecionado)
+            ocupacao = calcular_ocupacao_dia(dados, filtros, data_especifica, cliente=cliente_selecionado)
+            fig = criar_grafico_gates(metricas[0], cliente_selecionado, resumir_ocupacao_hora(ocupacao))
             
         elif tipo_analise == "Por Operação":
             # Converter operações para string antes de ordenar
-            operacoes = sorted(dados['base']['OPERAÇÃO'].astype(str).unique())
+            opcoes_operacao = obter_opcoes_coluna(dados, 'OPERAÇÃO')
+            operacoes = list(opcoes_operacao)
             operacao_selecionada = st.selectbox(
                 "Selecione a Operação:",
                 operacoes,
@@ -721,13 +726,13 @@ def mostrar_aba(dados, filtros):
             data_especifica = datas_dict[data_formatada]
             
             # Correção: Obter a operação original corretamente
-            mask_operacao = dados['base']['OPERAÇÃO'].astype(str) == operacao_selecionada
-            operacao_original = dados['base'].loc[mask_operacao, 'OPERAÇÃO'].iloc[0]
+            operacao_original = opcoes_operacao[operacao_selecionada]
             
             metricas = calcular_gates_hora(dados, filtros, 
                                          operacao=operacao_original, 
                                          data_especifica=data_especifica)
-            fig = criar_grafico_gates(metricas[0], operacao_selecionada)
+            ocupacao = calcular_ocupacao_dia(dados, filtros, data_especifica, operacao=operacao_original)
+            fig = criar_grafico_gates(metricas[0], operacao_selecionada, resumir_ocupacao_hora(ocupacao))
     
         else:
             data_formatada = st.selectbox(
@@ -738,14 +743,18 @@ def mostrar_aba(dados, filtros):
             data_especifica = datas_dict[data_formatada]
             
             metricas = calcular_gates_hora(dados, filtros, data_especifica=data_especifica)
-            fig = criar_grafico_gates(metricas[0])
+            ocupacao = calcular_ocupacao_dia(dados, filtros, data_especifica)
+            fig = criar_grafico_gates(metricas[0], ocupacao_hora=resumir_ocupacao_hora(ocupacao))
         
         st.plotly_chart(fig, use_container_width=True, key="main_chart")
         
+        st.subheader("⏱️ Gates em Atendimento Simultâneo")
+        mostrar_ocupacao(ocupacao)
+        
         st.markdown("---")
         st.subheader("📈 Análise Detalhada")
         with st.expander("Ver análise completa", expanded=True):
-            gerar_insights_gates(metricas, data_especifica, 
+            gerar_insights_gates(metricas, dados, data_especifica, 
                                cliente_selecionado if tipo_analise == "Por Cliente" else None,
                                operacao_selecionada if tipo_analise == "Por Operação" else None)
     
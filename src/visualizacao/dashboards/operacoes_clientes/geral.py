@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from visualizacao.otimizacao import obter_linha_base
 
 def formatar_tempo(minutos):
     """Formata o tempo de minutos para o formato hh:mm min ou mm:ss min"""
@@ -219,6 +220,106 @@ def criar_grafico_top_clientes(dados, filtros):
     
     return fig
 
+# Medidas disponíveis na linha de base: nome exibido -> (medida, unidade)
+MEDIDAS_LINHA_BASE = {
+    'Atendimentos': ('quantidade', 'atendimentos'),
+    'Tempo de Atendimento': ('tpatend', 'min'),
+    'Tempo de Espera': ('tpesper', 'min'),
+    'Tempo de Permanência': ('tempo_permanencia', 'min')
+}
+
+def criar_grafico_linha_base(linha_base, nome_medida, por_hora):
+    """Valor do período contra a mediana das semanas anteriores e o ano anterior"""
+    if por_hora:
+        # Desvio robusto por dia e hora: cores fortes são horas fora do padrão do dia da semana
+        mapa = linha_base.pivot(index='hora', columns='data', values='z_robusto')
+        fig = go.Figure(go.Heatmap(
+            z=mapa.values,
+            x=mapa.columns,
+            y=mapa.index,
+            colorscale='RdBu_r',
+            zmid=0,
+            zmin=-4,
+            zmax=4,
+            colorbar={'title': 'Desvio (z)'},
+            hovertemplate='%{x|%d/%m/%Y} %{y}h<br>Desvio: %{z:.1f}<extra></extra>'
+        ))
+        fig.update_layout(
+            title=f'{nome_medida}: desvio por hora contra o mesmo dia da semana',
+            xaxis_title='Data',
+            yaxis_title='Hora'
+        )
+        return fig
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=linha_base['data'], y=linha_base['valor'],
+        name='Período 2', mode='lines+markers'
+    ))
+    fig.add_trace(go.Scatter(
+        x=linha_base['data'], y=linha_base['mediana_semanas'],
+        name='Mediana do mesmo dia da semana', mode='lines', line={'dash': 'dash'}
+    ))
+    fig.add_trace(go.Scatter(
+        x=linha_base['data'], y=linha_base['valor_ano_anterior'],
+        name='Mesma data no ano anterior', mode='lines', line={'dash': 'dot'}
+    ))
+    fig.update_layout(
+        title=f'{nome_medida}: período contra a linha de base',
+        xaxis_title='Data',
+        yaxis_title=nome_medida,
+        legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1}
+    )
+    return fig
+
+def mostrar_linha_base(dados, filtros):
+    """Seção de linha de base: mesmo dia da semana nas semanas anteriores e mesma data do ano anterior"""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        nome_medida = st.selectbox("Medida", list(MEDIDAS_LINHA_BASE), key="linha_base_medida")
+    with col2:
+        semanas = st.slider("Semanas anteriores", min_value=1, max_value=12, value=4, key="linha_base_semanas")
+    with col3:
+        granularidade = st.radio("Granularidade", ["Dia", "Hora"], horizontal=True, key="linha_base_granularidade")
+
+    medida, unidade = MEDIDAS_LINHA_BASE[nome_medida]
+    por_hora = granularidade == "Hora"
+    linha_base = obter_linha_base(dados, filtros, medida, semanas, por_hora)
+    if linha_base['valor'].isna().all():
+        st.info("Sem dados no Período 2 para calcular a linha de base.")
+        return
+
+    st.plotly_chart(
+        criar_grafico_linha_base(linha_base, nome_medida, por_hora),
+        use_container_width=True,
+        key=f"grafico_linha_base_{medida}_{granularidade}"
+    )
+
+    # Maiores desvios (|z| >= 2) contra o padrão do mesmo dia da semana
+    fora_padrao = linha_base[linha_base['z_robusto'].abs() >= 2]
+    if fora_padrao.empty:
+        st.success(f"Nenhum {'horário' if por_hora else 'dia'} fora do padrão das últimas {semanas} semanas.")
+        return
+
+    colunas = ['data', 'hora'] if por_hora else ['data']
+    tabela = fora_padrao.reindex(fora_padrao['z_robusto'].abs().sort_values(ascending=False).index)
+    st.markdown(f"**{'Horários' if por_hora else 'Dias'} fora do padrão** ({unidade})")
+    st.dataframe(
+        tabela[colunas + ['valor', 'mediana_semanas', 'desvio_pct', 'z_robusto', 'valor_ano_anterior', 'variacao_ano']],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'data': st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+            'hora': st.column_config.NumberColumn("Hora", format="%dh"),
+            'valor': st.column_config.NumberColumn("Valor", format="%.1f"),
+            'mediana_semanas': st.column_config.NumberColumn("Mediana semanas", format="%.1f"),
+            'desvio_pct': st.column_config.NumberColumn("Desvio (%)", format="%+.1f%%"),
+            'z_robusto': st.column_config.NumberColumn("Desvio (z)", format="%+.1f"),
+            'valor_ano_anterior': st.column_config.NumberColumn("Ano anterior", format="%.1f"),
+            'variacao_ano': st.column_config.NumberColumn("Var. ano (%)", format="%+.1f%%")
+        }
+    )
+
 def gerar_insights_gerais(dados, filtros, metricas):
     """Gera insights sobre as operações gerais"""
     df = dados['base']
@@ -481,8 +582,8 @@ def mostrar_aba(dados, filtros):
             st.warning("Dados não disponíveis ou vazios.")
             return
         
-        # Criar cópia dos dados para evitar modificações indesejadas
-        df = dados['base'].copy()
+        # Só leitura: as máscaras abaixo não alteram a base
+        df = dados['base']
         
         # Inicializar máscara como True para todos os registros
         mask = pd.Series(True, index=df.index)
@@ -510,7 +611,7 @@ def mostrar_aba(dados, filtros):
             mask &= turno_mask
         
         # Aplicar máscara final
-        df_filtrado = df[mask].copy()
+        df_filtrado = df[mask]
         
         # Continuar apenas se houver dados
         if df_filtrado.empty:
@@ -565,6 +666,11 @@ def mostrar_aba(dados, filtros):
             fig_clientes = criar_grafico_top_clientes(dados_filtrados, filtros)
             st.plotly_chart(fig_clientes, use_container_width=True)
         
+        # Linha de base a partir dos consolidados diários (base completa, não só o recorte da aba)
+        st.markdown("---")
+        st.subheader("📅 Linha de Base")
+        mostrar_linha_base(dados, filtros)
+        
         # Insights
         st.markdown("---")
         st.subheader("📈 Análise Detalhada")
@@ -4,6 +4,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import json
+from visualizacao.otimizacao import obter_agregado, obter_tabela_metrica
+from visualizacao.tendencia import escolher_modo, mostrar_tendencia
 
 def formatar_data(data):
     """Formata a data para o padrão dd/mm/aaaa"""
@@ -11,8 +13,8 @@ def formatar_data(data):
         return data.strftime('%d/%m/%Y')
     return data
 
-def calcular_movimentacao_por_periodo(dados, filtros, periodo):
-    """Calcula a movimentação de cada cliente no período especificado"""
+def calcular_movimentacao_comparativa(dados, filtros):
+    """Calcula a movimentação de cada cliente nos dois períodos numa única agregação"""
     df = dados['base']
     
     # Validação inicial dos dados
@@ -20,69 +22,49 @@ def calcular_movimentacao_por_periodo(dados, filtros, periodo):
         st.warning("DataFrame está vazio")
         return pd.DataFrame()
     
+    # Consultas respondidas pelos consolidados diários (uma linha por célula, não por senha)
+    consolidado = obter_agregado(dados, [])
+    
     # Identificar período disponível nos dados
-    data_mais_antiga = df['retirada'].dt.date.min()
-    data_mais_recente = df['retirada'].dt.date.max()
+    data_mais_antiga = consolidado['data'].min().date()
+    data_mais_recente = consolidado['data'].max().date()
     
     # Validar se as datas estão dentro do período disponível
-    if (filtros[periodo]['inicio'] < data_mais_antiga or 
-        filtros[periodo]['fim'] > data_mais_recente):
-        st.error(f"""
-            ⚠️ Período selecionado fora do intervalo disponível!
+    for periodo in ['periodo1', 'periodo2']:
+        if (filtros[periodo]['inicio'] < data_mais_antiga or 
+            filtros[periodo]['fim'] > data_mais_recente):
+            st.error(f"""
+                ⚠️ Período selecionado fora do intervalo disponível!
             
-            Período disponível na base de dados:
-            • De: {data_mais_antiga.strftime('%d/%m/%Y')}
-            • Até: {data_mais_recente.strftime('%d/%m/%Y')}
+                Período disponível na base de dados:
+                • De: {data_mais_antiga.strftime('%d/%m/%Y')}
+                • Até: {data_mais_recente.strftime('%d/%m/%Y')}
             
-            Período selecionado:
-            • De: {filtros[periodo]['inicio'].strftime('%d/%m/%Y')}
-            • Até: {filtros[periodo]['fim'].strftime('%d/%m/%Y')}
+                Período selecionado:
+                • De: {filtros[periodo]['inicio'].strftime('%d/%m/%Y')}
+                • Até: {filtros[periodo]['fim'].strftime('%d/%m/%Y')}
             
-            Por favor, selecione datas dentro do período disponível.
-        """)
-        return pd.DataFrame()
-    
-    # Criar uma cópia do DataFrame para não modificar o original
-    df_filtrado = df.copy()
-    
-    # Converter datas para datetime se necessário
-    if not pd.api.types.is_datetime64_any_dtype(df_filtrado['retirada']):
-        df_filtrado['retirada'] = pd.to_datetime(df_filtrado['retirada'])
-    
-    # Aplicar filtros de data
-    mask_data = (
-        (df_filtrado['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df_filtrado['retirada'].dt.date <= filtros[periodo]['fim'])
-    )
-    df_filtrado = df_filtrado[mask_data]
+                Por favor, selecione datas dentro do período disponível.
+            """)
+            return pd.DataFrame()
     
-    # Aplicar filtros adicionais
-    if filtros['operacao'] != ['Todas']:
-        df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
-        
-    if filtros['turno'] != ['Todos']:
-        def get_turno(hour):
-            if 7 <= hour < 15:
-                return 'TURNO A'
-            elif 15 <= hour < 23:
-                return 'TURNO B'
-            else:
-                return 'TURNO C'
-        df_filtrado = df_filtrado[df_filtrado['retirada'].dt.hour.apply(get_turno).isin(filtros['turno'])]
-        
-    if filtros['cliente'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'].isin(filtros['cliente'])]
+    # Quantidade por cliente nos dois períodos, servida pelo motor de métricas
+    tabela = obter_tabela_metrica(dados, filtros, 'CLIENTE', 'quantidade')
     
-    # Se não houver dados após os filtros
-    if len(df_filtrado) == 0:
+    # Se algum período ficar sem dados após os filtros
+    if tabela.empty:
         st.warning("Nenhum registro encontrado com os filtros selecionados")
         return pd.DataFrame()
     
-    # Agrupar por cliente
-    movimentacao = df_filtrado.groupby('CLIENTE')['id'].count().reset_index()
-    movimentacao.columns = ['cliente', 'quantidade']
+    df_comp = pd.DataFrame({
+        'cliente': tabela['CLIENTE'],
+        'quantidade_p1': tabela['valor_p1'],
+        'quantidade_p2': tabela['valor_p2']
+    })
+    df_comp['total'] = df_comp['quantidade_p1'] + df_comp['quantidade_p2']
+    df_comp['variacao'] = tabela['variacao']
     
-    return movimentacao
+    return df_comp
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -109,21 +91,8 @@ def obter_cores_tema():
         'erro': '#ff6b6b' if is_dark else '#ff5757'          # Vermelho
     }
 
-def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
+def criar_grafico_comparativo(df_comp, filtros):
     try:
-        # Merge e prepara dados
-        df_comp = pd.merge(
-            dados_p1, 
-            dados_p2, 
-            on='cliente', 
-            suffixes=('_p1', '_p2')
-        )
-        
-        # Calcula total e variação percentual
-        df_comp['total'] = df_comp['quantidade_p1'] + df_comp['quantidade_p2']
-        df_comp['variacao'] = ((df_comp['quantidade_p2'] - df_comp['quantidade_p1']) / 
-                              df_comp['quantidade_p1'] * 100)
-        
         # Ordena por total decrescente (maiores volumes no topo)
         df_comp = df_comp.sort_values('total', ascending=True)  # ascending=True pois o eixo y é invertido
         
@@ -256,17 +225,8 @@ def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
         st.error(f"Erro ao criar gráfico: {str(e)}")
         return None
 
-def gerar_insights_cliente(mov_p1, mov_p2):
+def gerar_insights_cliente(df_comp):
     """Gera insights sobre a movimentação dos clientes"""
-    # Merge dos dados
-    df_comp = pd.merge(
-        mov_p1, mov_p2,
-        on='cliente',
-        suffixes=('_p1', '_p2')
-    )
-    df_comp['variacao'] = ((df_comp['quantidade_p2'] - df_comp['quantidade_p1']) / df_comp['quantidade_p1'] * 100)
-    df_comp['total'] = df_comp['quantidade_p1'] + df_comp['quantidade_p2']
-
     # Cálculos principais
     total_p1 = df_comp['quantidade_p1'].sum()
     total_p2 = df_comp['quantidade_p2'].sum()
@@ -400,14 +360,18 @@ def mostrar_aba(dados, filtros):
     try:
         st.session_state['tema_atual'] = detectar_tema()
         
-        mov_p1 = calcular_movimentacao_por_periodo(dados, filtros, 'periodo1')
-        mov_p2 = calcular_movimentacao_por_periodo(dados, filtros, 'periodo2')
+        if escolher_modo("modo_mov_cliente"):
+            mostrar_tendencia(dados, filtros, 'CLIENTE', 'quantidade', 'Atendimentos', "mov_cliente")
+            return
+        
+        # Calcula a movimentação dos dois períodos lado a lado
+        df_comp = calcular_movimentacao_comparativa(dados, filtros)
         
-        if mov_p1.empty or mov_p2.empty:
+        if df_comp.empty:
             st.warning("Não há dados para exibir no período selecionado.")
             return
         
-        fig = criar_grafico_comparativo(mov_p1, mov_p2, filtros)
+        fig = criar_grafico_comparativo(df_comp, filtros)
         if fig:
             st.plotly_chart(
                 fig, 
@@ -419,7 +383,7 @@ def mostrar_aba(dados, filtros):
         st.markdown("---")
         st.subheader("📈 Análise Detalhada")
         with st.expander("Ver análise detalhada", expanded=True):
-            gerar_insights_cliente(mov_p1, mov_p2)
+            gerar_insights_cliente(df_comp)
     
     except Exception as e:
         st.error(f"Erro ao mostrar aba: {str(e)}")
@@ -4,6 +4,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import json
+from visualizacao.otimizacao import obter_agregado, obter_tabela_metrica
+from visualizacao.tendencia import escolher_modo, mostrar_tendencia
 
 def formatar_data(data):
     """Formata a data para o padrão dd/mm/aaaa"""
@@ -11,8 +13,8 @@ def formatar_data(data):
         return data.strftime('%d/%m/%Y')
     return data
 
-def calcular_movimentacao_por_periodo(dados, filtros, periodo):
-    """Calcula a movimentação de cada operação no período especificado"""
+def calcular_movimentacao_comparativa(dados, filtros):
+    """Calcula a movimentação de cada operação nos dois períodos numa única agregação"""
     df = dados['base']
     
     # Validação inicial dos dados
@@ -20,62 +22,49 @@ def calcular_movimentacao_por_periodo(dados, filtros, periodo):
         st.warning("Base de dados está vazia")
         return pd.DataFrame()
     
+    # Consultas respondidas pelos consolidados diários (uma linha por célula, não por senha)
+    consolidado = obter_agregado(dados, [])
+    
     # Identificar período disponível nos dados
-    data_mais_antiga = df['retirada'].dt.date.min()
-    data_mais_recente = df['retirada'].dt.date.max()
+    data_mais_antiga = consolidado['data'].min().date()
+    data_mais_recente = consolidado['data'].max().date()
     
     # Validar se as datas estão dentro do período disponível
-    if (filtros[periodo]['inicio'] < data_mais_antiga or 
-        filtros[periodo]['fim'] > data_mais_recente):
-        st.error(f"""
-            ⚠️ Período selecionado fora do intervalo disponível!
+    for periodo in ['periodo1', 'periodo2']:
+        if (filtros[periodo]['inicio'] < data_mais_antiga or 
+            filtros[periodo]['fim'] > data_mais_recente):
+            st.error(f"""
+                ⚠️ Período selecionado fora do intervalo disponível!
             
-            Período disponível na base de dados:
-            • De: {data_mais_antiga.strftime('%d/%m/%Y')}
-            • Até: {data_mais_recente.strftime('%d/%m/%Y')}
+                Período disponível na base de dados:
+                • De: {data_mais_antiga.strftime('%d/%m/%Y')}
+                • Até: {data_mais_recente.strftime('%d/%m/%Y')}
             
-            Período selecionado:
-            • De: {filtros[periodo]['inicio'].strftime('%d/%m/%Y')}
-            • Até: {filtros[periodo]['fim'].strftime('%d/%m/%Y')}
+                Período selecionado:
+                • De: {filtros[periodo]['inicio'].strftime('%d/%m/%Y')}
+                • Até: {filtros[periodo]['fim'].strftime('%d/%m/%Y')}
             
-            Por favor, selecione datas dentro do período disponível.
-        """)
-        return pd.DataFrame()
-    
-    # Aplicar filtros de data
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo]['fim'])
-    )
-    df_filtrado = df[mask]
+                Por favor, selecione datas dentro do período disponível.
+            """)
+            return pd.DataFrame()
     
-    # Aplicar filtros adicionais
-    if filtros['cliente'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'].isin(filtros['cliente'])]
-        
-    if filtros['turno'] != ['Todos']:
-        def get_turno(hour):
-            if 7 <= hour < 15:
-                return 'TURNO A'
-            elif 15 <= hour < 23:
-                return 'TURNO B'
-            else:
-                return 'TURNO C'
-        df_filtrado = df_filtrado[df_filtrado['retirada'].dt.hour.apply(get_turno).isin(filtros['turno'])]
-        
-    if filtros['operacao'] != ['Todas']:
-        df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
+    # Quantidade por operação nos dois períodos, servida pelo motor de métricas
+    tabela = obter_tabela_metrica(dados, filtros, 'OPERAÇÃO', 'quantidade')
     
-    # Se não houver dados após os filtros
-    if len(df_filtrado) == 0:
+    # Se algum período ficar sem dados após os filtros
+    if tabela.empty:
         st.warning("Nenhum registro encontrado com os filtros selecionados")
         return pd.DataFrame()
     
-    # Agrupar por operação
-    movimentacao = df_filtrado.groupby('OPERAÇÃO')['id'].count().reset_index()
-    movimentacao.columns = ['operacao', 'quantidade']
+    df_comp = pd.DataFrame({
+        'operacao': tabela['OPERAÇÃO'],
+        'quantidade_p1': tabela['valor_p1'],
+        'quantidade_p2': tabela['valor_p2']
+    })
+    df_comp['total'] = df_comp['quantidade_p1'] + df_comp['quantidade_p2']
+    df_comp['variacao'] = tabela['variacao']
     
-    return movimentacao
+    return df_comp
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -102,21 +91,8 @@ def obter_cores_tema():
         'erro': '#ff6b6b' if is_dark else '#ff5757'          # Vermelho
     }
 
-def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
+def criar_grafico_comparativo(df_comp, filtros):
     try:
-        # Merge e prepara dados
-        df_comp = pd.merge(
-            dados_p1, 
-            dados_p2, 
-            on='operacao',  # Usando operacao ao invés de cliente
-            suffixes=('_p1', '_p2')
-        )
-        
-        # Calcula total e variação percentual
-        df_comp['total'] = df_comp['quantidade_p1'] + df_comp['quantidade_p2']
-        df_comp['variacao'] = ((df_comp['quantidade_p2'] - df_comp['quantidade_p1']) / 
-                              df_comp['quantidade_p1'] * 100)
-        
         # Ordena por total crescente (menores no topo)
         df_comp = df_comp.sort_values('total', ascending=True)
         
@@ -247,17 +223,8 @@ def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
         st.error(f"Erro ao criar gráfico: {str(e)}")
         return None
 
-def gerar_insights_operacao(mov_p1, mov_p2):
+def gerar_insights_operacao(df_comp):
     """Gera insights sobre a movimentação das operações"""
-    # Merge dos dados
-    df_comp = pd.merge(
-        mov_p1, mov_p2,
-        on='operacao',
-        suffixes=('_p1', '_p2')
-    )
-    df_comp['variacao'] = ((df_comp['quantidade_p2'] - df_comp['quantidade_p1']) / df_comp['quantidade_p1'] * 100)
-    df_comp['total'] = df_comp['quantidade_p1'] + df_comp['quantidade_p2']
-
     # Cálculos principais
     total_p1 = df_comp['quantidade_p1'].sum()
     total_p2 = df_comp['quantidade_p2'].sum()
@@ -386,16 +353,19 @@ def mostrar_aba(dados, filtros):
         # Adiciona um key único que muda quando o tema muda
         st.session_state['tema_atual'] = detectar_tema()
         
-        # Calcula movimentação para os dois períodos
-        mov_p1 = calcular_movimentacao_por_periodo(dados, filtros, 'periodo1')
-        mov_p2 = calcular_movimentacao_por_periodo(dados, filtros, 'periodo2')
+        if escolher_modo("modo_mov_operacao"):
+            mostrar_tendencia(dados, filtros, 'OPERAÇÃO', 'quantidade', 'Atendimentos', "mov_operacao")
+            return
+        
+        # Calcula a movimentação dos dois períodos lado a lado
+        df_comp = calcular_movimentacao_comparativa(dados, filtros)
         
-        if mov_p1.empty or mov_p2.empty:
+        if df_comp.empty:
             st.warning("Não há dados para exibir no período selecionado.")
             return
         
         # Cria e exibe o gráfico comparativo
-        fig = criar_grafico_comparativo(mov_p1, mov_p2, filtros)
+        fig = criar_grafico_comparativo(df_comp, filtros)
         if fig:
             st.plotly_chart(
                 fig, 
@@ -407,7 +377,7 @@ def mostrar_aba(dados, filtros):
         st.markdown("---")
         st.subheader("📈 Análise Detalhada")
         with st.expander("Ver análise detalhada", expanded=True):
-            gerar_insights_operacao(mov_p1, mov_p2)
+            gerar_insights_operacao(df_comp)
     
     except Exception as e:
         st.error(f"Erro ao mostrar aba: {str(e)}")
@@ -4,6 +4,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
+from visualizacao.otimizacao import obter_celulas_periodo, obter_visao_periodo, obter_esbocos, escolher_estatistica
+from processamento.cubo import agregar_cubo, rotular_turno
+from processamento.quantis import calcular_quantis, rotulo_quantil
 
 def formatar_tempo(minutos):
     """Formata o tempo em minutos para o formato mm:ss"""
@@ -35,28 +38,35 @@ def obter_cores_tema():
         'erro': '#ff6b6b' if is_dark else '#ff5757'
     }
 
-def calcular_permanencia(dados, filtros, grupo='CLIENTE'):
-    """Calcula tempo de permanência por cliente/operação"""
-    df = dados['base'].copy()  # Create a copy to avoid SettingWithCopyWarning
+def calcular_permanencia(dados, filtros, grupo='CLIENTE', quantil=None):
+    """Calcula tempo de permanência (média ou percentil `quantil`) por cliente/operação"""
+    # Médias por grupo a partir das células do cubo no período 2 (mais recente)
+    celulas = obter_celulas_periodo(dados, filtros, 'periodo2')
+    agregado = agregar_cubo(celulas, grupo)
+    tempos = pd.DataFrame({
+        grupo: agregado[grupo],
+        'tpatend': agregado['media_tpatend'],
+        'tpesper': agregado['media_tpesper'],
+        'tempo_permanencia': agregado['media_tempo_permanencia'],
+        'id': agregado['qtd']
+    })
     
-    # Criar coluna TURNO baseado no horário de retirada
-    def determinar_turno(hora):
-        if 7 <= hora < 15:
-            return 'TURNO A'
-        elif 15 <= hora < 23:
-            return 'TURNO B'
-        else:
-            return 'TURNO C'
+    if quantil is not None:
+        # Percentis de cada tempo combinados dos esboços das mesmas células
+        esbocos = obter_esbocos(dados)
+        tempos = tempos.set_index(grupo)
+        for medida in ['tpatend', 'tpesper', 'tempo_permanencia']:
+            quantis = calcular_quantis(celulas, esbocos[medida], grupo, [quantil]).set_index(grupo)
+            tempos[medida] = quantis[rotulo_quantil(quantil)]
+        tempos = tempos.reset_index()
     
-    # Adiciona coluna TURNO
-    df['TURNO'] = df['retirada'].dt.hour.map(determinar_turno)
+    # Converte para minutos
+    tempos['tpatend'] = tempos['tpatend'] / 60
+    tempos['tpesper'] = tempos['tpesper'] / 60
+    tempos['tempo_permanencia'] = tempos['tempo_permanencia'] / 60
     
-    # Aplicar filtros de data para período 2 (mais recente)
-    mask = (
-        (df['retirada'].dt.date >= filtros['periodo2']['inicio']) &
-        (df['retirada'].dt.date <= filtros['periodo2']['fim'])
-    )
-    df_filtrado = df[mask]
+    # Registros individuais só são necessários no detalhamento: recorte do período, sem copiar a base
+    df_filtrado = obter_visao_periodo(dados, filtros['periodo2']['inicio'], filtros['periodo2']['fim'])
     
     # Aplicar filtros de cliente
     if filtros['cliente'] != ['Todos']:
@@ -66,27 +76,17 @@ def calcular_permanencia(dados, filtros, grupo='CLIENTE'):
     if filtros['operacao'] != ['Todas']:
         df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
     
+    # Adiciona coluna TURNO baseado no horário de retirada
+    df_filtrado = df_filtrado.assign(TURNO=rotular_turno(df_filtrado['retirada'].dt.hour, 7))
+    
     # Aplicar filtros de turno
     if filtros['turno'] != ['Todos']:
         df_filtrado = df_filtrado[df_filtrado['TURNO'].isin(filtros['turno'])]
     
-    # Calcula médias de tempo
-    tempos = df_filtrado.groupby(grupo).agg({
-        'tpatend': 'mean',
-        'tpesper': 'mean',
-        'tempo_permanencia': 'mean',
-        'id': 'count'
-    }).reset_index()
-    
-    # Converte para minutos
-    tempos['tpatend'] = tempos['tpatend'] / 60
-    tempos['tpesper'] = tempos['tpesper'] / 60
-    tempos['tempo_permanencia'] = tempos['tempo_permanencia'] / 60
-    
     # Retornar tanto os tempos agregados quanto o DataFrame filtrado
     return tempos, df_filtrado
 
-def criar_grafico_permanencia(dados_tempo, meta, grupo='CLIENTE'):
+def criar_grafico_permanencia(dados_tempo, meta, grupo='CLIENTE', estatistica=None):
     """Cria gráfico de barras empilhadas com tempo de espera e atendimento"""
     cores_tema = obter_cores_tema()
     
@@ -95,35 +95,57 @@ def criar_grafico_permanencia(dados_tempo, meta, grupo='CLIENTE'):
     
     fig = go.Figure()
     
-    # Adiciona barra de tempo de espera
-    fig.add_trace(
-        go.Bar(
-            name='Tempo de Espera',
-            y=df[grupo],
-            x=df['tpesper'],
-            orientation='h',
-            text=[f"{formatar_tempo(x)} min" for x in df['tpesper']],
-            textposition='inside',
-            marker_color=cores_tema['secundaria'],
-            textfont={'color': '#000000', 'size': 16, 'family': 'Arial Black'},
-            opacity=0.85
+    if estatistica is not None:
+        # Percentis não se somam: uma barra com a permanência e os percentis das partes no hover
+        fig.add_trace(
+            go.Bar(
+                name=f'Permanência ({estatistica})',
+                y=df[grupo],
+                x=df['tempo_permanencia'],
+                orientation='h',
+                text=[f"{formatar_tempo(x)} min" for x in df['tempo_permanencia']],
+                textposition='inside',
+                marker_color=cores_tema['primaria'],
+                textfont={'color': '#ffffff', 'size': 16, 'family': 'Arial Black'},
+                customdata=df[['tpesper', 'tpatend']].map(formatar_tempo).values,
+                hovertemplate=(
+                    f"%{{y}}<br>Permanência {estatistica}: %{{text}}"
+                    f"<br>Espera {estatistica}: %{{customdata[0]}} min"
+                    f"<br>Atendimento {estatistica}: %{{customdata[1]}} min<extra></extra>"
+                ),
+                opacity=0.85
+            )
         )
-    )
-    
-    # Adiciona barra de tempo de atendimento
-    fig.add_trace(
-        go.Bar(
-            name='Tempo de Atendimento',
-            y=df[grupo],
-            x=df['tpatend'],
-            orientation='h',
-            text=[f"{formatar_tempo(x)} min" for x in df['tpatend']],
-            textposition='inside',
-            marker_color=cores_tema['primaria'],
-            textfont={'color': '#ffffff', 'size': 16, 'family': 'Arial Black'},
-            opacity=0.85
+    else:
+        # Adiciona barra de tempo de espera
+        fig.add_trace(
+            go.Bar(
+                name='Tempo de Espera',
+                y=df[grupo],
+                x=df['tpesper'],
+                orientation='h',
+                text=[f"{formatar_tempo(x)} min" for x in df['tpesper']],
+                textposition='inside',
+                marker_color=cores_tema['secundaria'],
+                textfont={'color': '#000000', 'size': 16, 'family': 'Arial Black'},
+                opacity=0.85
+            )
+        )
+        
+        # Adiciona barra de tempo de atendimento
+        fig.add_trace(
+            go.Bar(
+                name='Tempo de Atendimento',
+                y=df[grupo],
+                x=df['tpatend'],
+                orientation='h',
+                text=[f"{formatar_tempo(x)} min" for x in df['tpatend']],
+                textposition='inside',
+                marker_color=cores_tema['primaria'],
+                textfont={'color': '#ffffff', 'size': 16, 'family': 'Arial Black'},
+                opacity=0.85
+            )
         )
-    )
     
     # Adiciona linha de meta para cobrir toda a área do gráfico
     fig.add_shape(
@@ -259,6 +281,7 @@ def mostrar_aba(dados, filtros):
         - **Por Cliente**: Agrupamento por cliente
         - **Por Operação**: Agrupamento por tipo de serviço
         - **Composição**: Proporção entre espera e atendimento
+        - **Estatística**: Média ou percentis P50/P90/P95 da permanência
 
         5. **Insights**:
         - 🎯 Clientes/Operações dentro da meta
@@ -277,16 +300,18 @@ def mostrar_aba(dados, filtros):
         )
         
         grupo = "CLIENTE" if tipo_analise == "Cliente" else "OPERAÇÃO"
+        estatistica, quantil = escolher_estatistica("estatistica_permanencia")
+        percentil = estatistica if quantil is not None else None
         
         # Receber tanto os tempos quanto o DataFrame filtrado
-        tempos, df_filtrado = calcular_permanencia(dados, filtros, grupo)
+        tempos, df_filtrado = calcular_permanencia(dados, filtros, grupo, quantil)
         meta = filtros['meta_permanencia']
         
-        fig = criar_grafico_permanencia(tempos, meta, grupo)
+        fig = criar_grafico_permanencia(tempos, meta, grupo, percentil)
         st.plotly_chart(
             fig, 
             use_container_width=True,
-            key=f"grafico_permanencia_{grupo}_{st.session_state['tema_atual']}"
+            key=f"grafico_permanencia_{grupo}_{estatistica}_{st.session_state['tema_atual']}"
         )
         
         st.markdown("---")
@@ -299,13 +324,23 @@ def mostrar_aba(dados, filtros):
                 media_espera = tempos['tpesper'].mean()
                 media_atend = tempos['tpatend'].mean()
                 
-                st.markdown(f"""
-                **Tempo Médio Total**: {formatar_tempo(media_permanencia)} min
-                
-                **Composição:**
-                - Espera: {formatar_tempo(media_espera)} min ({(media_espera/media_permanencia)*100:.1f}%)
-                - Atendimento: {formatar_tempo(media_atend)} min ({(media_atend/media_permanencia)*100:.1f}%)
-                """)
+                if percentil is None:
+                    st.markdown(f"""
+                    **Tempo Médio Total**: {formatar_tempo(media_permanencia)} min
+                    
+                    **Composição:**
+                    - Espera: {formatar_tempo(media_espera)} min ({(media_espera/media_permanencia)*100:.1f}%)
+                    - Atendimento: {formatar_tempo(media_atend)} min ({(media_atend/media_permanencia)*100:.1f}%)
+                    """)
+                else:
+                    # Percentis das partes não compõem o da permanência
+                    st.markdown(f"""
+                    **{percentil} Médio Total**: {formatar_tempo(media_permanencia)} min
+                    
+                    **{percentil} das partes:**
+                    - Espera: {formatar_tempo(media_espera)} min
+                    - Atendimento: {formatar_tempo(media_atend)} min
+                    """)
 
             with col2:
                 st.subheader("⚠️ Análise de Meta")
@@ -325,8 +360,8 @@ def mostrar_aba(dados, filtros):
             st.markdown("---")
             st.markdown("### 📋 Detalhamento dos Registros Fora da Meta")
             
-            # Filtrar registros acima da meta do DataFrame filtrado
-            df_base = df_filtrado.copy()
+            # Filtrar registros acima da meta antes de converter, copiando só o necessário
+            df_base = df_filtrado[df_filtrado['tempo_permanencia'] > meta * 60].copy()
             
             # Primeiro converter para minutos para reduzir os números
             df_base['tpatend'] = df_base['tpatend'] / 60
@@ -344,8 +379,7 @@ def mostrar_aba(dados, filtros):
             if 'numero' in df_base.columns:
                 df_base['numero'] = pd.to_numeric(df_base['numero'], downcast='integer')
             
-            # Filtrar registros fora da meta
-            df_fora_meta = df_base[df_base['tempo_permanencia'] > meta].copy()
+            df_fora_meta = df_base
             
             if not df_fora_meta.empty:
                 # Garantir que colunas de texto sejam strings
@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.graph_objects as go
 import json
 from datetime import datetime
+from visualizacao.otimizacao import comparar_cubo
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -28,62 +29,33 @@ def obter_cores_tema():
         'erro': '#ff6b6b' if is_dark else '#ff5757'
     }
 
-def calcular_atendimentos_por_periodo(dados, filtros, periodo):
-    """Calcula a quantidade de atendimentos por colaborador no período especificado"""
-    df = dados['base']
-    
-    if df.empty:
+def calcular_atendimentos_comparativos(dados, filtros):
+    """Calcula a quantidade de atendimentos por colaborador nos dois períodos numa única agregação"""
+    if dados['base'].empty:
         st.warning("Base de dados está vazia")
         return pd.DataFrame()
     
-    # Aplicar filtros de data
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo]['fim'])
-    )
-    df_filtrado = df[mask]
+    # Agrupar por colaborador e período com os filtros da sidebar
+    df_comp = comparar_cubo(dados, filtros, 'usuário', medida='qtd', como='outer')
     
-    # Aplicar filtros adicionais
-    if filtros['cliente'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'].isin(filtros['cliente'])]
-        
-    if filtros['operacao'] != ['Todas']:
-        df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
-        
-    if filtros['turno'] != ['Todos']:
-        def get_turno(hour):
-            if 7 <= hour < 15:
-                return 'TURNO A'
-            elif 15 <= hour < 23:
-                return 'TURNO B'
-            else:
-                return 'TURNO C'
-        df_filtrado = df_filtrado[df_filtrado['retirada'].dt.hour.apply(get_turno).isin(filtros['turno'])]
+    # Sem atendimentos em algum dos períodos não há comparação
+    if df_comp.empty or not (df_comp['linhas_p1'].any() and df_comp['linhas_p2'].any()):
+        return pd.DataFrame()
     
-    # Agrupar por colaborador
-    atendimentos = df_filtrado.groupby('COLABORADOR')['id'].count().reset_index()
-    atendimentos.columns = ['colaborador', 'quantidade']
+    df_comp = df_comp.rename(columns={
+        'usuário': 'colaborador',
+        'qtd_p1': 'quantidade_p1',
+        'qtd_p2': 'quantidade_p2'
+    })
+    df_comp['variacao'] = df_comp['variacao'].replace([float('inf')], 100)
     
-    return atendimentos
+    return df_comp[['colaborador', 'quantidade_p1', 'quantidade_p2', 'variacao']]
 
-def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
+def criar_grafico_comparativo(df_comp, filtros):
     try:
-        # Merge dos dados
-        df_comp = pd.merge(
-            dados_p1, 
-            dados_p2, 
-            on='colaborador',
-            suffixes=('_p1', '_p2'),
-            how='outer'
-        ).fillna(0)
-        
         # Ordena por quantidade do período 2 (decrescente)
         df_comp = df_comp.sort_values('quantidade_p2', ascending=True)
         
-        # Calcula variação percentual
-        df_comp['variacao'] = ((df_comp['quantidade_p2'] - df_comp['quantidade_p1']) / 
-                              df_comp['quantidade_p1'] * 100).replace([float('inf')], 100)
-        
         cores_tema = obter_cores_tema()
         
         # Prepara legendas
@@ -198,15 +170,10 @@ def criar_grafico_comparativo(dados_p1, dados_p2, filtros):
         st.error(f"Erro ao criar gráfico: {str(e)}")
         return None
 
-def gerar_insights_atendimentos(atend_p1, atend_p2):
+def gerar_insights_atendimentos(df_comp):
     """Gera insights sobre os atendimentos dos colaboradores"""
-    # Merge dos dados
-    df_comp = pd.merge(
-        atend_p1, atend_p2,
-        on='colaborador',
-        suffixes=('_p1', '_p2')
-    )
-    df_comp['variacao'] = ((df_comp['quantidade_p2'] - df_comp['quantidade_p1']) / df_comp['quantidade_p1'] * 100)
+    # Apenas colaboradores com atendimentos nos dois períodos
+    df_comp = df_comp[(df_comp['quantidade_p1'] > 0) & (df_comp['quantidade_p2'] > 0)]
     
     # Cálculos principais
     total_p1 = df_comp['quantidade_p1'].sum()
@@ -284,15 +251,14 @@ def mostrar_aba(dados, filtros):
         st.session_state['tema_atual'] = detectar_tema()
         
         # Calcula atendimentos para os dois períodos
-        atend_p1 = calcular_atendimentos_por_periodo(dados, filtros, 'periodo1')
-        atend_p2 = calcular_atendimentos_por_periodo(dados, filtros, 'periodo2')
+        df_comp = calcular_atendimentos_comparativos(dados, filtros)
         
-        if atend_p1.empty or atend_p2.empty:
+        if df_comp.empty:
             st.warning("Não há dados para exibir no período selecionado.")
             return
         
         # Cria e exibe o gráfico comparativo
-        fig = criar_grafico_comparativo(atend_p1, atend_p2, filtros)
+        fig = criar_grafico_comparativo(df_comp, filtros)
         if fig:
             st.plotly_chart(
                 fig, 
@@ -304,7 +270,7 @@ def mostrar_aba(dados, filtros):
         st.markdown("---")
         st.subheader("📈 Análise Detalhada")
         with st.expander("Ver análise detalhada", expanded=True):
-            gerar_insights_atendimentos(atend_p1, atend_p2)
+            gerar_insights_atendimentos(df_comp)
     
     except Exception as e:
         st.error(f"Erro ao mostrar aba: {str(e)}")
@@ -4,6 +4,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
+from visualizacao.otimizacao import obter_tabela_metrica, escolher_estatistica
+from visualizacao.tendencia import escolher_modo, mostrar_tendencia
+from processamento.metricas import extrair_metas, calcular_desvio_meta
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -35,28 +38,6 @@ def formatar_tempo(minutos):
     segundos = int((minutos - minutos_int) * 60)
     return f"{minutos_int:02d}:{segundos:02d}"
 
-def converter_para_minutos(valor):
-    """Converte diferentes formatos de tempo para minutos"""
-    if pd.isna(valor):
-        return None
-    if isinstance(valor, (int, float)):
-        return float(valor)
-    if isinstance(valor, str):
-        try:
-            # Tenta converter string HH:MM ou HH:MM:SS para minutos
-            partes = valor.split(':')
-            if len(partes) == 2:
-                horas, minutos = map(int, partes)
-                return horas * 60 + minutos
-            elif len(partes) == 3:
-                horas, minutos, segundos = map(int, partes)
-                return horas * 60 + minutos + segundos / 60
-        except:
-            return None
-    if hasattr(valor, 'hour') and hasattr(valor, 'minute'):  # datetime.time object
-        return valor.hour * 60 + valor.minute
-    return None
-
 def determinar_turno(hora):
     """Determina o turno com base na hora"""
     if isinstance(hora, pd.Timestamp):
@@ -69,83 +50,28 @@ def determinar_turno(hora):
     else:  # 23-7
         return 'TURNO C'
 
-def calcular_tempos_por_periodo(dados, filtros, periodo, grupo='CLIENTE'):
-    """Calcula tempos médios de atendimento por cliente/operação no período"""
-    df = dados['base']
-    df_medias = dados['medias']
-    
-    # Aplicar filtros de data
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo]['fim'])
-    )
-    df_filtrado = df[mask].copy()
-    
-    # Determina o turno com base no horário de retirada
-    df_filtrado['TURNO'] = df_filtrado['retirada'].apply(determinar_turno)
-    
-    # Aplicar filtros de cliente apenas se não for 'Todos'
-    if filtros['cliente'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['CLIENTE'].isin(filtros['cliente'])]
-    
-    # Aplicar filtro de operação apenas se não for 'Todas'
-    if filtros['operacao'] != ['Todas']:
-        df_filtrado = df_filtrado[df_filtrado['OPERAÇÃO'].isin(filtros['operacao'])]
-    
-    # Aplicar filtro de turno apenas se não for 'Todos'
-    if filtros['turno'] != ['Todos']:
-        df_filtrado = df_filtrado[df_filtrado['TURNO'].isin(filtros['turno'])]
-    
-    # Verifica se há dados após todos os filtros
-    if len(df_filtrado) == 0:
-        st.warning(f"Nenhum dado encontrado para o período {periodo} com os filtros selecionados.")
-        return pd.DataFrame()  # Retorna DataFrame vazio
-    
-    # Calcula média de atendimento
-    tempos = df_filtrado.groupby(grupo)['tpatend'].agg([
-        ('media', 'mean'),
-        ('contagem', 'count')
-    ]).reset_index()
-    
-    # Converte tempo para minutos
-    tempos['media'] = tempos['media'] / 60
-    
-    return tempos
+def calcular_tempos_comparativos(dados, filtros, grupo='CLIENTE', quantil=None):
+    """Calcula tempos médios (ou o percentil `quantil`) de atendimento por cliente/operação nos dois períodos"""
+    # Tabela servida pelo motor de métricas, já com os filtros de cliente, operação e turno
+    tabela = obter_tabela_metrica(dados, filtros, grupo, 'tpatend', quantil=quantil)
+    
+    # Verifica se há dados nos dois períodos após todos os filtros
+    if tabela.empty:
+        st.warning("Nenhum dado encontrado nos períodos selecionados com os filtros aplicados.")
+        return pd.DataFrame()
+    
+    # Médias (ou percentis) em minutos
+    return tabela.rename(columns={
+        'valor_p1': 'media_p1',
+        'valor_p2': 'media_p2'
+    })[[grupo, 'media_p1', 'contagem_p1', 'media_p2', 'contagem_p2', 'variacao']]
 
-def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE', filtros=None):
+def criar_grafico_comparativo(df_comp, metas, grupo='CLIENTE', filtros=None, rotulo='Tempo Médio'):
     """Cria gráfico comparativo de tempos médios entre períodos"""
     cores_tema = obter_cores_tema()
     
-    # Ajusta os dados de meta se disponíveis
-    if dados_medias is not None:
-        try:
-            # Pega a primeira linha com dados (ignorando cabeçalhos)
-            dados_medias = dados_medias.iloc[1:].copy()
-            dados_medias.columns = ['CLIENTE', 'OPERAÇÃO', 'TEMPO DE ATENDIMENTO (MEDIA)', 'TURNO A', 'TURNO B']
-            dados_medias = dados_medias.reset_index(drop=True)
-            
-            # Converte a coluna de tempo para numérico e remove NaN
-            dados_medias['TEMPO DE ATENDIMENTO (MEDIA)'] = pd.to_numeric(
-                dados_medias['TEMPO DE ATENDIMENTO (MEDIA)'],
-                errors='coerce'
-            )
-            dados_medias = dados_medias.dropna(subset=['TEMPO DE ATENDIMENTO (MEDIA)'])
-        except Exception as e:
-            dados_medias = None
-    
-    # Merge dos dados dos dois períodos
-    df_comp = pd.merge(
-        dados_p1,
-        dados_p2,
-        on=grupo,
-        suffixes=('_p1', '_p2')
-    )
-    
-    df_comp['variacao'] = ((df_comp['media_p2'] - df_comp['media_p1']) 
-                          / df_comp['media_p1'] * 100)
-    
     # Ordena por total decrescente (menores tempos no topo)
-    df_comp['total'] = df_comp['media_p1'] + df_comp['media_p2']
+    df_comp = df_comp.assign(total=df_comp['media_p1'] + df_comp['media_p2'])
     df_comp = df_comp.sort_values('total', ascending=False)
     
     fig = go.Figure()
@@ -220,36 +146,27 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
         )
     )
     
-    # Adiciona linha de meta se disponível
-    if dados_medias is not None and isinstance(dados_medias, pd.DataFrame) and not dados_medias.empty:
-        try:
-            coluna_meta = 'TEMPO DE ATENDIMENTO (MEDIA)'
-            if coluna_meta in dados_medias.columns:
-                metas = dados_medias[[grupo, coluna_meta]].dropna(subset=[coluna_meta])
-                
-                if not metas.empty:
-                    df_metas = pd.merge(df_comp[[grupo]], metas, on=grupo, how='left')
-                    df_metas = df_metas.dropna(subset=[coluna_meta])
-                    
-                    if not df_metas.empty:
-                        fig.add_trace(
-                            go.Scatter(
-                                name='Meta Individual',
-                                y=df_metas[grupo],
-                                x=df_metas[coluna_meta],
-                                mode='markers+text',
-                                marker=dict(
-                                    symbol='diamond',
-                                    size=10,
-                                    color=cores_tema['erro']
-                                ),
-                                text=[f"{formatar_tempo(x)} min" for x in df_metas[coluna_meta]],
-                                textposition='middle right',
-                                textfont=dict(color=cores_tema['erro'])
-                            )
-                        )
-        except Exception as e:
-            pass  # Silently ignore meta plotting errors
+    # Adiciona marcadores de meta se disponíveis
+    if metas is not None and not metas.empty:
+        df_metas = calcular_desvio_meta(df_comp, metas, grupo, 'media_p2').dropna(subset=['meta'])
+        
+        if not df_metas.empty:
+            fig.add_trace(
+                go.Scatter(
+                    name='Meta Individual',
+                    y=df_metas[grupo],
+                    x=df_metas['meta'],
+                    mode='markers+text',
+                    marker=dict(
+                        symbol='diamond',
+                        size=10,
+                        color=cores_tema['erro']
+                    ),
+                    text=[f"{formatar_tempo(x)} min" for x in df_metas['meta']],
+                    textposition='middle right',
+                    textfont=dict(color=cores_tema['erro'])
+                )
+            )
     
     # Adiciona anotações de variação
     for i, row in df_comp.iterrows():
@@ -269,7 +186,7 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
     # Atualiza layout
     fig.update_layout(
         title={
-            'text': f'Comparativo de Tempo Médio de Atendimento por {grupo}',
+            'text': f'Comparativo de {rotulo} de Atendimento por {grupo}',
             'font': {'size': 16, 'color': cores_tema['texto']}
         },
         barmode='stack',
@@ -295,7 +212,7 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
     
     # Atualiza eixos
     fig.update_xaxes(
-        title='Tempo Médio (minutos)',
+        title=f'{rotulo} (minutos)',
         title_font={'color': cores_tema['texto']},
         tickfont={'color': cores_tema['texto']},
         gridcolor=cores_tema['grid'],
@@ -318,7 +235,7 @@ def criar_grafico_comparativo(dados_p1, dados_p2, dados_medias, grupo='CLIENTE',
     
     return fig
 
-def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=None):
+def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", metas=None, rotulo='Tempo médio'):
     """Gera insights sobre os tempos de atendimento"""
     # Cálculos principais
     media_geral_p1 = (df_comp['media_p1'] * df_comp['contagem_p1']).sum() / df_comp['contagem_p1'].sum()
@@ -335,11 +252,11 @@ def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=Non
         st.markdown(f"""
         ##### Métricas Período 1
         - Total atendimentos: **{total_atendimentos_p1:,}**
-        - Tempo médio: **{formatar_tempo(media_geral_p1)} min**
+        - {rotulo}: **{formatar_tempo(media_geral_p1)} min**
         
         ##### Métricas Período 2
         - Total atendimentos: **{total_atendimentos_p2:,}**
-        - Tempo médio: **{formatar_tempo(media_geral_p2)} min**
+        - {rotulo}: **{formatar_tempo(media_geral_p2)} min**
         - Variação: **{var_media:+.1f}%** {'📈' if var_media > 0 else '📉'}
         """)
         
@@ -351,26 +268,17 @@ def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=Non
             - **{row[grupo]}**:
                 - Atendimentos: **{int(row['contagem_p2']):,}**
                 - Variação: **{var_volume:+.1f}%** {'📈' if var_volume > 0 else '📉'}
-                - Tempo médio: **{formatar_tempo(row['media_p2'])} min**
+                - {rotulo}: **{formatar_tempo(row['media_p2'])} min**
             """)
 
     with col2:
-        if dados_medias is not None and isinstance(dados_medias, pd.DataFrame):
+        if metas is not None:
             st.subheader("🎯 Análise de Metas")
             try:
-                coluna_meta = 'TEMPO DE ATENDIMENTO (MEDIA)'
-                dados_medias[coluna_meta] = dados_medias[coluna_meta].apply(converter_para_minutos)
-                dados_medias = dados_medias.dropna(subset=[coluna_meta])
-                
-                df_analise = pd.merge(
-                    df_comp,
-                    dados_medias[[grupo, coluna_meta]],
-                    on=grupo,
-                    how='left'
-                )
+                df_analise = calcular_desvio_meta(df_comp, metas, grupo, 'media_p2')
                 
-                dentro_meta = df_analise[df_analise['media_p2'] <= df_analise[coluna_meta]]
-                fora_meta = df_analise[df_analise['media_p2'] > df_analise[coluna_meta]]
+                dentro_meta = df_analise[df_analise['dentro_meta']]
+                fora_meta = df_analise[df_analise['acima_meta']]
                 total = len(df_analise)
                 perc_dentro = (len(dentro_meta) / total * 100) if total > 0 else 0
                 
@@ -390,12 +298,11 @@ def gerar_insights(df_comp, grupo='CLIENTE', titulo="Insights", dados_medias=Non
                 
                 if not fora_meta.empty:
                     st.markdown("##### Desvios Críticos")
-                    fora_meta['desvio'] = fora_meta['media_p2'] - fora_meta[coluna_meta]
                     top_desvios = fora_meta.nlargest(3, 'desvio')
                     for _, row in top_desvios.iterrows():
                         st.markdown(f"""
                         - **{row[grupo]}**:
-                            - Meta: **{formatar_tempo(row[coluna_meta])} min**
+                            - Meta: **{formatar_tempo(row['meta'])} min**
                             - Atual: **{formatar_tempo(row['media_p2'])} min**
                             - Desvio: **+{formatar_tempo(row['desvio'])} min** ⚠️
                         """)
@@ -470,6 +377,7 @@ def mostrar_aba(dados, filtros):
         2. **Análises Disponíveis**:
         - **Por Cliente**: Tempo médio por cliente
         - **Por Operação**: Tempo médio por tipo de serviço
+        - **Estatística**: Média ou percentis P50/P90/P95 (tempo que 50/90/95% dos atendimentos não ultrapassam)
         - **Comparativo**: Entre dois períodos selecionados
             - 🟢 Variação negativa = Redução no tempo (melhor)
             - 🔴 Variação positiva = Aumento no tempo (pior)
@@ -501,39 +409,35 @@ def mostrar_aba(dados, filtros):
         )
         
         grupo = "CLIENTE" if tipo_analise == "Cliente" else "OPERAÇÃO"
+        estatistica, quantil = escolher_estatistica("estatistica_tempo_atend")
+        rotulo = 'Tempo Médio' if quantil is None else f'Tempo {estatistica}'
+        
+        if escolher_modo("modo_tempo_atend"):
+            mostrar_tendencia(dados, filtros, grupo, 'tpatend', f'{rotulo} (min)', "tempo_atend", quantil)
+            return
         
-        tempos_p1 = calcular_tempos_por_periodo(dados, filtros, 'periodo1', grupo)
-        tempos_p2 = calcular_tempos_por_periodo(dados, filtros, 'periodo2', grupo)
+        df_comp = calcular_tempos_comparativos(dados, filtros, grupo, quantil)
         
-        if tempos_p1.empty or tempos_p2.empty:
+        if df_comp.empty:
             st.warning("Não há dados para exibir no período selecionado.")
             return
             
-        medias = dados.get('medias')
-        if medias is not None:
-            # Ajusta o DataFrame de médias antes de usar
-            medias = medias.iloc[1:].copy()  # Skip header row
-            medias.columns = ['CLIENTE', 'OPERAÇÃO', 'TEMPO DE ATENDIMENTO (MEDIA)', 'TURNO A', 'TURNO B']
-            medias = medias.reset_index(drop=True)
+        # Metas por cliente/operação lidas da planilha de médias
+        metas = extrair_metas(dados.get('medias'), grupo)
         
-        fig = criar_grafico_comparativo(tempos_p1, tempos_p2, medias, grupo, filtros)
+        fig = criar_grafico_comparativo(df_comp, metas, grupo, filtros, rotulo)
         st.plotly_chart(
             fig, 
             use_container_width=True,
-            key=f"grafico_tempo_{grupo}_{st.session_state['tema_atual']}"
+            key=f"grafico_tempo_{grupo}_{estatistica}_{st.session_state['tema_atual']}"
         )
         
         st.markdown("---")
         with st.expander("📊 Ver Insights", expanded=True):
-            df_comp = pd.merge(
-                tempos_p1,
-                tempos_p2,
-                on=grupo,
-                suffixes=('_p1', '_p2')
+            gerar_insights(
+                df_comp, grupo, metas=metas,
+                rotulo='Tempo médio' if quantil is None else f'{estatistica} médio dos grupos'
             )
-            df_comp['variacao'] = ((df_comp['media_p2'] - df_comp['media_p1']) 
-                                 / df_comp['media_p1'] * 100)
-            gerar_insights(df_comp, grupo, dados_medias=medias)
     
     except Exception as e:
         st.error("Erro ao gerar a aba de Tempo de Atendimento")
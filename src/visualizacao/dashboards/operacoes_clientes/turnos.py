@@ -4,6 +4,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
+from visualizacao.otimizacao import obter_agregado
+from processamento.cubo import filtrar_cubo, agregar_cubo
 
 def detectar_tema():
     """Detecta se o tema atual é claro ou escuro"""
@@ -40,32 +42,25 @@ def identificar_turno(hora):
 
 def calcular_metricas_turno(dados, filtros, periodo='periodo2'):
     """Calcula métricas por turno para um período específico"""
-    df = dados['base']
-    
-    # Aplicar filtros de data para o período especificado
-    mask = (
-        (df['retirada'].dt.date >= filtros[periodo]['inicio']) &
-        (df['retirada'].dt.date <= filtros[periodo]['fim'])
-    )
-    
-    # Aplicar filtros adicionais
+    # Filtros de cliente e operação aplicados sobre as células consolidadas (o turno vira o eixo)
+    filtros_cubo = {}
     if filtros['cliente'] != ['Todos']:
-        mask &= df['CLIENTE'].isin(filtros['cliente'])
+        filtros_cubo['CLIENTE'] = filtros['cliente']
     if filtros['operacao'] != ['Todas']:
-        mask &= df['OPERAÇÃO'].isin(filtros['operacao'])
-    
-    df_filtrado = df[mask]
-    
-    # Identificar turno
-    df_filtrado['turno'] = df_filtrado['retirada'].dt.hour.apply(identificar_turno)
+        filtros_cubo['OPERAÇÃO'] = filtros['operacao']
+    consolidado = obter_agregado(dados, ['turno', *filtros_cubo])
+    celulas = filtrar_cubo(consolidado, filtros[periodo]['inicio'], filtros[periodo]['fim'], filtros_cubo)
     
-    # Calcular métricas por turno
-    metricas = df_filtrado.groupby('turno').agg({
-        'id': 'count',
-        'tpatend': 'mean',
-        'tpesper': 'mean',
-        'tempo_permanencia': 'mean'
-    }).reset_index()
+    # Calcular métricas por turno a partir das somas e contagens do cubo
+    agregado = agregar_cubo(celulas, 'turno')
+    metricas = pd.DataFrame({
+        # Rótulos do cubo ('TURNO A') reduzidos à letra usada nos gráficos
+        'turno': agregado['turno'].str[-1],
+        'id': agregado['qtd'],
+        'tpatend': agregado['media_tpatend'],
+        'tpesper': agregado['media_tpesper'],
+        'tempo_permanencia': agregado['media_tempo_permanencia']
+    })
     
     # Converter tempos para minutos
     for col in ['tpatend', 'tpesper', 'tempo_permanencia']:
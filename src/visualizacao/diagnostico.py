@@ -0,0 +1,60 @@
+import streamlit as st
+import pandas as pd
+
+def mostrar_diagnostico(dados):
+    """Mostra o relatório de qualidade gerado na validação da base"""
+    relatorio = dados.get('qualidade') if dados else None
+    if not relatorio:
+        return
+
+    with st.sidebar.expander("🩺 Qualidade dos Dados"):
+        limites = dados.get('limites_validacao', {})
+        if limites:
+            st.caption(
+                f"Regras: atendimento {limites['tpatend_min']}-{limites['tpatend_max']}s, "
+                f"espera até {limites['tpesper_max']}s, status {', '.join(limites['status'])}"
+            )
+
+        col1, col2 = st.columns(2)
+        col1.metric("Linhas lidas", f"{relatorio['total_linhas']:,}")
+        col2.metric("Linhas válidas", f"{relatorio['linhas_validas']:,}")
+        col1.metric("Rejeitadas", f"{relatorio['linhas_rejeitadas']:,}")
+        col2.metric("IDs duplicados", f"{relatorio['ids_duplicados']:,}")
+
+        # Uma linha pode falhar em mais de uma regra
+        st.markdown("**Rejeições por regra**")
+        st.dataframe(
+            pd.Series(relatorio['rejeitadas_por_regra'], name='linhas').rename_axis('regra').reset_index(),
+            hide_index=True,
+            use_container_width=True
+        )
+
+        rejeicoes = relatorio['rejeicoes']
+        if not rejeicoes.empty:
+            st.markdown("**Rejeições por dia**")
+            por_dia = rejeicoes.pivot_table(
+                index='data', columns='regra', values='quantidade',
+                aggfunc='sum', fill_value=0
+            )
+            st.dataframe(por_dia.sort_index(ascending=False), use_container_width=True)
+
+            st.markdown("**Rejeições por cliente**")
+            por_cliente = rejeicoes.fillna({'CLIENTE': 'SEM CÓDIGO'}).pivot_table(
+                index='CLIENTE', columns='regra', values='quantidade',
+                aggfunc='sum', fill_value=0
+            )
+            st.dataframe(por_cliente, use_container_width=True)
+
+        if relatorio['linhas_data_ilegivel']:
+            st.markdown(f"**Linhas descartadas na carga por data ilegível:** {relatorio['linhas_data_ilegivel']:,}")
+
+        datas_invalidas = {col: qtd for col, qtd in relatorio['datas_invalidas'].items() if qtd}
+        if datas_invalidas:
+            st.markdown("**Datas ilegíveis**")
+            for col, qtd in datas_invalidas.items():
+                st.markdown(f"- {col}: **{qtd:,}**")
+
+        prefixos_sem_codigo = relatorio['prefixos_sem_codigo']
+        if not prefixos_sem_codigo.empty:
+            st.markdown("**Prefixos sem código** (ficam sem cliente/operação)")
+            st.dataframe(prefixos_sem_codigo, hide_index=True, use_container_width=True)
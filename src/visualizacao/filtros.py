@@ -2,6 +2,8 @@ import streamlit as st
 from datetime import datetime, timedelta
 from visualizacao.tema import Tema
 import pandas as pd
+from processamento.validacao import LIMITES_PADRAO
+from processamento.armazem import status_armazem
 
 def obter_datas_disponiveis(df):
     """Obtém as datas mínima e máxima disponíveis no DataFrame"""
@@ -149,6 +151,9 @@ def criar_filtros():
         return None
     
     df = st.session_state.dados['base']
+    if 'armazem' in st.session_state.dados:
+        # Fora da memória a base só tem a janela dos períodos; datas e opções vêm do cubo
+        df = st.session_state.dados['cubo'].rename(columns={'data': 'retirada'})
     data_min, data_max = obter_datas_disponiveis(df)
     
     # Seção de Períodos em um expander
@@ -266,13 +271,60 @@ def criar_filtros():
                 help="Meta de tempo total de permanência (espera + atendimento)"
             )
         
+        # Regras de validação aplicadas em tempo de consulta sobre a base bruta
+        with st.sidebar.expander("🧹 Regras de Validação", expanded=False):
+            col1, col2 = st.columns(2)
+            with col1:
+                tpatend_min = st.number_input(
+                    "Atendimento mín. (s)",
+                    min_value=0,
+                    value=LIMITES_PADRAO['tpatend_min'],
+                    step=10,
+                    help="Atendimentos mais curtos são descartados"
+                )
+            with col2:
+                tpatend_max = st.number_input(
+                    "Atendimento máx. (s)",
+                    min_value=0,
+                    value=LIMITES_PADRAO['tpatend_max'],
+                    step=60,
+                    help="Atendimentos mais longos são descartados"
+                )
+            tpesper_max = st.number_input(
+                "Espera máx. (s)",
+                min_value=0,
+                value=LIMITES_PADRAO['tpesper_max'],
+                step=600,
+                help="Esperas maiores são descartadas"
+            )
+            
+            indices = st.session_state.dados.get('indices_validacao')
+            if 'armazem' in st.session_state.dados:
+                status_disponiveis = status_armazem(st.session_state.dados['armazem'])
+            else:
+                status_disponiveis = sorted(
+                    str(valor) for valor in (indices['status']['valores'] if indices else df['status'].unique())
+                )
+            status = st.multiselect(
+                "Status aceitos",
+                options=status_disponiveis,
+                default=[s for s in LIMITES_PADRAO['status'] if s in status_disponiveis],
+                help="Somente senhas com estes status entram nas análises"
+            )
+        
         resultado = {
             'periodo1': {'inicio': data_inicio_p1, 'fim': data_fim_p1},
             'periodo2': {'inicio': data_inicio_p2, 'fim': data_fim_p2},
             'cliente': cliente if 'Todos' not in cliente else ['Todos'],
             'operacao': operacao if 'Todas' not in operacao else ['Todas'],
             'turno': turno if 'Todos' not in turno else ['Todos'],
-            'meta_permanencia': meta_permanencia
+            'meta_permanencia': meta_permanencia,
+            'validacao': {
+                'tpatend_min': tpatend_min,
+                'tpatend_max': tpatend_max,
+                'tpesper_max': tpesper_max,
+                'status': tuple(status)
+            }
         }
         
         # Adiciona seletor de tema como último filtro
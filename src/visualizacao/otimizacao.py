@@ -1,4 +1,24 @@
 import streamlit as st
+import pandas as pd
+import numpy as np
+from processamento.indices import indexar_dia_hora, posicoes_dia_hora
+from processamento.cubo import construir_cubo, filtrar_cubo, agregar_cubo, montar_celulas, posicoes_no_cubo, rotular_turno
+from processamento.quantis import construir_esbocos
+from processamento.distintos import construir_distintos
+from processamento.consolidados import CONSOLIDADOS
+from processamento.comparacao import comparar_periodos, periodos_filtros
+from processamento.metricas import calcular_tabela_metrica
+from processamento.tendencia import janelas_tendencia, calcular_tendencia
+from processamento.linha_base import calcular_linha_base
+from processamento.atividade_gates import calcular_atividade_gates
+from processamento.pendencias import calcular_pendencias
+from processamento.comboios import contar_chegadas
+from processamento.ocupacao import calcular_ocupacao
+from processamento.fila import calcular_fila
+from processamento.simulacao import simular_escala
+
+# Estatísticas das abas de tempo: média do cubo ou percentil dos esboços
+ESTATISTICAS = {'Média': None, 'P50': 0.5, 'P90': 0.9, 'P95': 0.95}
 
 @st.cache_resource
 def criar_layout_padrao():
@@ -20,3 +40,348 @@ def criar_layout_padrao():
 def preparar_dados_grafico(_df, grupo_by, metricas):
     """Prepara dados para gráficos com cache"""
     return _df.groupby(grupo_by)[metricas].agg(['mean', 'count']).reset_index()
+
+def fragmento(func):
+    """Isola a seção em um fragmento: widgets internos reexecutam só a própria seção"""
+    # st.fragment existe a partir da 1.37; versões anteriores só têm a experimental
+    decorador = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+    if decorador is None:
+        return func
+    return decorador(func)
+
+def escolher_estatistica(chave):
+    """Seletor de média ou percentil das abas de tempo; retorna (nome, quantil)"""
+    estatistica = st.radio(
+        "Estatística:",
+        list(ESTATISTICAS),
+        horizontal=True,
+        key=chave,
+        help="Percentis mostram a cauda: P90 é o tempo que 90% dos atendimentos não ultrapassam"
+    )
+    return estatistica, ESTATISTICAS[estatistica]
+
+def recortar_periodo(df, inicio, fim):
+    """Recorta a base pela data de retirada usando comparação direta de datetime"""
+    limite_inicio = pd.Timestamp(inicio)
+    limite_fim = pd.Timestamp(fim) + pd.Timedelta(days=1)
+    mask = (df['retirada'] >= limite_inicio) & (df['retirada'] < limite_fim)
+    return df[mask]
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _recortar_periodo_cache(_df, versao, inicio, fim):
+    """Recorte da base mantido em cache por versão da base"""
+    return recortar_periodo(_df, inicio, fim)
+
+def obter_visao_periodo(dados, inicio, fim):
+    """Retorna a base restrita ao período [inicio, fim] sem copiar nem reprocessar a cada rerun"""
+    versao = dados.get('versao')
+    if versao is None:
+        # Bases derivadas (ex.: já filtradas na aba) não têm versão: recorta direto
+        return recortar_periodo(dados['base'], inicio, fim)
+    return _recortar_periodo_cache(dados['base'], versao, inicio, fim)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _opcoes_coluna_cache(_df, versao, coluna):
+    """Valores distintos da coluna indexados pelo texto exibido nos seletores"""
+    return {str(valor): valor for valor in sorted(_df[coluna].unique(), key=str)}
+
+def obter_opcoes_coluna(dados, coluna):
+    """Mapa texto -> valor original das opções de uma coluna, calculado uma vez por versão"""
+    versao = dados.get('versao')
+    if versao is None:
+        return {str(valor): valor for valor in sorted(dados['base'][coluna].unique(), key=str)}
+    return _opcoes_coluna_cache(dados['base'], versao, coluna)
+
+def obter_cubo(dados):
+    """Cubo de métricas da base; bases derivadas sem cubo são agregadas na hora"""
+    if dados.get('cubo') is not None:
+        return dados['cubo']
+    return construir_cubo(dados['base'])
+
+def obter_agregado(dados, colunas):
+    """Menor tabela pré-agregada (consolidado diário ou cubo) que tem todas as colunas pedidas"""
+    colunas = set(colunas) | {'data'}
+    candidatos = [
+        tabela for nome, tabela in (dados.get('consolidados') or {}).items()
+        if colunas <= set(CONSOLIDADOS[nome])
+    ]
+    if candidatos:
+        return min(candidatos, key=len)
+    return obter_cubo(dados)
+
+def obter_esbocos(dados):
+    """Esboços de quantis alinhados ao cubo; bases derivadas sem esboços são processadas na hora"""
+    if dados.get('esbocos') is not None:
+        return dados['esbocos']
+    return construir_esbocos(dados['base'], posicoes_no_cubo(montar_celulas(dados['base'])))
+
+def obter_distintos(dados):
+    """Conjuntos de valores distintos por célula; bases derivadas sem eles são processadas na hora"""
+    if dados.get('distintos') is not None:
+        return dados['distintos']
+    return construir_distintos(dados['base'])
+
+def filtros_cubo_sidebar(filtros):
+    """Filtros de cliente, operação e turno da sidebar no formato de filtrar_cubo"""
+    filtros_cubo = {}
+    if filtros['cliente'] != ['Todos']:
+        filtros_cubo['CLIENTE'] = filtros['cliente']
+    if filtros['operacao'] != ['Todas']:
+        filtros_cubo['OPERAÇÃO'] = filtros['operacao']
+    if filtros['turno'] != ['Todos']:
+        filtros_cubo['turno'] = filtros['turno']
+    return filtros_cubo
+
+def filtros_cubo_adicionais(adicional_filters, filtros_cubo=None):
+    """Acrescenta os seletores das abas de pessoas (turno pelo horário de início) aos filtros do cubo"""
+    filtros_cubo = dict(filtros_cubo or {})
+    if adicional_filters:
+        if adicional_filters['colaborador'] != "Todos":
+            filtros_cubo['usuário'] = adicional_filters['colaborador']
+        if adicional_filters['turno'] != "Todos":
+            filtros_cubo['turno_atendimento'] = adicional_filters['turno']
+        if adicional_filters['cliente'] != "Todos":
+            filtros_cubo['CLIENTE'] = adicional_filters['cliente']
+        if adicional_filters['data_especifica']:
+            filtros_cubo['data'] = pd.Timestamp(adicional_filters['data_especifica'])
+    return filtros_cubo
+
+def chave_filtros_cubo(filtros_cubo):
+    """Filtros do cubo como tupla ordenada, usada como chave de cache"""
+    return tuple(sorted(
+        (coluna, tuple(valores) if isinstance(valores, (list, tuple, set)) else valores)
+        for coluna, valores in filtros_cubo.items()
+    ))
+
+def obter_celulas_periodo(dados, filtros, periodo):
+    """Células do cubo no período com os filtros de cliente, operação e turno da sidebar"""
+    return filtrar_cubo(obter_cubo(dados), filtros[periodo]['inicio'], filtros[periodo]['fim'], filtros_cubo_sidebar(filtros))
+
+def comparar_cubo(dados, filtros, por, filtros_cubo=None, medida=None, como='outer'):
+    """Tabela P1 x P2 do cubo numa única agregação; sem filtros_cubo usa os da sidebar"""
+    if filtros_cubo is None:
+        filtros_cubo = filtros_cubo_sidebar(filtros)
+    periodos = periodos_filtros(filtros)
+    por_lista = [por] if isinstance(por, str) else list(por)
+    celulas = filtrar_cubo(
+        obter_agregado(dados, por_lista + list(filtros_cubo)),
+        min(inicio for inicio, _ in periodos.values()),
+        max(fim for _, fim in periodos.values()),
+        filtros_cubo
+    )
+    return comparar_periodos(celulas, por, periodos, agregar_cubo, como=como, medida=medida)
+
+def _tabela_metrica(cubo, esbocos, filtros_cubo, periodos, dimensao, medida, como, quantil):
+    periodos = dict(periodos)
+    celulas = filtrar_cubo(
+        cubo,
+        min(inicio for inicio, _ in periodos.values()),
+        max(fim for _, fim in periodos.values()),
+        dict(filtros_cubo)
+    )
+    return calcular_tabela_metrica(celulas, dimensao, medida, periodos, como, quantil, esbocos)
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _tabela_metrica_cache(_cubo, _esbocos, versao, filtros_cubo, periodos, dimensao, medida, como, quantil):
+    """Tabela comparativa mantida em cache por versão da base, filtros e períodos"""
+    return _tabela_metrica(_cubo, _esbocos, filtros_cubo, periodos, dimensao, medida, como, quantil)
+
+def obter_tabela_metrica(dados, filtros, dimensao, medida, como='inner', filtros_cubo=None, quantil=None):
+    """Tabela P1 x P2 da medida (média ou percentil) por dimensão; sem filtros_cubo usa os da sidebar"""
+    if filtros_cubo is None:
+        filtros_cubo = filtros_cubo_sidebar(filtros)
+    chave_filtros = chave_filtros_cubo(filtros_cubo)
+    periodos = tuple(periodos_filtros(filtros).items())
+
+    # Percentis combinam esboços alinhados às células do cubo; médias e contagens saem do menor consolidado
+    if quantil is None:
+        tabela, esbocos = obter_agregado(dados, [dimensao, *filtros_cubo]), None
+    else:
+        tabela, esbocos = obter_cubo(dados), obter_esbocos(dados)
+
+    versao = dados.get('versao')
+    if versao is None:
+        return _tabela_metrica(tabela, esbocos, chave_filtros, periodos, dimensao, medida, como, quantil)
+    # Cópia: as abas podem acrescentar colunas sem alterar a tabela em cache
+    return _tabela_metrica_cache(
+        tabela, esbocos, versao, chave_filtros, periodos, dimensao, medida, como, quantil
+    ).copy()
+
+def _tendencia(tabela, esbocos, historico, filtros_cubo, fim, dimensao, medida, frequencia, quantidade, quantil):
+    janelas = janelas_tendencia(fim, frequencia, quantidade)
+    celulas = filtrar_cubo(tabela, janelas[0], fim, dict(filtros_cubo))
+    return calcular_tendencia(celulas, dimensao, medida, frequencia, janelas, quantil, esbocos, historico)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _tendencia_cache(_tabela, _esbocos, versao, historico, filtros_cubo, fim, dimensao, medida, frequencia, quantidade, quantil):
+    """Série de janelas mantida em cache por versão da base, filtros e granularidade"""
+    return _tendencia(_tabela, _esbocos, historico, filtros_cubo, fim, dimensao, medida, frequencia, quantidade, quantil)
+
+def obter_tendencia(dados, filtros, dimensao, medida, frequencia, quantidade, quantil=None):
+    """Medida por dimensão nas `quantidade` janelas que terminam no fim do período 2"""
+    filtros_cubo = filtros_cubo_sidebar(filtros)
+    chave_filtros = chave_filtros_cubo(filtros_cubo)
+    fim = filtros['periodo2']['fim']
+
+    if quantil is None:
+        tabela, esbocos = obter_agregado(dados, [dimensao, *filtros_cubo]), None
+    else:
+        tabela, esbocos = obter_cubo(dados), obter_esbocos(dados)
+
+    # Intervalo coberto pela base inteira, sem os filtros: fora dele a janela não tem referência
+    cubo = obter_cubo(dados)
+    historico = (cubo['data'].min(), cubo['data'].max())
+
+    versao = dados.get('versao')
+    if versao is None:
+        return _tendencia(tabela, esbocos, historico, chave_filtros, fim, dimensao, medida, frequencia, quantidade, quantil)
+    return _tendencia_cache(
+        tabela, esbocos, versao, historico, chave_filtros, fim, dimensao, medida, frequencia, quantidade, quantil
+    )
+
+def _linha_base(tabela, historico, filtros_cubo, inicio, fim, medida, semanas, por_hora):
+    celulas = filtrar_cubo(tabela, filtros=dict(filtros_cubo))
+    return calcular_linha_base(celulas, medida, inicio, fim, semanas, por_hora, historico)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _linha_base_cache(_tabela, versao, historico, filtros_cubo, inicio, fim, medida, semanas, por_hora):
+    """Linha de base mantida em cache por versão da base, filtros e período"""
+    return _linha_base(_tabela, historico, filtros_cubo, inicio, fim, medida, semanas, por_hora)
+
+def obter_linha_base(dados, filtros, medida, semanas=4, por_hora=False):
+    """Período 2 contra a mediana das mesmas semanas anteriores e o ano anterior, a partir dos consolidados"""
+    filtros_cubo = filtros_cubo_sidebar(filtros)
+    tabela = obter_agregado(dados, ['hora', *filtros_cubo])
+    # Intervalo coberto pela base inteira, sem os filtros: fora dele não há referência
+    cubo = obter_cubo(dados)
+    historico = (cubo['data'].min(), cubo['data'].max())
+    argumentos = (
+        chave_filtros_cubo(filtros_cubo), filtros['periodo2']['inicio'], filtros['periodo2']['fim'],
+        medida, semanas, por_hora
+    )
+
+    versao = dados.get('versao')
+    if versao is None:
+        return _linha_base(tabela, historico, *argumentos)
+    return _linha_base_cache(tabela, versao, historico, *argumentos)
+
+def _atividade_gates(df, filtros_base):
+    for coluna, valor in filtros_base:
+        df = df[df[coluna] == valor]
+    return calcular_atividade_gates(df)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _atividade_gates_cache(_df, versao, inicio, fim, filtros_base):
+    """Atividade por hora e gate mantida em cache por versão da base, período e filtros"""
+    return _atividade_gates(_df, filtros_base)
+
+def obter_atividade_gates(dados, inicio, fim, filtros_base=None):
+    """Tabela (hora, gate) de atividade dos gates no período, com filtros de igualdade por coluna"""
+    df = obter_visao_periodo(dados, inicio, fim)
+    filtros_base = chave_filtros_cubo(filtros_base or {})
+    versao = dados.get('versao')
+    if versao is None:
+        return _atividade_gates(df, filtros_base)
+    return _atividade_gates_cache(df, versao, inicio, fim, filtros_base)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _pendencias_cache(_df, versao, inicio, fim, por, minutos):
+    """Tabela de pendências mantida em cache por versão da base, período, agrupamento e faixa"""
+    return calcular_pendencias(_df, minutos, por)
+
+def obter_pendencias(dados, inicio, fim, por=None, minutos=60):
+    """Retiradas, atendidas e pendências de todos os dias (e grupos de `por`) do período, por faixa"""
+    df = obter_visao_periodo(dados, inicio, fim)
+    versao = dados.get('versao')
+    if versao is None:
+        return calcular_pendencias(df, minutos, por)
+    return _pendencias_cache(df, versao, inicio, fim, por, minutos)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _chegadas_cache(_df, versao, inicio, fim, por, minutos):
+    """Chegadas por faixa mantidas em cache por versão da base, período, agrupamento e faixa"""
+    return contar_chegadas(_df, minutos, por)
+
+def obter_chegadas(dados, inicio, fim, por=None, minutos=15):
+    """Senhas retiradas por dia (e grupo de `por`) e faixa de `minutos` no período"""
+    df = obter_visao_periodo(dados, inicio, fim)
+    versao = dados.get('versao')
+    if versao is None:
+        return contar_chegadas(df, minutos, por)
+    return _chegadas_cache(df, versao, inicio, fim, por, minutos)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ocupacao_cache(_df, versao, inicio, fim, por):
+    """Ocupação por minuto mantida em cache por versão da base, período e agrupamento"""
+    return calcular_ocupacao(_df, por)
+
+def obter_ocupacao(dados, inicio, fim, por=None):
+    """Gates em atendimento simultâneo por minuto de cada dia (e grupo de `por`) do período"""
+    df = obter_visao_periodo(dados, inicio, fim)
+    versao = dados.get('versao')
+    if versao is None:
+        return calcular_ocupacao(df, por)
+    return _ocupacao_cache(df, versao, inicio, fim, por)
+
+def filtrar_base(df, filtros_cubo):
+    """Aplica à base os filtros no formato do cubo (turno pelo horário de retirada, como no cubo)"""
+    for coluna, valores in filtros_cubo:
+        valores = list(valores) if isinstance(valores, tuple) else [valores]
+        if coluna == 'turno':
+            df = df[np.isin(rotular_turno(df['retirada'].dt.hour, 7), valores)]
+        else:
+            df = df[df[coluna].isin(valores)]
+    return df
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _indice_dia_hora_cache(_df, versao, inicio, fim, coluna):
+    """Índice (dia, hora) do recorte mantido em cache por versão da base e período"""
+    return indexar_dia_hora(_df, coluna)
+
+def obter_indice_dia_hora(dados, inicio, fim, coluna='retirada'):
+    """Índice (dia, hora) da coluna -> posições das linhas do recorte do período"""
+    df = obter_visao_periodo(dados, inicio, fim)
+    versao = dados.get('versao')
+    if versao is None:
+        return indexar_dia_hora(df, coluna)
+    return _indice_dia_hora_cache(df, versao, inicio, fim, coluna)
+
+def obter_linhas_hora(dados, inicio, fim, hora, coluna='retirada', filtros_base=None):
+    """Linhas do recorte com a hora da coluna em qualquer dia, na ordem da base, sem varrer o período"""
+    posicoes = posicoes_dia_hora(obter_indice_dia_hora(dados, inicio, fim, coluna), hora=hora)
+    linhas = obter_visao_periodo(dados, inicio, fim).iloc[np.sort(posicoes)]
+    return filtrar_base(linhas, chave_filtros_cubo(filtros_base or {}))
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _fila_cache(_df, versao, inicio, fim, por, filtros_cubo):
+    """Fila por minuto mantida em cache por versão da base, período, agrupamento e filtros"""
+    return calcular_fila(filtrar_base(_df, filtros_cubo), por)
+
+def obter_fila(dados, inicio, fim, por=None, filtros_cubo=None):
+    """Tamanho da fila por minuto de cada dia (e grupo de `por`) do período, com filtros do cubo"""
+    df = obter_visao_periodo(dados, inicio, fim)
+    chave_filtros = chave_filtros_cubo(filtros_cubo or {})
+    versao = dados.get('versao')
+    if versao is None:
+        return calcular_fila(filtrar_base(df, chave_filtros), por)
+    return _fila_cache(df, versao, inicio, fim, por, chave_filtros)
+
+def _simulacao(df, filtros_base, escala, replicacoes, semente):
+    for coluna, valor in filtros_base:
+        df = df[df[coluna] == valor]
+    return simular_escala(df, escala, replicacoes, semente)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _simulacao_cache(_df, versao, inicio, fim, filtros_base, escala, replicacoes, semente):
+    """Simulação da escala mantida em cache por versão da base, período, filtros e cenário"""
+    return _simulacao(_df, filtros_base, escala, replicacoes, semente)
+
+def obter_simulacao(dados, inicio, fim, filtros_base=None, escala=None, replicacoes=100, semente=0):
+    """Espera e pendências por hora simuladas sobre as retiradas do período (escala histórica se None)"""
+    df = obter_visao_periodo(dados, inicio, fim)
+    filtros_base = chave_filtros_cubo(filtros_base or {})
+    escala = None if escala is None else tuple(int(gates) for gates in escala)
+    versao = dados.get('versao')
+    if versao is None:
+        return _simulacao(df, filtros_base, escala, replicacoes, semente)
+    return _simulacao_cache(df, versao, inicio, fim, filtros_base, escala, replicacoes, semente)
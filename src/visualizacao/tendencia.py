@@ -0,0 +1,62 @@
+import streamlit as st
+import plotly.express as px
+from processamento.tendencia import FREQUENCIAS, resumir_tendencia
+from visualizacao.otimizacao import obter_tendencia
+
+MODOS = ["Comparativo P1 x P2", "Tendência"]
+ROTULOS_DIMENSAO = {'CLIENTE': 'Cliente', 'OPERAÇÃO': 'Operação'}
+
+def escolher_modo(chave):
+    """Seletor entre a comparação dos dois períodos e a tendência em várias janelas"""
+    return st.radio("Visualização:", MODOS, horizontal=True, key=chave) == "Tendência"
+
+def mostrar_tendencia(dados, filtros, dimensao, medida, rotulo, chave, quantil=None):
+    """Tabela com sparkline por grupo e gráfico de linhas dos maiores grupos nas janelas escolhidas"""
+    col1, col2 = st.columns(2)
+    with col1:
+        frequencia = st.selectbox("Janela:", list(FREQUENCIAS), index=1, key=f"frequencia_{chave}")
+    with col2:
+        quantidade = st.slider(
+            "Quantidade de janelas:", min_value=2, max_value=24, value=12, key=f"janelas_{chave}",
+            help="Janelas consecutivas terminando no fim do Período 2"
+        )
+
+    tendencia = obter_tendencia(dados, filtros, dimensao, medida, FREQUENCIAS[frequencia], quantidade, quantil)
+    resumo = resumir_tendencia(tendencia, dimensao)
+    if resumo.empty:
+        st.warning("Não há dados para exibir nas janelas selecionadas.")
+        return
+
+    nome = ROTULOS_DIMENSAO.get(dimensao, dimensao)
+    st.caption(
+        f"{quantidade} janelas ({frequencia.lower()}) de {tendencia['janela'].min().strftime('%d/%m/%Y')} "
+        f"até {filtros['periodo2']['fim'].strftime('%d/%m/%Y')}; a última janela pode estar incompleta"
+    )
+    st.dataframe(
+        resumo,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            dimensao: st.column_config.TextColumn(nome),
+            'serie': st.column_config.LineChartColumn(f"{rotulo} por janela", width='medium'),
+            'ultimo': st.column_config.NumberColumn("Última janela", format="%.1f"),
+            'media_anterior': st.column_config.NumberColumn("Média anterior", format="%.1f"),
+            'variacao': st.column_config.NumberColumn("Variação (%)", format="%+.1f%%"),
+            'total': st.column_config.NumberColumn("Registros", format="%d")
+        }
+    )
+
+    # Gráfico só com os maiores grupos para continuar legível
+    principais = resumo[dimensao].head(8)
+    fig = px.line(
+        tendencia[tendencia[dimensao].isin(principais)],
+        x='janela', y='valor', color=dimensao, markers=True,
+        labels={'janela': 'Janela', 'valor': rotulo, dimensao: nome}
+    )
+    fig.update_layout(
+        title=f"{rotulo} por {nome} ({frequencia.lower()})",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1}
+    )
+    st.plotly_chart(fig, use_container_width=True, key=f"grafico_tendencia_{chave}")